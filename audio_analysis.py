@@ -0,0 +1,907 @@
+# -*- coding: utf-8 -*-
+"""오디오 처리: STT 전처리, 피치 보정, 프로소디 분석 + 공유 프로세스 풀.
+
+streamlit을 import하지 않는다. 앱(streamlit_app.py)과 도구(tools/), 그리고 풀의 작업
+프로세스가 함께 쓰는 모듈이라 스트림릿 스크립트(__main__) 밖에 둔다.
+"""
+import os, io, re, time, struct, wave, math, threading, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as _FutTimeout
+from multiprocessing import shared_memory
+from typing import Callable, Optional, Tuple
+
+# 선택 의존성 ─────────────────────────────────────────────────────────
+try:
+    from pydub import AudioSegment, effects, silence as _silence
+    from pydub.utils import which as _which
+except Exception:
+    AudioSegment, effects, _silence, _which = None, None, None, None
+
+# librosa(프로소디 분석, 선택)
+try:
+    import librosa as _lb
+except Exception:
+    _lb = None
+try:
+    import soundfile as _sf  # FLAC/OGG(Opus) 업로드 인코딩(선택)
+except Exception:
+    _sf = None
+try:
+    import numpy as _np
+except Exception:
+    _np = None
+try:
+    import webrtcvad as _vad  # 선택, 없으면 무시
+except Exception:
+    _vad = None
+
+# ───────── ffmpeg 경로 안전 장치 ──────────────────────────────────
+def _ensure_ffmpeg_path():
+    """pydub이 ffmpeg를 못 찾을 때, 윈도우 공통 경로를 자동 시도."""
+    if _which is None or AudioSegment is None:
+        return
+    try:
+        if _which("ffmpeg") and _which("ffprobe"):
+            return
+    except Exception:
+        pass
+    candidates = [
+        r"C:\\ffmpeg\\bin",
+        r"C:\\Program Files\\ffmpeg\\bin",
+        r"C:\\Program Files (x86)\\ffmpeg\\bin",
+    ]
+    for p in candidates:
+        ff = os.path.join(p, "ffmpeg.exe")
+        if os.path.exists(ff):
+            os.environ["PATH"] = p + os.pathsep + os.environ.get("PATH", "")
+            try:
+                AudioSegment.converter = ff
+                prob = os.path.join(p, "ffprobe.exe")
+                if os.path.exists(prob):
+                    AudioSegment.ffprobe = prob
+            except Exception:
+                pass
+            break
+
+_ensure_ffmpeg_path()
+
+# ───────── TTS 피치 보정 ──────────────────────────────────────────
+def _pitch_shift_mp3(mp3_bytes: bytes, semitones: float) -> bytes:
+    if not AudioSegment or semitones==0:
+        return mp3_bytes
+    try:
+        seg = AudioSegment.from_file(io.BytesIO(mp3_bytes), format="mp3")
+        new_fr = int(seg.frame_rate * (2.0 ** (semitones/12.0)))
+        shifted = seg._spawn(seg.raw_data, overrides={'frame_rate': new_fr}).set_frame_rate(seg.frame_rate)
+        out = io.BytesIO(); shifted.export(out, format="mp3"); return out.getvalue()
+    except Exception:
+        return mp3_bytes
+
+
+# ───────── STT 전처리 ─────────────────────────────────────────────
+STT_UPLOAD_FORMATS = ("wav", "flac", "ogg")
+
+def _encode_pcm16_mono(seg, fmt: str) -> bytes:
+    """16kHz/16bit/mono AudioSegment → 업로드용 바이트. soundfile로 프로세스 내 인코딩, 없으면 pydub(ffmpeg)."""
+    if fmt in ("flac", "ogg"):
+        if _sf is not None and _np is not None:
+            try:
+                pcm = _np.frombuffer(seg.raw_data, dtype="<i2")
+                buf = io.BytesIO()
+                if fmt == "flac": _sf.write(buf, pcm, seg.frame_rate, format="FLAC", subtype="PCM_16")
+                else:             _sf.write(buf, pcm, seg.frame_rate, format="OGG", subtype="OPUS")
+                return buf.getvalue()
+            except Exception:
+                pass
+        try:
+            buf = io.BytesIO()
+            if fmt == "flac": seg.export(buf, format="flac")
+            else:             seg.export(buf, format="ogg", codec="libopus", bitrate="32k")
+            return buf.getvalue()
+        except Exception:
+            pass
+    buf = io.BytesIO(); seg.export(buf, format="wav")
+    return buf.getvalue()
+
+def _prepare_trimmed_pcm(audio_bytes: bytes, fmt: str) -> Optional[bytes]:
+    """끝점 검출 녹음기 출력(앞뒤 무음 제거된 16 kHz/16bit/mono WAV) → 피크 정규화만 하고 바로 인코딩.
+    대역 필터는 브라우저 잡음 억제가 대신한다. 형식이 다르면 None."""
+    if _np is None or audio_bytes[:4] != b"RIFF":
+        return None
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+        if (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) != (1, 2, 16000):
+            return None
+        pcm = _np.frombuffer(wf.readframes(wf.getnframes()), dtype="<i2")
+    peak = int(_np.abs(pcm.astype(_np.int32)).max()) if pcm.size else 0
+    if peak:
+        pcm = _np.clip(pcm.astype(_np.float32) * (32767.0 * 10 ** (-3.0/20) / peak), -32768, 32767).astype("<i2")
+    seg = AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=16000, channels=1)
+    return _encode_pcm16_mono(seg, fmt if fmt in STT_UPLOAD_FORMATS else "wav")
+
+def preprocess_audio_for_stt(audio_bytes: bytes, fmt: str = "wav", trimmed: bool = False) -> bytes:
+    """trimmed: 브라우저 끝점 검출 녹음기가 이미 앞뒤 무음을 잘라 16 kHz 모노로 보낸 경우(디코딩·무음 탐색·필터 생략)."""
+    if not AudioSegment:
+        return audio_bytes
+    try:
+        if trimmed:
+            out = _prepare_trimmed_pcm(audio_bytes, fmt)
+            if out is not None: return out
+        # 녹음기는 WAV를 주므로 ffmpeg 없이 바로 디코딩
+        src_fmt = "wav" if audio_bytes[:4] == b"RIFF" else None
+        seg = AudioSegment.from_file(io.BytesIO(audio_bytes), format=src_fmt)
+        def _lead_sil(seg, silence_thresh=-40.0, chunk_ms=10):
+            trim_ms = 0
+            while trim_ms < len(seg) and seg[trim_ms:trim_ms+chunk_ms].dBFS < silence_thresh:
+                trim_ms += chunk_ms
+            return trim_ms
+        start = _lead_sil(seg); end = _lead_sil(seg.reverse())
+        if start+end < len(seg): seg = seg[start:len(seg)-end]
+        try: seg = seg.high_pass_filter(100).low_pass_filter(4000)
+        except Exception: pass
+        try: seg = effects.normalize(seg, headroom=3.0)
+        except Exception: pass
+        seg = seg.set_channels(1).set_frame_rate(16000).set_sample_width(2)
+        return _encode_pcm16_mono(seg, fmt if fmt in STT_UPLOAD_FORMATS else "wav")
+    except Exception:
+        return audio_bytes
+
+# ───────── 프로소디 분석: WAV 폴백 포함 ────────────────────────────
+# 20ms 프레임 에너지 기반 라벨링(순수 WAV 경로·빠른 단계·스트리밍 분석기가 공유)
+def _energy_prosody(dur: float, rms_db: float, energies, stt_text: str) -> dict:
+    if energies:
+        hi = sorted(energies)[int(max(0, len(energies)*0.9)-1)]
+        thr = max(hi*0.1, 1e-6)
+        unvoiced = sum(1 for e in energies if e < thr) * 0.02
+        rng = max(energies) - min(energies)
+    else:
+        unvoiced, rng = 0.0, None
+    return _prosody_labels(dur, rms_db, unvoiced, rng, stt_text)
+
+def _prosody_labels(dur: float, rms_db: float, unvoiced: float, rng: Optional[float], stt_text: str) -> dict:
+    """길이·RMS·무성 구간 합·프레임 에너지 범위(없으면 None) → 라벨 dict."""
+    pause_ratio = min(1.0, max(0.0, unvoiced/max(dur,1e-6)))
+    syllables = len([c for c in (stt_text or "") if ('가' <= c <= '힣') or c.isdigit()])
+    voiced = max(dur - unvoiced, 1e-6)
+    syl_rate = (syllables/voiced) if syllables>0 else None
+    wps = (len((stt_text or "").split())/voiced) if stt_text else None
+    def lab_speed(s):
+        if s is None: return "데이터 부족"
+        if s>=7.3: return "너무 빠름"
+        if s>=6.6: return "빠름"
+        if s>=5.2: return "적당함"
+        if s>=3.8: return "느림"
+        return "너무 느림"
+    def lab_volume(db):
+        if db is None: return "데이터 부족"
+        if db>=-13: return "너무 큼"
+        if db>=-23: return "큼"
+        if db>=-37: return "적당함"
+        if db>=-47: return "작음"
+        return "너무 작음"
+    spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
+               "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
+               "잘 띄어 읽는 것이 되지 않음")
+    if rng is not None:
+        if rng>0.25 and rms_db>-20 and pause_ratio<0.15: tone="화내는 어조"
+        elif rng>0.18 and pause_ratio>=0.2 and rms_db>-30: tone="즐거운 어조"
+        elif rms_db<-35 and pause_ratio>0.25: tone="슬픈 어조"
+        elif rng<0.1 and pause_ratio<0.1: tone="담담한 어조"
+        else: tone="보통 어조"
+    else:
+        tone="담담한 어조"
+    return {"speed_label":lab_speed(syl_rate),"volume_label":lab_volume(rms_db),
+            "tone_label":tone,"spacing_label":spacing,
+            "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_db,
+            "f0_hz":None,"f0_var":None,"pause_ratio":pause_ratio}
+
+def _f0_tone(f0_med: float, f0_std: float, pause_ratio: float, rms_db: float) -> str:
+    pitch_desc = ("낮음" if f0_med<140 else "중간" if f0_med<200 else "높음")
+    var_desc   = ("변화 적음" if f0_std<15 else "변화 적당" if f0_std<35 else "변화 큼")
+    if pitch_desc=="높음" and var_desc!="변화 적음" and pause_ratio>=0.15: return "활기찬/즐거운 어조"
+    if pitch_desc=="낮음" and var_desc=="변화 적음" and pause_ratio<0.1: return "담담·낮은 톤"
+    if var_desc=="변화 큼" and rms_db>-25: return "감정 기복 큰 어조"
+    if pitch_desc=="중간" and var_desc=="변화 적당": return "보통 어조"
+    return "담담한 어조"
+
+# analyze_prosody의 기본 배포 경로(pydub)와 같은 규칙·기준: 120ms 무음 창(전체 dBFS-10) → 유성 시간,
+# 50ms 창 dBFS 범위 → 어조. 스트리밍·빠른 단계가 같은 라벨을 내도록 1ms 단위 제곱합으로 다시 계산한다.
+_SIL_MIN_MS, _TONE_WIN_MS = 120, 50
+
+def _ms_energy(y, sr: int):
+    """float32 샘플 → 1ms 칸별 제곱합(pydub의 ms 단위 자르기와 같은 칸)."""
+    idx = (_np.arange(y.size, dtype=_np.int64) * 1000) // sr
+    return _np.bincount(idx, weights=y.astype(_np.float64) ** 2)
+
+def _segment_labels(ms_sq, sr: int, n: int, stt_text: str) -> dict:
+    """1ms 칸 제곱합(ms_sq), 샘플 수 n → analyze_prosody(pydub 경로)와 같은 라벨 dict."""
+    dur = max(0.001, n / sr)
+    L, m = int(round(1000 * n / sr)), ms_sq.size
+    cs = _np.concatenate([[0.0], _np.cumsum(ms_sq)])
+    def win_rms(a, b):  # [a, b) ms 창의 16bit 정수 RMS(pydub/audioop처럼 버림)
+        a = _np.minimum(a, m); b = _np.minimum(b, m)
+        na = _np.minimum(-((-a * sr) // 1000), n); nb = _np.minimum(-((-b * sr) // 1000), n)  # 칸 j의 첫 샘플 = ceil(j*sr/1000)
+        return _np.floor(_np.sqrt((cs[b] - cs[a]) / _np.maximum(nb - na, 1)) * 32768.0)
+    def to_db(r):  # 0이면 pydub처럼 -inf
+        return _np.where(r > 0, 20.0 * _np.log10(_np.maximum(r, 1.0) / 32768.0), -_np.inf)
+    rms_dbfs = float(to_db(win_rms(_np.array([0]), _np.array([m])))[0])
+    if not math.isfinite(rms_dbfs): rms_dbfs = -60.0
+    volume = ("너무 큼" if rms_dbfs>-9 else "큼" if rms_dbfs>-15 else "적당함" if rms_dbfs>-25 else
+              "작음" if rms_dbfs>-35 else "너무 작음")
+    # pydub detect_nonsilent(min_silence_len=120, silence_thresh=max(-60, int(dBFS)-10), seek_step=1).
+    # 창 시작점은 1ms마다지만 임시 배열은 16384개씩만
+    if L < _SIL_MIN_MS:
+        voiced_total = L / 1000.0
+    else:
+        thr = (10 ** (max(-60, int(rms_dbfs) - 10) / 20.0)) * 32768.0
+        d = _np.zeros(L + 1, dtype=_np.int32)
+        for c0 in range(0, L - _SIL_MIN_MS + 1, 16384):
+            st = _np.arange(c0, min(c0 + 16384, L - _SIL_MIN_MS + 1))
+            st = st[win_rms(st, st + _SIL_MIN_MS) <= thr]
+            _np.add.at(d, st, 1); _np.add.at(d, st + _SIL_MIN_MS, -1)
+        covered = int((_np.cumsum(d)[:L] > 0).sum())
+        voiced_total = L / 1000.0 if covered == 0 else dur if covered >= L else (L - covered) / 1000.0
+    unvoiced = max(0.0, dur - voiced_total)
+    pause_ratio = unvoiced/dur if dur>0 else 0.0
+    spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
+               "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
+               "잘 띄어 읽는 것이 되지 않음")
+    syllables = len(re.findall(r"[가-힣]", stt_text or ""))
+    syl_rate = (syllables/voiced_total) if (voiced_total>0 and syllables>0) else None
+    if syl_rate is None: speed = "데이터 부족"
+    else:
+        speed = ("너무 빠름" if syl_rate>=5.0 else "빠름" if syl_rate>=4.0 else
+                 "적당함" if syl_rate>=2.0 else "느림" if syl_rate>=1.2 else "너무 느림")
+    wps = (len((stt_text or '').split())/voiced_total) if (voiced_total>0 and stt_text) else None
+    st = _np.arange(0, max(L, 1), _TONE_WIN_MS)
+    vals = to_db(win_rms(st, st + _TONE_WIN_MS))
+    vals = _np.where(_np.isfinite(vals), vals, -60.0)
+    rng = float(vals.max() - vals.min()) if vals.size else 0.0
+    if rng>20 and rms_dbfs>-20 and pause_ratio<0.15: tone="화내는 어조"
+    elif rng>15 and pause_ratio>=0.2 and rms_dbfs>-30: tone="즐거운 어조"
+    elif rms_dbfs<-35 and pause_ratio>0.25: tone="슬픈 어조"
+    elif rng<10 and pause_ratio<0.1: tone="담담한 어조"
+    else: tone="보통 어조"
+    return {"speed_label":speed,"volume_label":volume,"tone_label":tone,"spacing_label":spacing,
+            "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_dbfs,
+            "f0_hz":None,"f0_var":None,"pause_ratio":pause_ratio}
+
+def _analyze_wav_pure(audio_bytes: bytes, stt_text: str) -> dict:
+    try:
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+            ch = wf.getnchannels(); sw = wf.getsampwidth(); sr = wf.getframerate(); n = wf.getnframes()
+            raw = wf.readframes(n)
+        if sw not in (1,2):
+            return {"speed_label":"데이터 부족","volume_label":"데이터 부족","tone_label":"데이터 부족","spacing_label":"데이터 부족",
+                    "syllables_per_sec":None,"wps":None,"rms_db":None,"f0_hz":None,"f0_var":None,"pause_ratio":None}
+        if sw == 1:
+            fmt = f"{len(raw)}b"; maxv = 127.0; arr = struct.unpack(fmt, raw)
+        else:
+            fmt = f"{len(raw)//2}h"; maxv = 32767.0; arr = struct.unpack(fmt, raw)
+        if ch > 1:
+            arr = [(arr[i] + arr[i+1]) / 2.0 for i in range(0, len(arr), ch)]
+        else:
+            arr = list(arr)
+        dur = len(arr)/sr
+        if dur <= 0.0:
+            raise RuntimeError("empty audio")
+        mean_sq = sum((x/maxv)*(x/maxv) for x in arr)/len(arr)
+        rms = math.sqrt(max(mean_sq, 1e-12))
+        rms_db = 20.0*math.log10(rms)
+        win = int(sr*0.02) or 1
+        energies = []
+        for i in range(0, len(arr), win):
+            w = arr[i:i+win]
+            if not w: break
+            e = math.sqrt(sum((x/maxv)*(x/maxv) for x in w)/len(w))
+            energies.append(e)
+        return _energy_prosody(dur, rms_db, energies, stt_text)
+    except Exception:
+        return {"speed_label":"데이터 부족","volume_label":"데이터 부족",
+                "tone_label":"데이터 부족","spacing_label":"데이터 부족",
+                "syllables_per_sec":None,"wps":None,"rms_db":None,"f0_hz":None,
+                "f0_var":None,"pause_ratio":None}
+
+def analyze_prosody(audio_bytes: bytes, stt_text: str) -> dict:
+    if _lb is not None and _np is not None:
+        try:
+            y, sr = _lb.load(io.BytesIO(audio_bytes), sr=16000, mono=True)
+            if y is None or (hasattr(y, "size") and y.size == 0):
+                raise RuntimeError("empty audio")
+            if _vad:
+                int16 = (y * 32767).astype("int16").tobytes()
+                v = _vad.Vad(2); frame_ms = 20
+                step = int(sr * frame_ms / 1000)
+                frames = [int16[i:i+2*step] for i in range(0, len(int16), 2*step)]
+                voiced = []; cur=None; t=0.0
+                for f in frames:
+                    isv = v.is_speech(f, sr)
+                    if isv and cur is None: cur=[t,None]
+                    if (not isv) and cur is not None: cur[1]=t; voiced.append(cur); cur=None
+                    t += frame_ms/1000.0
+                if cur is not None: cur[1]=t; voiced.append(cur)
+                voiced_total = sum([e-s for s,e in voiced])
+            else:
+                intervals = _lb.effects.split(y, top_db=35)
+                voiced_total = sum([(e - s)/sr for s, e in intervals]) if intervals else len(y)/sr
+            total = len(y)/sr
+            voiced_total = voiced_total if voiced_total > 0 else total
+            syllables = len(re.findall(r"[가-힣]", stt_text or ""))
+            syl_rate = syllables/voiced_total if voiced_total>0 else None
+            words = len((stt_text or "").split()); wps = words/voiced_total if voiced_total>0 else None
+            if syl_rate is None: speed = "데이터 부족"
+            else:
+                speed = ("너무 빠름" if syl_rate>=5.0 else
+                         "빠름"      if syl_rate>=4.0 else
+                         "적당함"    if syl_rate>=2.0 else
+                         "느림"      if syl_rate>=1.2 else "너무 느림")
+            rms = float((_np.sqrt(_np.mean(y*y))) + 1e-12)
+            rms_db = 20.0 * math.log10(rms)
+            volume = ("너무 큼" if rms_db>=-9 else
+                      "큼"     if rms_db>=-15 else
+                      "적당함" if rms_db>=-25 else
+                      "작음"   if rms_db>=-35 else "너무 작음")
+            unvoiced = max(0.0, total - voiced_total)
+            pause_ratio = unvoiced/total if total>0 else 0.0
+            try:
+                f0, _, _ = _lb.pyin(y, fmin=75, fmax=500, sr=sr, frame_length=2048, hop_length=256)
+                if f0 is not None:
+                    f0_valid = f0[_np.isfinite(f0)]
+                    if f0_valid.size>0:
+                        f0_med = float(_np.nanmedian(f0_valid))
+                        f0_std = float(_np.nanstd(f0_valid))
+                        tone = _f0_tone(f0_med, f0_std, pause_ratio, rms_db)
+                    else:
+                        f0_med, f0_std, tone = None, None, "담담한 어조"
+                else:
+                    f0_med, f0_std, tone = None, None, "담담한 어조"
+            except Exception:
+                f0_med, f0_std, tone = None, None, "담담한 어조"
+            spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
+                       "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
+                       "잘 띄어 읽는 것이 되지 않음")
+            return {"speed_label":speed,"volume_label":volume,"tone_label":tone,"spacing_label":spacing,
+                    "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_db,
+                    "f0_hz":f0_med,"f0_var":f0_std,"pause_ratio":pause_ratio}
+        except Exception:
+            pass
+    if AudioSegment is not None:
+        try:
+            seg = AudioSegment.from_file(io.BytesIO(audio_bytes))
+            dur = max(0.001, seg.duration_seconds)
+            rms_dbfs = seg.dBFS if seg.dBFS != float("-inf") else -60.0
+            volume = ("너무 큼" if rms_dbfs>-9 else
+                      "큼"     if rms_dbfs>-15 else
+                      "적당함" if rms_dbfs>-25 else
+                      "작음"   if rms_dbfs>-35 else "너무 작음")
+            if _silence:
+                non = _silence.detect_nonsilent(seg, min_silence_len=120,
+                                                silence_thresh=max(-60, int(seg.dBFS)-10))
+                voiced_total = sum((b-a) for a,b in non)/1000.0 if non else dur
+            else:
+                voiced_total = dur
+            unvoiced = max(0.0, dur - voiced_total)
+            pause_ratio = unvoiced/dur if dur>0 else 0.0
+            spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
+                       "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
+                       "잘 띄어 읽는 것이 되지 않음")
+            syllables = len(re.findall(r"[가-힣]", stt_text or ""))
+            syl_rate = (syllables/voiced_total) if (voiced_total>0 and syllables>0) else None
+            if syl_rate is None: speed = "데이터 부족"
+            else:
+                speed = ("너무 빠름" if syl_rate>=5.0 else
+                         "빠름"      if syl_rate>=4.0 else
+                         "적당함"    if syl_rate>=2.0 else
+                         "느림"      if syl_rate>=1.2 else "너무 느림")
+            wps = (len((stt_text or '').split())/voiced_total) if (voiced_total>0 and stt_text) else None
+            step=50; vals=[]
+            for i in range(0, len(seg), step):
+                v = seg[i:i+step].dBFS
+                vals.append(-60.0 if v==float("-inf") else v)
+            rng = (max(vals)-min(vals)) if vals else 0.0
+            if rng>20 and rms_dbfs>-20 and pause_ratio<0.15: tone="화내는 어조"
+            elif rng>15 and pause_ratio>=0.2 and rms_dbfs>-30: tone="즐거운 어조"
+            elif rms_dbfs<-35 and pause_ratio>0.25: tone="슬픈 어조"
+            elif rng<10 and pause_ratio<0.1: tone="담담한 어조"
+            else: tone="보통 어조"
+            return {"speed_label":speed,"volume_label":volume,"tone_label":tone,"spacing_label":spacing,
+                    "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_dbfs,
+                    "f0_hz":None,"f0_var":None,"pause_ratio":pause_ratio}
+        except Exception:
+            pass
+    return _analyze_wav_pure(audio_bytes, stt_text)
+
+# ───────── 빠른 단계: numpy 에너지 분석(F0 없음) ────────────────────
+def _decode_mono_float(audio_bytes: bytes) -> Tuple[Optional[object], int]:
+    """WAV는 wave+numpy로 바로, 그 밖의 형식은 pydub로 디코딩 → (float32 [-1,1] 배열, sr)."""
+    if audio_bytes[:4] == b"RIFF":
+        with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+            ch = wf.getnchannels(); sw = wf.getsampwidth(); sr = wf.getframerate()
+            raw = wf.readframes(wf.getnframes())
+        if sw == 2:   y = _np.frombuffer(raw, dtype="<i2").astype(_np.float32) / 32768.0
+        elif sw == 1: y = (_np.frombuffer(raw, dtype=_np.uint8).astype(_np.float32) - 128.0) / 128.0
+        else: return None, 0
+    elif AudioSegment is not None:
+        seg = AudioSegment.from_file(io.BytesIO(audio_bytes))
+        ch, sr = seg.channels, seg.frame_rate
+        y = _np.array(seg.get_array_of_samples(), dtype=_np.float32) / float(1 << (8*seg.sample_width - 1))
+    else:
+        return None, 0
+    if ch > 1:
+        y = y[: len(y)//ch*ch].reshape(-1, ch).mean(axis=1)
+    return y, sr
+
+def analyze_prosody_fast(audio_bytes: bytes, stt_text: str) -> dict:
+    """analyze_prosody의 값싼 대체: 한 번 디코딩 + 1ms 칸 에너지로 같은 라벨(_segment_labels). 시간 초과/대기열 포화 때 사용."""
+    if _np is None:
+        return _analyze_wav_pure(audio_bytes, stt_text)
+    try:
+        y, sr = _decode_mono_float(audio_bytes)
+        if y is None or y.size == 0:
+            return _analyze_wav_pure(audio_bytes, stt_text)
+        return _segment_labels(_ms_energy(y, sr), sr, y.size, stt_text)
+    except Exception:
+        return _analyze_wav_pure(audio_bytes, stt_text)
+
+# ───────── 스트리밍 분석기: 블록 단위 증분 통계 + 윤곽선 ─────────────
+class StreamingProsody:
+    """오디오를 블록 단위로 받아 20ms 프레임 통계(RMS·VAD·에너지 범위·F0)를 갱신하는 분석기.
+
+    F0 상태는 고정 크기(반음 히스토그램, 직전 프레임)다. 라벨용 1ms 칸 제곱합(초당 4KB)과
+    윤곽선(소리 크기 dB, F0 Hz, 유성 비율, hop_s마다 한 점)만 float32로 늘어난다.
+    라벨은 analyze_prosody의 pydub 경로와 같은 규칙·기준(_segment_labels)을 쓴다.
+    """
+    FRAME_S = 0.02
+    _F0_LO, _F0_HI, _F0_PER_ST = 75.0, 500.0, 4          # F0 히스토그램: 1/4 반음 칸(중앙값)
+    _F0_MIN_CONF = 0.5                                     # 정규화 자기상관 최댓값이 이보다 낮으면 무성
+
+    def __init__(self, sr: int, hop_s: float = 0.1, f0: bool = True):
+        import array
+        self.sr = int(sr); self.f0 = f0  # f0=False: 자기상관(FFT) 생략, 에너지·유성 통계만
+        self.win = int(self.sr * self.FRAME_S) or 1
+        self.hop = max(1, int(round(hop_s / self.FRAME_S)))
+        self.hop_s = self.hop * self.FRAME_S
+        self._lmin = max(1, int(self.sr / self._F0_HI)); self._lmax = int(self.sr / self._F0_LO)
+        self._nfft = 1 << (4 * self.win - 1).bit_length()
+        self._lag_w = (2 * self.win) / (2 * self.win - _np.arange(self._lmin, self._lmax + 1))  # 비편향 보정
+        self._vad = _vad.Vad(2) if (_vad is not None and self.sr in (8000, 16000, 32000, 48000)) else None
+        self._carry = _np.zeros(0, dtype=_np.float32)
+        self._prev = _np.zeros(self.win, dtype=_np.float32)
+        self.samples = 0; self._peak = 0.0
+        self._ms = array.array("f")  # 1ms 칸 제곱합(_segment_labels)
+        n_f0 = int(math.ceil(12 * math.log2(self._F0_HI / self._F0_LO) * self._F0_PER_ST)) + 1
+        self._f0_hist = _np.zeros(n_f0, dtype=_np.int64)
+        self._f0_n, self._f0_mean, self._f0_m2 = 0, 0.0, 0.0
+        self._h = [0, 0.0, 0, []]  # 현재 hop: 프레임 수, 에너지² 합, 유성 프레임 수, F0 값들
+        self._loud = array.array("f"); self._pitch = array.array("f"); self._voiced = array.array("f")
+
+    def _f0(self, frames):
+        """직전 프레임과 이어 붙인 40ms 창의 FFT 자기상관 → (F0 Hz, 신뢰도)."""
+        w = _np.concatenate([_np.vstack([self._prev[None, :], frames[:-1]]), frames], axis=1)
+        w = w - w.mean(axis=1, keepdims=True)
+        spec = _np.fft.rfft(w, n=self._nfft, axis=1)
+        r = _np.fft.irfft(spec.real**2 + spec.imag**2, n=self._nfft, axis=1)
+        r0 = _np.maximum(r[:, 0], 1e-9)
+        nr = r[:, self._lmin:self._lmax + 1] / r0[:, None] * self._lag_w
+        best = nr.argmax(axis=1)
+        return self.sr / (best + self._lmin), nr[_np.arange(len(best)), best]
+
+    def feed(self, y) -> None:
+        """float32 모노 샘플 블록 하나를 반영. 20ms에 못 미치는 꼬리는 다음 블록으로 넘긴다."""
+        y = _np.asarray(y, dtype=_np.float32)
+        if y.size == 0: return
+        idx = (_np.arange(self.samples, self.samples + y.size, dtype=_np.int64) * 1000) // self.sr
+        b0 = int(idx[0]); sq = _np.bincount(idx - b0, weights=y.astype(_np.float64) ** 2)
+        if b0 < len(self._ms): self._ms[b0] += float(sq[0]); sq = sq[1:]  # 블록 경계에 걸친 칸
+        self._ms.frombytes(sq.astype(_np.float32).tobytes())
+        self.samples += y.size
+        buf = _np.concatenate([self._carry, y]) if self._carry.size else y
+        k = buf.size // self.win
+        self._carry = buf[k * self.win:].copy()
+        if k == 0: return
+        frames = buf[:k * self.win].reshape(k, self.win)
+        e = _np.sqrt((frames.astype(_np.float64) ** 2).mean(axis=1))
+        if self._vad is not None:
+            pcm = (_np.clip(frames, -1.0, 1.0) * 32767).astype("<i2")
+            voiced = [self._vad.is_speech(f.tobytes(), self.sr) for f in pcm]
+        else:
+            voiced = []
+            for ei in e:  # 천천히 줄어드는 최댓값의 10%를 넘으면 유성
+                self._peak = max(self._peak * 0.995, float(ei))
+                voiced.append(ei > max(0.1 * self._peak, 3e-3))
+        f0, conf = self._f0(frames) if self.f0 else (_np.zeros(k), _np.zeros(k))
+        self._prev = frames[-1].copy()
+        for i in range(k):
+            h = self._h
+            if voiced[i] and conf[i] >= self._F0_MIN_CONF:
+                self._add_f0(float(f0[i])); h[3].append(float(f0[i]))
+            h[0] += 1; h[1] += float(e[i]) ** 2; h[2] += 1 if voiced[i] else 0
+            if h[0] == self.hop: self._flush_hop()
+
+    def _add_f0(self, hz: float):
+        self._f0_n += 1
+        d = hz - self._f0_mean; self._f0_mean += d / self._f0_n; self._f0_m2 += d * (hz - self._f0_mean)
+        b = int(round(12 * math.log2(hz / self._F0_LO) * self._F0_PER_ST))
+        self._f0_hist[min(max(b, 0), self._f0_hist.size - 1)] += 1
+
+    def _flush_hop(self):
+        n, sq, nv, f0s = self._h
+        if n:
+            self._loud.append(10.0 * math.log10(max(sq / n, 1e-12)))
+            self._pitch.append(sorted(f0s)[len(f0s)//2] if f0s else 0.0)
+            self._voiced.append(nv / n)
+        self._h = [0, 0.0, 0, []]
+
+    def _hist_quantile(self, hist, q: float) -> int:
+        cum = _np.cumsum(hist)
+        return int(_np.searchsorted(cum, q, side="right"))
+
+    def finish(self, stt_text: str) -> dict:
+        """남은 꼬리를 반영하고 analyze_prosody와 같은 키 + 'contours'를 돌려준다."""
+        if self.samples == 0:
+            raise RuntimeError("empty audio")
+        self._carry = self._carry[:0]
+        self._flush_hop()
+        out = _segment_labels(_np.frombuffer(self._ms, dtype=_np.float32).astype(_np.float64),
+                              self.sr, self.samples, stt_text)
+        if self._f0_n >= 5:  # F0는 참고값으로만(어조 라벨은 기존 경로처럼 dB 범위 기준)
+            b = self._hist_quantile(self._f0_hist, self._f0_n // 2)
+            out.update(f0_hz=self._F0_LO * 2 ** (b / (12 * self._F0_PER_ST)), f0_var=math.sqrt(self._f0_m2 / self._f0_n))
+        out["contours"] = {"hop_s": self.hop_s,
+                           "loudness_db": _np.frombuffer(self._loud, dtype=_np.float32).copy(),
+                           "f0_hz": _np.frombuffer(self._pitch, dtype=_np.float32).copy(),   # 무성 구간은 0
+                           "voiced": _np.frombuffer(self._voiced, dtype=_np.float32).copy()}
+        return out
+
+def _iter_blocks(src, block_s: float):
+    """(float32 모노 블록, sr)을 차례로. WAV(바이트 또는 경로)와 soundfile이 읽는 형식은 block_s씩 읽고,
+    그 밖은 한 번 디코딩 후 자른다."""
+    if isinstance(src, (bytes, bytearray)):
+        head = src[:4]
+    else:
+        with open(src, "rb") as f: head = f.read(4)
+    if head == b"RIFF":
+        with wave.open(io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src, "rb") as wf:
+            ch, sw, sr = wf.getnchannels(), wf.getsampwidth(), wf.getframerate()
+            if sw not in (1, 2): raise ValueError(f"sample width {sw}")
+            n = max(1, int(sr * block_s))
+            while True:
+                raw = wf.readframes(n)
+                if not raw: break
+                if sw == 2: y = _np.frombuffer(raw, dtype="<i2").astype(_np.float32) / 32768.0
+                else:       y = (_np.frombuffer(raw, dtype=_np.uint8).astype(_np.float32) - 128.0) / 128.0
+                if ch > 1: y = y[: y.size//ch*ch].reshape(-1, ch).mean(axis=1)
+                yield y, sr
+        return
+    if _sf is not None:
+        # libsndfile이 읽는 형식(FLAC/OGG, 1.1+는 MP3)은 블록 단위로 디코딩
+        try:
+            f = _sf.SoundFile(io.BytesIO(src) if isinstance(src, (bytes, bytearray)) else src)
+        except Exception:
+            f = None
+        if f is not None:
+            with f:
+                for blk in f.blocks(blocksize=max(1, int(f.samplerate * block_s)), dtype="float32", always_2d=True):
+                    yield blk.mean(axis=1), f.samplerate
+            return
+    if not isinstance(src, (bytes, bytearray)):
+        with open(src, "rb") as f: src = f.read()
+    y, sr = _decode_mono_float(src)
+    if y is None: raise ValueError("undecodable audio")
+    n = max(1, int(sr * block_s))
+    for i in range(0, y.size, n):
+        yield y[i:i+n], sr
+
+def analyze_prosody_stream(audio, stt_text: str, block_s: float = 0.5, f0: bool = True, hop_s: float = 0.1) -> dict:
+    """StreamingProsody로 블록 단위 분석(WAV는 메모리 사용이 클립 길이와 무관). audio: 바이트 또는 파일 경로.
+    numpy가 없거나 디코딩에 실패하면 analyze_prosody로."""
+    if _np is None:
+        if not isinstance(audio, (bytes, bytearray)):
+            with open(audio, "rb") as f: audio = f.read()
+        return analyze_prosody(audio, stt_text)
+    try:
+        an = None
+        for y, sr in _iter_blocks(audio, block_s):
+            if an is None: an = StreamingProsody(sr, hop_s, f0)
+            an.feed(y)
+        if an is None: raise RuntimeError("empty audio")
+        return an.finish(stt_text)
+    except Exception:
+        if not isinstance(audio, (bytes, bytearray)):
+            with open(audio, "rb") as f: audio = f.read()
+        return analyze_prosody(audio, stt_text)
+
+# ───────── 전체 연습 믹스다운(스트리밍) ─────────────────────────────
+# 줄 조각을 블록 단위로 디코딩·리샘플해 16 kHz 모노 WAV에 곧바로 써 내려간다. 메모리에는
+# 블록 하나만 있으므로 세션 길이와 무관하다. 줄 경계는 WAV cue/labl 청크(편집기 마커)와 WebVTT 챕터로 남긴다.
+MIX_SR = 16000
+
+def _chunk(tag: bytes, body: bytes) -> bytes:
+    return tag + struct.pack("<I", len(body)) + body + (b"\0" if len(body) % 2 else b"")
+
+class _Resampler:
+    """블록 단위 선형 보간 리샘플러. 블록 경계의 위상과 꼬리 샘플을 다음 블록으로 넘긴다."""
+    def __init__(self, sr_in: float, sr_out: int):
+        self.step = float(sr_in) / sr_out; self.pos = 0.0
+        self.tail = _np.zeros(0, dtype=_np.float32)
+
+    def __call__(self, y):
+        if abs(self.step - 1.0) < 1e-9: return y
+        buf = _np.concatenate((self.tail, y)) if self.tail.size else y
+        if buf.size < 2 or self.pos > buf.size - 1:
+            self.tail = buf; return buf[:0]
+        k = int((buf.size - 1 - self.pos) // self.step) + 1
+        out = _np.interp(self.pos + self.step * _np.arange(k), _np.arange(buf.size), buf).astype(_np.float32)
+        nxt = self.pos + self.step * k; drop = min(int(nxt), buf.size)
+        self.tail = buf[drop:]; self.pos = nxt - drop
+        return out
+
+class ChapterWavWriter:
+    """16bit 모노 WAV를 흘려 쓰고, 닫을 때 cue + LIST/adtl(labl·ltxt) 청크로 챕터 마커를 붙인다.
+    wave 모듈은 data 뒤에 청크를 둘 수 없어 헤더를 직접 쓰고 닫을 때 크기를 고친다."""
+    def __init__(self, path: str, sr: int = MIX_SR):
+        self.sr, self.frames = sr, 0
+        self._chapters = []  # [제목, 시작 샘플, 끝 샘플]
+        self._f = open(path, "wb")
+        self._f.write(b"RIFF\0\0\0\0WAVE" + _chunk(b"fmt ", struct.pack("<HHIIHH", 1, 1, sr, sr*2, 2, 16)) + b"data\0\0\0\0")
+
+    def write(self, y):
+        if y.size:
+            self._f.write((_np.clip(y, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()); self.frames += int(y.size)
+
+    def silence(self, secs: float):
+        n = int(secs * self.sr)
+        while n > 0:
+            k = min(n, self.sr); self._f.write(bytes(2*k)); self.frames += k; n -= k
+
+    def mark(self, title: str):
+        self.end_chapter(); self._chapters.append([title, self.frames, None])
+
+    def end_chapter(self):
+        if self._chapters and self._chapters[-1][2] is None: self._chapters[-1][2] = self.frames
+
+    def close(self) -> list:
+        """[{title, start_s, end_s}]"""
+        self.end_chapter()
+        cue = struct.pack("<I", len(self._chapters)) + b"".join(
+            struct.pack("<II4sIII", i+1, a, b"data", 0, 0, a) for i, (_, a, _b) in enumerate(self._chapters))
+        adtl = b"adtl" + b"".join(
+            _chunk(b"labl", struct.pack("<I", i+1) + t.encode("utf-8") + b"\0")
+            + _chunk(b"ltxt", struct.pack("<II4sHHHH", i+1, b - a, b"rgn ", 0, 0, 0, 0))
+            for i, (t, a, b) in enumerate(self._chapters))
+        tail = _chunk(b"cue ", cue) + _chunk(b"LIST", adtl)
+        self._f.write(tail)
+        self._f.seek(4);  self._f.write(struct.pack("<I", 4 + 24 + 8 + 2*self.frames + len(tail)))
+        self._f.seek(40); self._f.write(struct.pack("<I", 2*self.frames))
+        self._f.close()
+        return [{"title": t, "start_s": a / self.sr, "end_s": b / self.sr} for t, a, b in self._chapters]
+
+def chapters_vtt(chapters: list) -> str:
+    """챕터 목록 → WebVTT(chapters) 텍스트."""
+    def ts(s: float) -> str:
+        ms = int(round(s * 1000)); h, ms = divmod(ms, 3600000); m, ms = divmod(ms, 60000)
+        return f"{h:02d}:{m:02d}:{ms//1000:02d}.{ms%1000:03d}"
+    return "WEBVTT\n\n" + "".join(f"{i+1}\n{ts(c['start_s'])} --> {ts(c['end_s'])}\n{c['title']}\n\n"
+                                  for i, c in enumerate(chapters))
+
+def mixdown(parts, out_path: str, sr: int = MIX_SR, gap_s: float = 0.3, block_s: float = 0.5) -> list:
+    """parts: (제목, 오디오 바이트|경로|None, 재생 속도, 대체 무음 초)의 순서열(제너레이터 가능).
+    조각마다 블록 단위로 디코딩해 바로 쓰고, 소리가 하나도 안 나오면 대체 무음으로 자리를 채운다.
+    재생 속도는 TTSStream과 같은 방식의 피치 보정(리샘플링)이다. 반환: 챕터 목록."""
+    if _np is None:
+        raise RuntimeError("numpy가 필요합니다")
+    w = ChapterWavWriter(out_path, sr)
+    try:
+        for title, src, rate, fallback_s in parts:
+            w.mark(title); start = w.frames
+            if src is not None:
+                try:
+                    rs = None
+                    for y, sr_in in _iter_blocks(src, block_s):
+                        if rs is None: rs = _Resampler(sr_in * rate, sr)
+                        w.write(rs(y))
+                except Exception:
+                    pass  # 깨진 조각은 거기까지(또는 대체 무음)
+            if w.frames == start and fallback_s: w.silence(fallback_s)
+            w.end_chapter()
+            if gap_s: w.silence(gap_s)
+    except BaseException:
+        w.close(); raise
+    return w.close()
+
+# ───────── 공유 프로세스 풀: 디코딩·프로소디·피치 작업 오프로딩 ─────────
+# 스트림릿 스크립트 스레드가 GIL을 붙잡지 않도록 별도 프로세스에서 돌린다.
+# 오디오 버퍼는 pickle 대신 공유 메모리 이름만 넘기고, 작업마다 제한 시간을 두며,
+# 자리가 없거나(backpressure) 시간이 넘으면 호출 스레드에서 값싼 단계로 대체한다.
+def analyze_prosody_lite(audio, stt_text: str) -> dict:
+    """바쁠 때 단계: F0 없이 에너지·유성 통계만, 윤곽선은 0.2초 간격."""
+    return analyze_prosody_stream(audio, stt_text, f0=False, hop_s=0.2)
+
+def _fallback_prosody(data: bytes, stt_text: str) -> dict:
+    return dict(analyze_prosody_fast(data, stt_text), tier="fallback")
+
+JOBS = {
+    "prosody":      analyze_prosody_stream,
+    "prosody_fast": analyze_prosody_lite,
+    "pitch":        _pitch_shift_mp3,
+    "stt_prep":     preprocess_audio_for_stt,
+}
+FALLBACKS = {
+    "prosody":      _fallback_prosody,
+    "prosody_fast": _fallback_prosody,
+    "pitch":        lambda data, *args: data,   # 피치 보정 없이 원본
+    "stt_prep":     lambda data, *args: data,   # 전처리 없이 원본 업로드
+}
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    # 작업 프로세스가 붙을 때 resource_tracker에 등록하면 종료 시 부모 소유 블록을 지워 버린다
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # 3.13+
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    reg = resource_tracker.register
+    resource_tracker.register = lambda *a, **k: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = reg
+
+def _run_job(kind: str, shm_name: str, size: int, args: tuple):
+    shm = _attach_shm(shm_name)
+    try:
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    t0 = time.perf_counter()
+    res = JOBS[kind](data, *args)
+    if isinstance(res, dict): res["analysis_ms"] = (time.perf_counter() - t0) * 1000  # 대기 시간 제외 처리 시간
+    return res
+
+class AudioPool:
+    """여러 세션이 함께 쓰는 크기 제한 프로세스 풀.
+
+    workers개가 동시에 돌고 max_pending개까지 대기한다. 그보다 많으면 queue_wait_s만 기다렸다가
+    FALLBACKS로 바로 처리하고, 제출된 작업이 timeout_s 안에 끝나지 않아도 FALLBACKS 결과를 돌려준다.
+    """
+    def __init__(self, workers: int, max_pending: Optional[int] = None, timeout_s: float = 8.0,
+                 queue_wait_s: float = 0.05, target_s: float = 1.0):
+        self.workers = max(1, int(workers))
+        self.sched = TierScheduler(target_s)
+        self.max_pending = self.workers * 2 if max_pending is None else max(0, int(max_pending))
+        self.timeout_s = timeout_s; self.queue_wait_s = queue_wait_s
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._ex = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "done": 0, "timeout": 0, "rejected": 0, "failed": 0, "in_flight": 0}
+
+    def _count(self, key: str, delta: int = 1):
+        with self._lock:
+            self.stats[key] += delta
+
+    def _finish(self, fut, shm: shared_memory.SharedMemory):
+        try:
+            shm.close(); shm.unlink()
+        except Exception:
+            pass
+        self._count("in_flight", -1)
+        self._slots.release()
+
+    def run(self, kind: str, data: bytes, *args):
+        if not self._slots.acquire(timeout=self.queue_wait_s):
+            self._count("rejected")
+            return FALLBACKS[kind](data, *args)
+        shm = None
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            shm.buf[:len(data)] = data
+            fut = self._ex.submit(_run_job, kind, shm.name, len(data), args)
+        except Exception:
+            if shm is not None:
+                shm.close(); shm.unlink()
+            self._slots.release(); self._count("failed")
+            return FALLBACKS[kind](data, *args)
+        self._count("submitted"); self._count("in_flight")
+        fut.add_done_callback(lambda f, shm=shm: self._finish(f, shm))
+        try:
+            res = fut.result(timeout=self.timeout_s)
+            self._count("done")
+            return res
+        except _FutTimeout:
+            fut.cancel(); self._count("timeout")
+        except Exception:
+            self._count("failed")
+        return FALLBACKS[kind](data, *args)
+
+    def shutdown(self):
+        self._ex.shutdown(wait=False, cancel_futures=True)
+
+def run_audio_job(pool: Optional[AudioPool], kind: str, data: bytes, *args):
+    """풀이 있으면 풀에서, 없으면(워커 0개) 지금 스레드에서 바로 실행. 'prosody'는 단계 스케줄러를 거친다."""
+    if kind == "prosody":
+        return run_prosody(pool, data, *args)
+    if pool is None:
+        return JOBS[kind](data, *args)
+    return pool.run(kind, data, *args)
+
+# ───────── 프로소디 단계 스케줄러(부하에 따라 full/fast) ─────────────────
+# 라이브러리 유무가 아니라 서버 상태로 단계를 고른다. 풀 대기열 길이와 최근 처리 시간(오디오 1초당)으로
+# 이번 요청이 full로 끝나는 시각을 어림하고, 목표(p95)를 넘을 것 같으면 F0를 건너뛰는 fast로 보낸다.
+# 풀에 못 들어가거나 시간이 넘으면 기존처럼 호출 스레드의 에너지 분석(fallback). 결과 dict에 'tier'.
+def _wav_seconds(data: bytes) -> Optional[float]:
+    if data[:4] != b"RIFF": return None
+    try:
+        with wave.open(io.BytesIO(data), "rb") as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except Exception:
+        return None
+
+class TierScheduler:
+    """표본은 max_age_s가 지나면 버린다(한때 몰린 뒤에도 계속 fast로 묶이지 않게). 빈 워커가 있는데
+    probe_s 동안 full을 안 돌렸으면 full을 한 번 시험한다. 풀 자리가 없거나 최근 overload_s 안에
+    풀 입장 거절·시간 초과(fallback)가 있었으면 fast(짧은 작업으로 대기열을 빨리 비운다)."""
+    TIERS = ("full", "fast", "fallback")
+
+    def __init__(self, target_s: float, window: int = 200, max_age_s: float = 60.0, probe_s: float = 5.0,
+                 overload_s: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.target_s = target_s
+        self.max_age_s, self.probe_s, self.overload_s = max_age_s, probe_s, overload_s
+        self._clock = clock
+        self._svc = {"full": deque(maxlen=window), "fast": deque(maxlen=window)}  # (시각, 처리 시간 / 오디오 초)
+        self._lat: deque = deque(maxlen=window)  # (단계, 요청~결과 초)
+        self._last_full = self._overload = -math.inf
+        self.counts = dict.fromkeys(self.TIERS, 0)
+        self._lock = threading.Lock()
+
+    def _rate(self, tier: str, q: float, now: float) -> Optional[float]:
+        with self._lock:
+            d = self._svc[tier]
+            while d and d[0][0] < now - self.max_age_s: d.popleft()
+            v = sorted(r for _, r in d)
+        return v[min(len(v)-1, int(round(q*(len(v)-1))))] if v else None
+
+    def choose(self, in_flight: int, workers: int, audio_s: Optional[float], capacity: Optional[int] = None) -> str:
+        now = self._clock()
+        tier = self._choose(now, in_flight, workers, audio_s, capacity)
+        if tier == "full":
+            with self._lock: self._last_full = now
+        return tier
+
+    def _choose(self, now: float, in_flight: int, workers: int, audio_s: Optional[float], capacity: Optional[int]) -> str:
+        if capacity is not None and in_flight >= capacity: return "fast"  # 들어가도 기다리다 거절될 자리
+        if in_flight < workers and now - self._last_full >= self.probe_s: return "full"  # 빈 워커로 시험
+        if now - self._overload < self.overload_s: return "fast"
+        mean, p95 = self._rate("full", 0.5, now), self._rate("full", 0.95, now)
+        if p95 is None: return "full"  # 기록이 없으면 먼저 full로 재 본다
+        secs = audio_s or 3.0
+        ahead = max(0, in_flight - workers + 1)  # 빈 워커가 없을 때 앞에 밀린 작업 수
+        predicted = (ahead / max(1, workers)) * mean * secs + p95 * secs
+        return "full" if predicted <= self.target_s else "fast"
+
+    def record(self, tier: str, latency_s: float, svc_ms: Optional[float], audio_s: Optional[float]):
+        now = self._clock()
+        with self._lock:
+            self.counts[tier] = self.counts.get(tier, 0) + 1
+            self._lat.append((tier, latency_s))
+            if tier == "fallback": self._overload = now
+            if tier in self._svc and svc_ms is not None:
+                self._svc[tier].append((now, svc_ms / 1000.0 / max(audio_s or 3.0, 0.1)))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lat = sorted(v for _, v in self._lat)
+            counts = dict(self.counts)
+        n = sum(counts.values())
+        return {"target_ms": self.target_s * 1000, "counts": counts,
+                "share": {k: (v / n if n else 0.0) for k, v in counts.items()},
+                "p95_ms": lat[min(len(lat)-1, int(round(0.95*(len(lat)-1))))] * 1000 if lat else None}
+
+def run_prosody(pool: Optional[AudioPool], data: bytes, stt_text: str) -> dict:
+    if pool is None:
+        return dict(analyze_prosody_stream(data, stt_text), tier="full")
+    secs = _wav_seconds(data)
+    tier = pool.sched.choose(pool.stats["in_flight"], pool.workers, secs, pool.workers + pool.max_pending)
+    t0 = time.perf_counter()
+    res = pool.run("prosody" if tier == "full" else "prosody_fast", data, stt_text)
+    res.setdefault("tier", tier)
+    pool.sched.record(res["tier"], time.perf_counter() - t0, res.get("analysis_ms"), secs)
+    return res
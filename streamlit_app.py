@@ -1,36 +1,31 @@
 # -*- coding: utf-8 -*-
-import os, io, re, json, time, base64, uuid, datetime, struct, wave, hashlib, math, platform
-from typing import List, Dict, Tuple, Optional
+import os, io, re, sys, json, time, base64, uuid, datetime, hashlib, heapq, bisect, platform, threading, shutil, tempfile, weakref, functools
+from typing import List, Dict, Tuple, Optional, Callable
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
 
 import streamlit as st
 import requests
 from difflib import SequenceMatcher
+from html import escape as _esc
 
 # 선택 의존성 ─────────────────────────────────────────────────────────
-try:
-    from pydub import AudioSegment, effects, silence as _silence
-    from pydub.utils import which as _which
-except Exception:
-    AudioSegment, effects, _silence, _which = None, None, None, None
 try:
     from audio_recorder_streamlit import audio_recorder
 except Exception:
     audio_recorder = None
-
-# librosa(프로소디 분석, 선택)
-try:
-    import librosa as _lb
-    import soundfile as _sf
-except Exception:
-    _lb = None
 try:
-    import numpy as _np
+    import streamlit.components.v1 as _components
+    _COMPONENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components")
+    _tts_stream_player = _components.declare_component("tts_stream_player", path=os.path.join(_COMPONENTS_DIR, "tts_stream_player"))
+    _endpoint_recorder = _components.declare_component("endpoint_recorder", path=os.path.join(_COMPONENTS_DIR, "endpoint_recorder"))
 except Exception:
-    _np = None
-try:
-    import webrtcvad as _vad  # 선택, 없으면 무시
-except Exception:
-    _vad = None
+    _tts_stream_player = _endpoint_recorder = None
+
+# 오디오 처리(전처리·피치·프로소디) + 작업 프로세스 풀
+from audio_analysis import STT_UPLOAD_FORMATS, preprocess_audio_for_stt, analyze_prosody, analyze_prosody_stream, AudioPool, run_audio_job
+from audio_analysis import mixdown, chapters_vtt
 
 # PDF
 from reportlab.lib.pagesizes import A4
@@ -43,42 +38,47 @@ from reportlab.pdfbase.ttfonts import TTFont
 from openai import OpenAI
 
 # ───────── 시크릿
-OPENAI_API_KEY       = st.secrets.get("OPENAI_API_KEY", "")
-CLOVA_SPEECH_SECRET  = st.secrets.get("CLOVA_SPEECH_SECRET", "")
-NAVER_CLOVA_OCR_URL  = st.secrets.get("NAVER_CLOVA_OCR_URL", "")
-NAVER_OCR_SECRET     = st.secrets.get("NAVER_OCR_SECRET", "")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# ───────── ffmpeg 경로 안전 장치 ──────────────────────────────────
-def _ensure_ffmpeg_path():
-    """pydub이 ffmpeg를 못 찾을 때, 윈도우 공통 경로를 자동 시도."""
-    if _which is None or AudioSegment is None:
-        return
+def _secret(name: str, default: str = "") -> str:
+    """st.secrets → 환경변수 순으로 조회. secrets.toml이 없는 도구/CLI 실행에서도 동작."""
     try:
-        if _which("ffmpeg") and _which("ffprobe"):
-            return
+        v = st.secrets.get(name)
     except Exception:
-        pass
-    candidates = [
-        r"C:\\ffmpeg\\bin",
-        r"C:\\Program Files\\ffmpeg\\bin",
-        r"C:\\Program Files (x86)\\ffmpeg\\bin",
-    ]
-    for p in candidates:
-        ff = os.path.join(p, "ffmpeg.exe")
-        if os.path.exists(ff):
-            os.environ["PATH"] = p + os.pathsep + os.environ.get("PATH", "")
-            try:
-                AudioSegment.converter = ff
-                prob = os.path.join(p, "ffprobe.exe")
-                if os.path.exists(prob):
-                    AudioSegment.ffprobe = prob
-            except Exception:
-                pass
-            break
-
-_ensure_ffmpeg_path()
+        v = None
+    return str(v) if v not in (None, "") else os.environ.get(name, default)
+
+OPENAI_API_KEY       = _secret("OPENAI_API_KEY")
+CLOVA_SPEECH_SECRET  = _secret("CLOVA_SPEECH_SECRET")
+NAVER_CLOVA_OCR_URL  = _secret("NAVER_CLOVA_OCR_URL")
+NAVER_OCR_SECRET     = _secret("NAVER_OCR_SECRET")
+# API 주소(로컬 스텁 서버/프록시로 바꿔 부하 테스트 가능)
+OPENAI_BASE_URL      = _secret("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+CLOVA_SPEECH_URL     = _secret("CLOVA_SPEECH_URL", "https://clovaspeech-gw.ncloud.com").rstrip("/")
+# 파트너 TTS 스트리밍 재생(받는 즉시 브라우저에서 재생). 0이면 전체 수신 후 재생
+TTS_STREAMING        = _secret("TTS_STREAMING", "1").lower() not in ("0", "false", "no", "off")
+TTS_POLL_MS          = int(_secret("TTS_POLL_MS", "250"))  # 스트리밍 중 새 청크를 모아 보내는 간격
+# 오디오 CPU 작업 프로세스 풀: 워커 수(0이면 스크립트 스레드에서 바로), 대기열 길이, 작업 제한 시간(초)
+AUDIO_POOL_WORKERS   = int(_secret("AUDIO_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUDIO_POOL_PENDING   = int(_secret("AUDIO_POOL_PENDING", str(2 * max(1, AUDIO_POOL_WORKERS))))
+AUDIO_JOB_TIMEOUT    = float(_secret("AUDIO_JOB_TIMEOUT", "8"))
+# 프로소디 분석 목표 p95(ms): 풀이 밀려 넘을 것 같으면 음높이(F0)를 건너뛰는 빠른 단계로
+PROSODY_TARGET_MS    = float(_secret("PROSODY_TARGET_MS", "1000"))
+# 녹음기: 브라우저 끝점 검출(말이 끝나고 ENDPOINT_HANGOVER_MS 뒤 자동 멈춤, 앞뒤 무음 잘라 16 kHz 전송).
+# 0이면 audio-recorder-streamlit(말 끝 2초 대기)
+ENDPOINT_RECORDER    = _secret("ENDPOINT_RECORDER", "1").lower() not in ("0", "false", "no", "off")
+ENDPOINT_HANGOVER_MS = int(_secret("ENDPOINT_HANGOVER_MS", "600"))
+# STT 업로드 인코딩: wav | flac | ogg(Opus). 실패하면 wav로 되돌아감
+STT_UPLOAD_FORMAT    = _secret("STT_UPLOAD_FORMAT", "flac").lower()
+# 장면별 병렬 피드백/완성본: 동시에 보내는 chat 요청 수
+SCENE_PARALLEL       = int(_secret("SCENE_PARALLEL", "6"))
+# 외부 API(TTS/STT/OCR) 회로 차단기: 제한 시간 상한(초), 연속 실패 수, 차단 유지 시간(초), TTS 캐시 크기(MB)
+BACKEND_TIMEOUT_MAX  = float(_secret("BACKEND_TIMEOUT_MAX", "60"))
+BREAKER_FAILS        = int(_secret("BREAKER_FAILS", "5"))
+BREAKER_COOLDOWN     = float(_secret("BREAKER_COOLDOWN", "15"))
+TTS_CACHE_MB         = int(_secret("TTS_CACHE_MB", "32"))
+# 세션 공유 읽기 전용 저장소(대본 파싱 결과·큐카드 PDF·그림) 예산(MB)
+SHARED_CACHE_MB      = int(_secret("SHARED_CACHE_MB", "64"))
+
+client = OpenAI(api_key=OPENAI_API_KEY or "unset", base_url=OPENAI_BASE_URL)  # 키가 없어도 앱은 뜨고, 호출 시점에 오류
 
 # ───────── UI (파스텔 + 상단 잘림 보정 + 다크모드 대응) ───────────────────────────
 PASTEL_CSS = """
@@ -175,17 +175,39 @@ def extract_roles(script: str) -> List[str]:
         if who not in roles: roles.append(who)
     return roles
 
+def _parse_dialogue(line: str) -> Optional[Tuple[str, str]]:
+    m = re.match(r"\s*([^:：]+)\s*[:：]\s*(.+)$", line)
+    if not m: return None
+    who = _normalize_role(m.group(1))
+    if _is_banned_role(who) or who=="": return None
+    return who, m.group(2).strip()
+
 def build_sequence(script: str) -> List[Dict]:
     seq=[]
     for line in clean_script_text(script).splitlines():
-        m = re.match(r"\s*([^:：]+)\s*[:：]\s*(.+)$", line)
-        if not m: continue
-        who = _normalize_role(m.group(1))
-        if _is_banned_role(who) or who=="": continue
-        text = m.group(2).strip()
-        seq.append({"who":who, "text":text})
+        d = _parse_dialogue(line)
+        if d: seq.append({"who":d[0], "text":d[1]})
     return seq
 
+# 장면 머리글: "장면 3", "**장면 3**", "[장면 3] 숲속", "씬 3: ..." 등
+_SCENE_RE = re.compile(r"^\s*[\*\[#(\s]*(?:장면|씬)\s*(\d+)")
+
+def build_scene_index(script: str) -> List[Dict]:
+    """'장면 N' 머리글 목록. line=원문 줄 위치, seq=그 장면 첫 대사의 build_sequence 위치."""
+    scenes=[]; n_seq=0
+    for i, line in enumerate(clean_script_text(script).splitlines()):
+        m = _SCENE_RE.match(line)
+        if m:
+            title = re.sub(r"^[\s\*\[#(]+|[\s\*\])]+$", "", line)
+            scenes.append({"no": int(m.group(1)), "title": title, "line": i, "seq": n_seq})
+        elif _parse_dialogue(line):
+            n_seq += 1
+    return scenes
+
+def scene_of(scenes: List[Dict], seq_idx: int) -> Optional[Dict]:
+    i = bisect.bisect_right([sc["seq"] for sc in scenes], seq_idx) - 1
+    return scenes[i] if i >= 0 else None
+
 # 추가: 인물별 줄 수 집계
 def _count_lines_by_role(text: str, roles: List[str]) -> Dict[str, int]:
     counts = {r: 0 for r in roles}
@@ -207,38 +229,246 @@ def _norm_for_ratio(s: str) -> str:
     s = re.sub(r"\s+", "", s)
     return s
 
-def match_highlight_html(expected: str, spoken: str) -> Tuple[str, float]:
-    tokens = re.split(r"(\s+)", expected.strip())
-    sp_norm = _norm_for_ratio(spoken or "")
+# 줄별 일치율 특징: 대본 쪽은 파싱할 때 한 번만 만들고(line_features), 턴마다 말한 쪽만 처리
+_KO_RUN = re.compile(r"[가-힣0-9]+")
+
+def line_features(text: str) -> Dict:
+    """대본 한 줄 → 지문 뺀 본문, 한글·숫자 음절열, 어절 집합, 하이라이트 토큰, LCS 비트마스크, 음절 수."""
+    core = re.sub(r"\(.*?\)", "", text).strip()
+    ko = "".join(_KO_RUN.findall(core))
+    masks: Dict[str, int] = {}
+    for i, ch in enumerate(ko):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+    return {"core": core, "ko": ko, "words": frozenset(_KO_RUN.findall(core)), "masks": masks,
+            "tokens": [(t, None if t.isspace() else _norm_for_ratio(t)) for t in re.split(r"(\s+)", core) if t],
+            "n_syl": len(ko)}
+
+def with_line_features(seq: List[Dict]) -> List[Dict]:
+    for line in seq:
+        line["feat"] = line_features(line["text"])
+    return seq
+
+def spoken_features(spoken: str) -> Dict:
+    spoken = spoken or ""
+    return {"norm": _norm_for_ratio(spoken), "ko": "".join(_KO_RUN.findall(re.sub(r"\(.*?\)", "", spoken))),
+            "words": set(_KO_RUN.findall(spoken))}
+
+def _lcs_len_bits(masks: Dict[str, int], m: int, s: str) -> int:
+    """비트 병렬 LCS 길이(Crochemore 외): 대본 쪽 문자별 위치 마스크로 말한 문자 하나당 정수 연산 몇 번."""
+    if m == 0: return 0
+    full = (1 << m) - 1; v = full
+    for ch in s:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return m - v.bit_count()
+
+def highlight_html_feat(feat: Dict, sp: Dict) -> str:
     out=[]
-    for tok in tokens:
-        if tok.isspace(): out.append(tok); continue
-        if not tok: continue
-        ok = _norm_for_ratio(tok) and _norm_for_ratio(tok) in sp_norm
+    for tok, norm in feat["tokens"]:
+        if norm is None: out.append(tok); continue
+        ok = norm and norm in sp["norm"]
         out.append(f"<span class='{ 'ok' if ok else 'miss' }'>{tok}</span>")
-    ratio = SequenceMatcher(None, _norm_for_ratio(expected), _norm_for_ratio(spoken or "")).ratio()
-    return "<div class='hi'>"+"".join(out)+"</div>", ratio
+    return "<div class='hi'>"+"".join(out)+"</div>"
 
-def similarity_score(expected: str, spoken: str) -> float:
-    def ko_only(s):
-        s = re.sub(r"\(.*?\)", "", s); return "".join(re.findall(r"[가-힣0-9]+", s))
-    e = ko_only(expected or ""); s = ko_only(spoken or "")
+def similarity_feat(feat: Dict, sp: Dict) -> float:
+    e, s = feat["ko"], sp["ko"]
     if not s: return 0.0
     ratio = SequenceMatcher(None, e, s).ratio()
-    ew = set(re.findall(r"[가-힣0-9]+", expected or ""))
-    sw = set(re.findall(r"[가-힣0-9]+", spoken or ""))
+    ew, sw = feat["words"], sp["words"]
     jacc = len(ew & sw) / max(1, len(ew | sw)) if (ew or sw) else 0.0
-    def lcs_len(a,b):
-        dp=[[0]*(len(b)+1) for _ in range(len(a)+1)]
-        for i in range(1,len(a)+1):
-            for j in range(1,len(b)+1):
-                dp[i][j]=dp[i-1][j-1]+1 if a[i-1]==b[j-1] else max(dp[i-1][j],dp[i][j-1])
-        return dp[-1][-1]
-    l = lcs_len(e, s)
+    l = _lcs_len_bits(feat["masks"], len(e), s)
     prec = l/max(1,len(s)); rec = l/max(1,len(e))
     f1 = (2*prec*rec/(prec+rec)) if (prec+rec)>0 else 0.0
     return max(ratio, jacc, f1)
 
+def _raw_line_features(text: str) -> Dict:
+    """예전 문자열 API용: 어절 집합·하이라이트 토큰은 지문 (…)까지 포함(음절열은 line_features처럼 지문 제외)."""
+    text = text or ""
+    return dict(line_features(text), words=frozenset(_KO_RUN.findall(text)),
+                tokens=[(t, None if t.isspace() else _norm_for_ratio(t)) for t in re.split(r"(\s+)", text.strip()) if t])
+
+def match_highlight_html(expected: str, spoken: str) -> Tuple[str, float]:
+    feat, sp = _raw_line_features(expected), spoken_features(spoken)
+    ratio = SequenceMatcher(None, _norm_for_ratio(expected), sp["norm"]).ratio()
+    return highlight_html_feat(feat, sp), ratio
+
+def similarity_score(expected: str, spoken: str) -> float:
+    return similarity_feat(_raw_line_features(expected), spoken_features(spoken))
+
+def rescore_turns(turns: List[Dict], seq: List[Dict]) -> List[float]:
+    """기록된 턴(line_idx 1부터, spoken)을 미리 만든 줄 특징으로 한꺼번에 다시 채점."""
+    out = []
+    for t in turns:
+        line = seq[t["line_idx"] - 1]
+        out.append(similarity_feat(line.get("feat") or line_features(line["text"]), spoken_features(t.get("spoken"))))
+    return out
+
+# ───────── 오디오 작업 프로세스 풀(세션 공유) ─────────────────────────
+@st.cache_resource(show_spinner=False)
+def get_audio_pool() -> Optional[AudioPool]:
+    if AUDIO_POOL_WORKERS <= 0:
+        return None
+    try:
+        return AudioPool(AUDIO_POOL_WORKERS, AUDIO_POOL_PENDING, AUDIO_JOB_TIMEOUT, target_s=PROSODY_TARGET_MS/1000.0)
+    except Exception:
+        return None
+
+def audio_job(kind: str, data: bytes, *args):
+    """'prosody' | 'pitch' | 'stt_prep' 작업을 공유 풀에서 실행(시간 초과 시 값싼 단계로 대체)."""
+    return run_audio_job(get_audio_pool(), kind, data, *args)
+
+def render_audio_status(where=None):
+    """프로소디 단계 비율(full/fast/fallback)·p95(사이드바 등)."""
+    where = where or st.sidebar
+    pool = get_audio_pool()
+    if pool is None:
+        where.markdown("- 오디오 분석: 스크립트 스레드에서 바로(full)"); return
+    s = pool.sched.snapshot()
+    n = sum(s["counts"].values())
+    mix = " / ".join(f"{k} {s['share'][k]*100:.0f}%" for k in ("full", "fast", "fallback"))
+    p95 = f"p95 {s['p95_ms']:.0f} ms" if s["p95_ms"] is not None else "기록 없음"
+    where.markdown(f"- 오디오 분석 {n}건: {mix} · {p95} (목표 {s['target_ms']:.0f} ms) · 대기 {pool.stats['in_flight']}")
+
+# ───────── 외부 API 회로 차단기(세션 공유) ─────────────────────────
+# 응답 지연 분포로 제한 시간을 정하고, 연속 실패하면 잠시 요청을 막아(open) 학생 턴이 멈추지 않게 한다.
+# 막힌 동안은 바로 BackendUnavailable을 던지고, 쿨다운이 지나면 요청 1건만 시험(half-open)해 본다.
+class BackendUnavailable(RuntimeError):
+    """차단기가 열렸거나 업스트림이 실패/시간 초과한 경우."""
+
+class BackendRequestError(RuntimeError):
+    """업스트림은 살아 있지만 요청을 거절한 경우(4xx: 키 만료·설정 오류 등). 기다려도 낫지 않는다."""
+
+class CircuitBreaker:
+    def __init__(self, name: str, timeout_s: float, min_timeout_s: float, max_timeout_s: float,
+                 fail_threshold: int = BREAKER_FAILS, cooldown_s: float = BREAKER_COOLDOWN, window: int = 100):
+        self.name = name
+        self.base_timeout, self.min_timeout, self.max_timeout = timeout_s, min_timeout_s, max_timeout_s
+        self.fail_threshold = fail_threshold; self.cooldown_s = cooldown_s
+        self.state = "closed"; self.open_until = 0.0; self._cooldown = cooldown_s; self._probing = False
+        self._lat: "deque[float]" = deque(maxlen=window)
+        self._outcomes: "deque[bool]" = deque(maxlen=20)
+        self._consec = 0
+        self._lock = threading.Lock()
+        self.counts = {"ok": 0, "fail": 0, "fast_fail": 0, "opened": 0}
+
+    def timeout(self) -> float:
+        """최근 성공 응답 p95의 3배 + 0.5초(표본 8개 미만이면 기본값), [min, max]로 자름."""
+        with self._lock:
+            lat = sorted(self._lat)
+        if len(lat) < 8:
+            return self.base_timeout
+        p95 = lat[min(len(lat)-1, int(0.95*(len(lat)-1)))]
+        return max(self.min_timeout, min(self.max_timeout, 3*p95 + 0.5))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed": return True
+            if self.state == "open" and time.monotonic() >= self.open_until:
+                self.state = "half_open"; self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True; return True
+            self.counts["fast_fail"] += 1
+            return False
+
+    def blocked(self) -> bool:
+        """쿨다운 중이면 True(요청 준비 작업도 건너뛰도록 미리 확인)."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() < self.open_until:
+                self.counts["fast_fail"] += 1; return True
+            return False
+
+    def record_success(self, latency_s: float):
+        with self._lock:
+            self._lat.append(latency_s); self._outcomes.append(True)
+            self._consec = 0; self.counts["ok"] += 1
+            if self.state != "closed":
+                self.state = "closed"; self._cooldown = self.cooldown_s; self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(False); self._consec += 1; self.counts["fail"] += 1
+            recent_bad = len(self._outcomes) >= 10 and self._outcomes.count(False) >= len(self._outcomes) // 2
+            if self.state == "half_open":
+                self._cooldown = min(self._cooldown * 2, 8 * self.cooldown_s)  # 시험 실패 → 더 오래 쉼
+                self._open()
+            elif self.state == "closed" and (self._consec >= self.fail_threshold or recent_bad):
+                self._open()
+
+    def _open(self):
+        self.state = "open"; self.open_until = time.monotonic() + self._cooldown; self._probing = False
+        self.counts["opened"] += 1
+
+    def retry_in(self) -> float:
+        return max(0.0, self.open_until - time.monotonic()) if self.state == "open" else 0.0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            lat = sorted(self._lat)
+        pct = lambda q: lat[min(len(lat)-1, int(q*(len(lat)-1)))] * 1000 if lat else None
+        return {"name": self.name, "state": self.state, "p50_ms": pct(0.5), "p95_ms": pct(0.95),
+                "timeout_s": self.timeout(), "retry_in_s": self.retry_in(), **self.counts}
+
+@st.cache_resource(show_spinner=False)
+def get_breakers() -> Dict[str, CircuitBreaker]:
+    return {"stt": CircuitBreaker("CLOVA STT", 15.0, 3.0, BACKEND_TIMEOUT_MAX),
+            "tts": CircuitBreaker("OpenAI TTS", 15.0, 3.0, BACKEND_TIMEOUT_MAX),
+            "ocr": CircuitBreaker("CLOVA OCR", 20.0, 5.0, min(30.0, BACKEND_TIMEOUT_MAX))}
+
+def backend_post(backend, url: str, **kw) -> requests.Response:
+    """차단기를 거친 requests.post. 429/5xx·네트워크 오류·시간 초과는 실패로 세고 BackendUnavailable.
+    그 밖의 응답(4xx 포함)은 업스트림이 살아 있는 것이므로 성공으로 세고 그대로 돌려준다.
+    제한 시간은 연결/첫 바이트까지(requests의 read timeout) 기준이고, 지연 표본은 r.elapsed."""
+    br = backend if isinstance(backend, CircuitBreaker) else get_breakers()[backend]
+    if not br.allow():
+        raise BackendUnavailable(f"{br.name} 일시 차단 중 ({br.retry_in():.0f}초 후 재시도)")
+    t = br.timeout()
+    try:
+        r = requests.post(url, timeout=(min(3.05, t), t), **kw)
+    except Exception as e:
+        br.record_failure()
+        raise BackendUnavailable(f"{br.name} 응답 없음: {e}") from e
+    if r.status_code == 429 or r.status_code >= 500:
+        br.record_failure(); r.close()
+        raise BackendUnavailable(f"{br.name} 오류 {r.status_code}")
+    br.record_success(r.elapsed.total_seconds())
+    return r
+
+class TTSCache:
+    """합성한 원본 MP3를 (목소리, 문장)으로 보관하는 바이트 한도 LRU. TTS 차단 중에는 여기서만 재생."""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes; self.size = 0
+        self._d: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, voice_id: str, text: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._d.get((voice_id, text))
+            if data is not None: self._d.move_to_end((voice_id, text))
+            return data
+
+    def put(self, voice_id: str, text: str, data: bytes):
+        if not data or len(data) > self.max_bytes: return
+        with self._lock:
+            old = self._d.pop((voice_id, text), None)
+            if old is not None: self.size -= len(old)
+            self._d[(voice_id, text)] = data; self.size += len(data)
+            while self.size > self.max_bytes:
+                _, ev = self._d.popitem(last=False); self.size -= len(ev)
+
+@st.cache_resource(show_spinner=False)
+def get_tts_cache() -> TTSCache:
+    return TTSCache(TTS_CACHE_MB * 1024 * 1024)
+
+def render_backend_status(where=None):
+    """차단기 상태·지연 통계(사이드바 등)."""
+    where = where or st.sidebar
+    icon = {"closed": "🟢", "half_open": "🟡", "open": "🔴"}
+    for s in (br.snapshot() for br in get_breakers().values()):
+        lat = f"p50 {s['p50_ms']:.0f} / p95 {s['p95_ms']:.0f} ms" if s["p50_ms"] is not None else "기록 없음"
+        extra = f" · {s['retry_in_s']:.0f}초 후 재시도" if s["state"] == "open" else ""
+        where.markdown(f"- {icon[s['state']]} {s['name']}: {lat} · 제한 {s['timeout_s']:.1f}초 · "
+                       f"실패 {s['fail']} · 차단 {s['fast_fail']}{extra}")
+
 # ───────── OpenAI TTS (지문 미낭독 + 성별 톤 보정) ─────────────────────
 VOICE_KR_LABELS_SAFE = [
     "민준 (남성, 따뜻하고 친근한 목소리)",
@@ -260,16 +490,32 @@ VOICE_MAP_SAFE = {
     "지민 (여성, 부드럽고 친절한 목소리)": "nova"
 }
 
-def _pitch_shift_mp3(mp3_bytes: bytes, semitones: float) -> bytes:
-    if not AudioSegment or semitones==0:
-        return mp3_bytes
-    try:
-        seg = AudioSegment.from_file(io.BytesIO(mp3_bytes), format="mp3")
-        new_fr = int(seg.frame_rate * (2.0 ** (semitones/12.0)))
-        shifted = seg._spawn(seg.raw_data, overrides={'frame_rate': new_fr}).set_frame_rate(seg.frame_rate)
-        out = io.BytesIO(); shifted.export(out, format="mp3"); return out.getvalue()
-    except Exception:
-        return mp3_bytes
+def _voice_pitch_semitones(voice_label: str) -> float:
+    if "여성" in voice_label:
+        if "지민" in voice_label:  return +2.5
+        if "소연" in voice_label:  return +4.0
+        if "하은" in voice_label:  return +2.5
+        if "민지" in voice_label:  return +4.8
+        return +2.0
+    if "남성" in voice_label:
+        if "10대" in voice_label: return -1.0
+        if "20대" in voice_label: return -0.5
+        if "30대" in voice_label: return +1.0
+    return 0.0
+
+def tts_fetch_raw(voice_id: str, speak_text: str) -> bytes:
+    """피치 보정 전 원본 MP3(캐시 → /audio/speech). 차단 중이면 BackendUnavailable, 그 밖의 실패는 RuntimeError."""
+    cache = get_tts_cache()
+    audio = cache.get(voice_id, speak_text)
+    if audio is None:
+        r = backend_post("tts", f"{OPENAI_BASE_URL}/audio/speech",
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"},
+            json={"model":"gpt-4o-mini-tts","voice":voice_id,"input":speak_text,"format":"mp3"})
+        if r.status_code!=200:
+            raise RuntimeError(f"{r.status_code} - {r.text}")
+        audio = r.content
+        cache.put(voice_id, speak_text, audio)
+    return audio
 
 def tts_speak_line(text: str, voice_label: str) -> Tuple[str, Optional[bytes]]:
     if not OPENAI_API_KEY:
@@ -277,61 +523,87 @@ def tts_speak_line(text: str, voice_label: str) -> Tuple[str, Optional[bytes]]:
     voice_id = VOICE_MAP_SAFE.get(voice_label, "alloy")
     speak_text = re.sub(r"\(.*?\)", "", text).strip()
     try:
-        r = requests.post(
-            "https://api.openai.com/v1/audio/speech",
-            headers={"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"},
-            json={"model":"gpt-4o-mini-tts","voice":voice_id,"input":speak_text,"format":"mp3"},
-            timeout=60
-        )
-        if r.status_code!=200:
-            st.error(f"TTS 오류: {r.status_code} - {r.text}"); return speak_text, None
-        audio = r.content
-        if "여성" in voice_label:
-            if "지민" in voice_label:  audio = _pitch_shift_mp3(audio, +2.5)
-            elif "소연" in voice_label: audio = _pitch_shift_mp3(audio, +4.0)
-            elif "하은" in voice_label: audio = _pitch_shift_mp3(audio, +2.5)
-            elif "민지" in voice_label: audio = _pitch_shift_mp3(audio, +4.8)
-            else: audio = _pitch_shift_mp3(audio, +2.0)
-        elif "남성" in voice_label:
-            if "10대" in voice_label: audio = _pitch_shift_mp3(audio, -1.0)
-            elif "20대" in voice_label: audio = _pitch_shift_mp3(audio, -0.5)
-            elif "30대" in voice_label: audio = _pitch_shift_mp3(audio, +1.0)
+        try:
+            audio = tts_fetch_raw(voice_id, speak_text)
+        except BackendUnavailable as e:
+            st.warning(f"🔇 {e} — 저장된 음성이 없어 대사를 글로만 보여 드려요."); return speak_text, None
+        semis = _voice_pitch_semitones(voice_label)
+        if semis: audio = audio_job("pitch", audio, semis)
         return speak_text, audio
     except Exception as e:
         st.error(f"TTS 오류: {e}")
         return speak_text, None
 
-# ───────── STT 전처리 + CLOVA Short Sentence STT ───────────────────
-def preprocess_audio_for_stt(audio_bytes: bytes) -> bytes:
-    if not AudioSegment:
-        return audio_bytes
-    try:
-        seg = AudioSegment.from_file(io.BytesIO(audio_bytes))
-        def _lead_sil(seg, silence_thresh=-40.0, chunk_ms=10):
-            trim_ms = 0
-            while trim_ms < len(seg) and seg[trim_ms:trim_ms+chunk_ms].dBFS < silence_thresh:
-                trim_ms += chunk_ms
-            return trim_ms
-        start = _lead_sil(seg); end = _lead_sil(seg.reverse())
-        if start+end < len(seg): seg = seg[start:len(seg)-end]
-        try: seg = seg.high_pass_filter(100).low_pass_filter(4000)
-        except Exception: pass
-        try: seg = effects.normalize(seg, headroom=3.0)
-        except Exception: pass
-        seg = seg.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-        buf = io.BytesIO(); seg.export(buf, format="wav")
-        return buf.getvalue()
-    except Exception:
-        return audio_bytes
+class TTSStream:
+    """/audio/speech 응답을 백그라운드 스레드에서 청크 단위로 받아 두는 버퍼.
+
+    피치 보정은 서버에서 파일 전체를 디코딩하지 않고, 브라우저 재생 속도(playbackRate,
+    preservesPitch=false)로 한다. audio_analysis._pitch_shift_mp3의 리샘플링과 같은 효과다.
+    """
+    def __init__(self, text: str, voice_label: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.speak_text = re.sub(r"\(.*?\)", "", text).strip()
+        self.rate = 2.0 ** (_voice_pitch_semitones(voice_label) / 12.0)
+        self.buf = bytearray(); self.done = False; self.error: Optional[str] = None
+        self.unavailable = False  # 차단기/업스트림 장애(대사는 글로만)
+        self.t0 = time.perf_counter(); self.t_first: Optional[float] = None; self.t_done: Optional[float] = None
+        self._cv = threading.Condition()
+        self._voice_id = VOICE_MAP_SAFE.get(voice_label, "alloy")
+        self._breaker, self._cache = get_breakers()["tts"], get_tts_cache()  # 스레드에서는 cache_resource를 부르지 않음
+        cached = self._cache.get(self._voice_id, self.speak_text)
+        self.cached = cached is not None
+        if self.cached:
+            self.buf += cached; self.done = True; self.t_first = self.t_done = self.t0
+        else:
+            threading.Thread(target=self._run, daemon=True).start()
 
-def clova_short_stt(audio_bytes: bytes, lang: str = "Kor") -> str:
+    def _run(self):
+        try:
+            with backend_post(self._breaker, f"{OPENAI_BASE_URL}/audio/speech",
+                headers={"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"},
+                json={"model":"gpt-4o-mini-tts","voice":self._voice_id,"input":self.speak_text,"format":"mp3"},
+                stream=True
+            ) as r:
+                if r.status_code != 200:
+                    self.error = f"{r.status_code} - {r.text[:300]}"; return
+                for chunk in r.iter_content(chunk_size=4096):
+                    if not chunk: continue
+                    with self._cv:
+                        if self.t_first is None: self.t_first = time.perf_counter()
+                        self.buf += chunk; self._cv.notify_all()
+            self._cache.put(self._voice_id, self.speak_text, bytes(self.buf))
+        except BackendUnavailable as e:
+            self.error = str(e); self.unavailable = True
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            with self._cv:
+                self.done = True; self.t_done = time.perf_counter(); self._cv.notify_all()
+
+    def read_from(self, offset: int, wait: float = 0.0) -> Tuple[bytes, bool]:
+        """offset 이후 받은 바이트와 '이게 끝인지'를 돌려준다. 새 데이터가 없으면 wait초까지 기다림(기본은 안 기다림)."""
+        with self._cv:
+            if wait > 0 and len(self.buf) <= offset and not self.done:
+                self._cv.wait(wait)
+            return bytes(self.buf[offset:]), self.done
+
+    @property
+    def ttfa(self) -> Optional[float]:
+        return (self.t_first - self.t0) if self.t_first else None
+
+# ───────── STT 전처리 + CLOVA Short Sentence STT ───────────────────
+def clova_short_stt(audio_bytes: bytes, lang: str = "Kor", fmt: Optional[str] = None, trimmed: bool = False) -> str:
     if not CLOVA_SPEECH_SECRET:
         return ""
-    url = f"https://clovaspeech-gw.ncloud.com/recog/v1/stt?lang={lang}"
+    url = f"{CLOVA_SPEECH_URL}/recog/v1/stt?lang={lang}"
     headers = {"X-CLOVASPEECH-API-KEY": CLOVA_SPEECH_SECRET, "Content-Type": "application/octet-stream"}
-    wav_bytes = preprocess_audio_for_stt(audio_bytes)
-    r = requests.post(url, headers=headers, data=wav_bytes, timeout=60)
-    r.raise_for_status()
+    br = get_breakers()["stt"]
+    if br.blocked():
+        raise BackendUnavailable(f"{br.name} 일시 차단 중 ({br.retry_in():.0f}초 후 재시도)")
+    payload = audio_job("stt_prep", audio_bytes, (fmt or STT_UPLOAD_FORMAT), trimmed)
+    r = backend_post(br, url, headers=headers, data=payload)  # 장애·차단 시 BackendUnavailable
+    if r.status_code != 200:  # 5xx는 backend_post에서 걸러지므로 여기는 4xx 등 요청 문제
+        raise BackendRequestError(f"CLOVA STT 요청 거절 {r.status_code}: {r.text[:200].strip()}")
     try:
         return r.json().get("text","").strip()
     except Exception:
@@ -345,9 +617,11 @@ def nv_ocr(img_bytes: bytes) -> str:
              "timestamp":int(datetime.datetime.now(datetime.UTC).timestamp()*1000),
              "images":[{"name":"img","format":"jpg","data":base64.b64encode(img_bytes).decode()}]}
     try:
-        res=requests.post(NAVER_CLOVA_OCR_URL,headers={"X-OCR-SECRET":NAVER_OCR_SECRET,"Content-Type":"application/json"},
-                          json=payload,timeout=30).json()
+        res=backend_post("ocr", NAVER_CLOVA_OCR_URL,headers={"X-OCR-SECRET":NAVER_OCR_SECRET,"Content-Type":"application/json"},
+                         json=payload).json()
         return " ".join(f["inferText"] for f in res["images"][0]["fields"])
+    except BackendUnavailable as e:
+        return f"(OCR 일시 중단: {e} — 대본을 직접 입력해 주세요)"
     except Exception as e:
         return f"(OCR 오류: {e})"
 
@@ -380,202 +654,200 @@ def build_cuecards_pdf(script: str, role: str) -> Optional[bytes]:
     except Exception as e:
         st.warning(f"PDF 생성 오류: {e}"); return None
 
-# ───────── 세션 피드백 프롬프트 ─────────────────────────────────────
-def prompt_session_feedback(turns: List[Dict]) -> str:
-    return ("연극 대사 연습 기록입니다. 말속도, 어조, 목소리 크기를 중심으로 "
-            "칭찬/개선점/다음 연습 팁을 간결히 써주세요.\n\n"+json.dumps(turns, ensure_ascii=False, indent=2))
-
-# ───────── 프로소디 분석: WAV 폴백 포함 ────────────────────────────
-def _analyze_wav_pure(audio_bytes: bytes, stt_text: str) -> dict:
-    try:
-        with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
-            ch = wf.getnchannels(); sw = wf.getsampwidth(); sr = wf.getframerate(); n = wf.getnframes()
-            raw = wf.readframes(n)
-        if sw not in (1,2):
-            return {"speed_label":"데이터 부족","volume_label":"데이터 부족","tone_label":"데이터 부족","spacing_label":"데이터 부족",
-                    "syllables_per_sec":None,"wps":None,"rms_db":None,"f0_hz":None,"f0_var":None,"pause_ratio":None}
-        if sw == 1:
-            fmt = f"{len(raw)}b"; maxv = 127.0; arr = struct.unpack(fmt, raw)
-        else:
-            fmt = f"{len(raw)//2}h"; maxv = 32767.0; arr = struct.unpack(fmt, raw)
-        if ch > 1:
-            arr = [(arr[i] + arr[i+1]) / 2.0 for i in range(0, len(arr), ch)]
-        else:
-            arr = list(arr)
-        dur = len(arr)/sr
-        if dur <= 0.0:
-            raise RuntimeError("empty audio")
-        mean_sq = sum((x/maxv)*(x/maxv) for x in arr)/len(arr)
-        rms = math.sqrt(max(mean_sq, 1e-12))
-        rms_db = 20.0*math.log10(rms)
-        win = int(sr*0.02) or 1
-        energies = []
-        for i in range(0, len(arr), win):
-            w = arr[i:i+win]
-            if not w: break
-            e = math.sqrt(sum((x/maxv)*(x/maxv) for x in w)/len(w))
-            energies.append(e)
-        if energies:
-            hi = sorted(energies)[int(max(0, len(energies)*0.9)-1)]
-            thr = max(hi*0.1, 1e-6)
-            unvoiced = sum(1 for e in energies if e < thr) * 0.02
-        else:
-            unvoiced = 0.0
-        pause_ratio = min(1.0, max(0.0, unvoiced/max(dur,1e-6)))
-        syllables = len([c for c in (stt_text or "") if ('가' <= c <= '힣') or c.isdigit()])
-        voiced = max(dur - unvoiced, 1e-6)
-        syl_rate = (syllables/voiced) if syllables>0 else None
-        wps = (len((stt_text or "").split())/voiced) if stt_text else None
-        def lab_speed(s):
-            if s is None: return "데이터 부족"
-            if s>=7.3: return "너무 빠름"
-            if s>=6.6: return "빠름"
-            if s>=5.2: return "적당함"
-            if s>=3.8: return "느림"
-            return "너무 느림"
-        def lab_volume(db):
-            if db is None: return "데이터 부족"
-            if db>=-13: return "너무 큼"
-            if db>=-23: return "큼"
-            if db>=-37: return "적당함"
-            if db>=-47: return "작음"
-            return "너무 작음"
-        spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
-                   "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
-                   "잘 띄어 읽는 것이 되지 않음")
-        if energies:
-            rng = (max(energies)-min(energies))
-            if rng>0.25 and rms_db>-20 and pause_ratio<0.15: tone="화내는 어조"
-            elif rng>0.18 and pause_ratio>=0.2 and rms_db>-30: tone="즐거운 어조"
-            elif rms_db<-35 and pause_ratio>0.25: tone="슬픈 어조"
-            elif rng<0.1 and pause_ratio<0.1: tone="담담한 어조"
-            else: tone="보통 어조"
+# ───────── 세션 공유 읽기 전용 저장소(대본 파싱·큐카드·그림) ─────────────
+# 한 반이 같은 대본으로 연습하면 파싱 결과·큐카드 PDF·그림은 서버에 한 벌만 둔다.
+# 키는 내용 해시. 세션은 슬롯(예: "script", "img:…")마다 항목 하나를 참조(refcount)하고,
+# 예산을 넘으면 아무 세션도 참조하지 않는 항목부터 오래된 순으로 내보낸다. 돌려준 값은 고치지 말 것.
+# 예산은 느슨한 상한이다: 세션이 잡고 있는 항목은 내보내지 않으므로 그만큼은 넘을 수 있다
+# (세션당 슬롯 몇 개라 접속자 수에 비례; 예산보다 큰 단일 값은 아예 저장하지 않는다).
+def _deep_size(obj, seen: Optional[set] = None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen: return 0
+    seen.add(id(obj)); n = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        n += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        n += sum(_deep_size(v, seen) for v in obj)
+    return n
+
+class SessionRefs:
+    """한 세션이 잡고 있는 항목(슬롯 → 키). 세션 상태가 사라지면 참조를 모두 놓는다."""
+    def __init__(self, store: "SharedStore"):
+        self.slots: Dict[str, str] = {}
+        weakref.finalize(self, store._release_all, self.slots)
+
+class SharedStore:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes; self.size = 0
+        self._d: "OrderedDict[str, list]" = OrderedDict()  # 키 → [값, 바이트, 참조 수]
+        self._building: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.counts = {"hit": 0, "miss": 0, "evict": 0}
+
+    def get(self, key: str, build: Callable[[], object], refs: Optional[SessionRefs] = None, slot: str = ""):
+        """있으면 공유 값, 없으면 build() 한 번(같은 키를 동시에 부르면 한 세션만 만든다). build가 None이면 저장 안 함."""
+        with self._lock:
+            e = self._d.get(key)
+            if e is None: kl = self._building.setdefault(key, threading.Lock())
+        if e is None:
+            with kl:
+                with self._lock: e = self._d.get(key)
+                if e is None:
+                    value = build()
+                    e = [value, _deep_size(value), 0]
+                    with self._lock:
+                        self.counts["miss"] += 1
+                        self._building.pop(key, None)
+                        if value is None or e[1] > self.max_bytes:  # 예산보다 큰 것은 이번 세션에만
+                            return value
+                        self._d[key] = e; self.size += e[1]
+                else:
+                    with self._lock: self.counts["hit"] += 1
         else:
-            tone="담담한 어조"
-        return {"speed_label":lab_speed(syl_rate),"volume_label":lab_volume(rms_db),
-                "tone_label":tone,"spacing_label":spacing,
-                "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_db,
-                "f0_hz":None,"f0_var":None,"pause_ratio":pause_ratio}
-    except Exception:
-        return {"speed_label":"데이터 부족","volume_label":"데이터 부족",
-                "tone_label":"데이터 부족","spacing_label":"데이터 부족",
-                "syllables_per_sec":None,"wps":None,"rms_db":None,"f0_hz":None,
-                "f0_var":None,"pause_ratio":None}
+            with self._lock: self.counts["hit"] += 1
+        with self._lock:
+            if key in self._d:
+                self._d.move_to_end(key)
+                if refs is not None: self._hold(refs, slot or key, key)
+            self._evict()
+        return e[0]
+
+    def _hold(self, refs: SessionRefs, slot: str, key: str):
+        old = refs.slots.get(slot)
+        if old == key: return
+        if old is not None: self._decref(old)
+        refs.slots[slot] = key; self._d[key][2] += 1
+
+    def _decref(self, key: str):
+        e = self._d.get(key)
+        if e is not None: e[2] = max(0, e[2] - 1)
+
+    def _release_all(self, slots: Dict[str, str]):
+        with self._lock:
+            for key in slots.values(): self._decref(key)
+            slots.clear(); self._evict()
+
+    def _evict(self):
+        if self.size <= self.max_bytes: return
+        for key in [k for k, e in self._d.items() if e[2] == 0]:  # 오래된 순
+            self.size -= self._d.pop(key)[1]; self.counts["evict"] += 1
+            if self.size <= self.max_bytes: break
+
+    def session_refs(self) -> SessionRefs:
+        return SessionRefs(self)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._d), "held": sum(1 for e in self._d.values() if e[2]),
+                    "refs": sum(e[2] for e in self._d.values()), "bytes": self.size, **self.counts}
+
+@st.cache_resource(show_spinner=False)
+def get_shared_store() -> SharedStore:
+    return SharedStore(SHARED_CACHE_MB * 1024 * 1024)
+
+def _session_refs() -> Optional[SessionRefs]:
+    try:
+        refs = st.session_state.get("shared_refs")
+        if refs is None: refs = st.session_state["shared_refs"] = get_shared_store().session_refs()
+        return refs
+    except Exception:  # 세션 밖(도구·다운로드 콜백)에서는 참조 없이
+        return None
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+def parse_script_shared(script: str) -> Tuple[List[Dict], List[str], List[Dict]]:
+    """대본 → (줄 순서+일치율 특징, 역할 목록, 장면 색인). 같은 대본이면 모든 세션이 한 벌을 같이 쓴다."""
+    return get_shared_store().get(
+        "script:" + _digest(script.encode("utf-8")),
+        lambda: (with_line_features(build_sequence(script)), extract_roles(script), build_scene_index(script)),
+        _session_refs(), "script")
+
+def shared_cuecards(script: str, role: str) -> Optional[bytes]:
+    """역할별 큐카드 PDF(대본·역할당 한 번만 만든다). 만들지 못하면 None."""
+    return get_shared_store().get(f"cuecard:{_digest(script.encode('utf-8'))}:{role}",
+                                  lambda: build_cuecards_pdf(script, role), _session_refs(), "cuecard")
+
+def cuecard_download(script: str, role: str) -> bytes:
+    """다운로드 버튼의 지연 생성용. 빈 PDF를 내려보내지 않도록 실패는 예외로 알린다."""
+    cards = shared_cuecards(script, role)
+    if not cards: raise RuntimeError("큐카드 PDF를 만들지 못했어요.")
+    return cards
+
+@functools.lru_cache(maxsize=32)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, "rb") as f: return _digest(f.read())
+
+def shared_file(path: str) -> bytes:
+    """정적 파일(assets/…) 바이트. 디스크는 내용이 바뀔 때만 다시 읽는다."""
+    stt = os.stat(path)
+    def _read():
+        with open(path, "rb") as f: return f.read()
+    return get_shared_store().get("file:" + _file_digest(path, stt.st_mtime_ns, stt.st_size), _read,
+                                  _session_refs(), "file:" + path)
 
-def analyze_prosody(audio_bytes: bytes, stt_text: str) -> dict:
-    if _lb is not None and _np is not None:
-        try:
-            y, sr = _lb.load(io.BytesIO(audio_bytes), sr=16000, mono=True)
-            if y is None or (hasattr(y, "size") and y.size == 0):
-                raise RuntimeError("empty audio")
-            if _vad:
-                int16 = (y * 32767).astype("int16").tobytes()
-                v = _vad.Vad(2); frame_ms = 20
-                step = int(sr * frame_ms / 1000)
-                frames = [int16[i:i+2*step] for i in range(0, len(int16), 2*step)]
-                voiced = []; cur=None; t=0.0
-                for f in frames:
-                    isv = v.is_speech(f, sr)
-                    if isv and cur is None: cur=[t,None]
-                    if (not isv) and cur is not None: cur[1]=t; voiced.append(cur); cur=None
-                    t += frame_ms/1000.0
-                if cur is not None: cur[1]=t; voiced.append(cur)
-                voiced_total = sum([e-s for s,e in voiced])
-            else:
-                intervals = _lb.effects.split(y, top_db=35)
-                voiced_total = sum([(e - s)/sr for s, e in intervals]) if intervals else len(y)/sr
-            total = len(y)/sr
-            voiced_total = voiced_total if voiced_total > 0 else total
-            syllables = len(re.findall(r"[가-힣]", stt_text or ""))
-            syl_rate = syllables/voiced_total if voiced_total>0 else None
-            words = len((stt_text or "").split()); wps = words/voiced_total if voiced_total>0 else None
-            if syl_rate is None: speed = "데이터 부족"
-            else:
-                speed = ("너무 빠름" if syl_rate>=5.0 else
-                         "빠름"      if syl_rate>=4.0 else
-                         "적당함"    if syl_rate>=2.0 else
-                         "느림"      if syl_rate>=1.2 else "너무 느림")
-            rms = float((_np.sqrt(_np.mean(y*y))) + 1e-12)
-            rms_db = 20.0 * math.log10(rms)
-            volume = ("너무 큼" if rms_db>=-9 else
-                      "큼"     if rms_db>=-15 else
-                      "적당함" if rms_db>=-25 else
-                      "작음"   if rms_db>=-35 else "너무 작음")
-            try:
-                f0, _, _ = _lb.pyin(y, fmin=75, fmax=500, sr=sr, frame_length=2048, hop_length=256)
-                if f0 is not None:
-                    f0_valid = f0[_np.isfinite(f0)]
-                    if f0_valid.size>0:
-                        f0_med = float(_np.nanmedian(f0_valid))
-                        f0_std = float(_np.nanstd(f0_valid))
-                        pitch_desc = ("낮음" if f0_med<140 else "중간" if f0_med<200 else "높음")
-                        var_desc   = ("변화 적음" if f0_std<15 else "변화 적당" if f0_std<35 else "변화 큼")
-                        if pitch_desc=="높음" and var_desc!="변화 적음" and pause_ratio>=0.15: tone="활기찬/즐거운 어조"
-                        elif pitch_desc=="낮음" and var_desc=="변화 적음" and pause_ratio<0.1: tone="담담·낮은 톤"
-                        elif var_desc=="변화 큼" and rms_db>-25: tone="감정 기복 큰 어조"
-                        elif pitch_desc=="중간" and var_desc=="변화 적당": tone="보통 어조"
-                        else: tone="담담한 어조"
-                    else:
-                        f0_med, f0_std, tone = None, None, "담담한 어조"
-                else:
-                    f0_med, f0_std, tone = None, None, "담담한 어조"
-            except Exception:
-                f0_med, f0_std, tone = None, None, "담담한 어조"
-            unvoiced = max(0.0, total - voiced_total)
-            pause_ratio = unvoiced/total if total>0 else 0.0
-            spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
-                       "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
-                       "잘 띄어 읽는 것이 되지 않음")
-            return {"speed_label":speed,"volume_label":volume,"tone_label":tone,"spacing_label":spacing,
-                    "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_db,
-                    "f0_hz":f0_med,"f0_var":f0_std,"pause_ratio":pause_ratio}
-        except Exception:
-            pass
-    if AudioSegment is not None:
-        try:
-            seg = AudioSegment.from_file(io.BytesIO(audio_bytes))
-            dur = max(0.001, seg.duration_seconds)
-            rms_dbfs = seg.dBFS if seg.dBFS != float("-inf") else -60.0
-            volume = ("너무 큼" if rms_dbfs>-9 else
-                      "큼"     if rms_dbfs>-15 else
-                      "적당함" if rms_dbfs>-25 else
-                      "작음"   if rms_dbfs>-35 else "너무 작음")
-            if _silence:
-                non = _silence.detect_nonsilent(seg, min_silence_len=120,
-                                                silence_thresh=max(-60, int(seg.dBFS)-10))
-                voiced_total = sum((b-a) for a,b in non)/1000.0 if non else dur
-            else:
-                voiced_total = dur
-            unvoiced = max(0.0, dur - voiced_total)
-            pause_ratio = unvoiced/dur if dur>0 else 0.0
-            spacing = ("잘 띄어 읽음" if 0.08<=pause_ratio<=0.28 else
-                       "보통" if 0.04<=pause_ratio<0.08 or 0.28<pause_ratio<=0.40 else
-                       "잘 띄어 읽는 것이 되지 않음")
-            syllables = len(re.findall(r"[가-힣]", stt_text or ""))
-            syl_rate = (syllables/voiced_total) if (voiced_total>0 and syllables>0) else None
-            if syl_rate is None: speed = "데이터 부족"
-            else:
-                speed = ("너무 빠름" if syl_rate>=5.0 else
-                         "빠름"      if syl_rate>=4.0 else
-                         "적당함"    if syl_rate>=2.0 else
-                         "느림"      if syl_rate>=1.2 else "너무 느림")
-            wps = (len((stt_text or '').split())/voiced_total) if (voiced_total>0 and stt_text) else None
-            step=50; vals=[]
-            for i in range(0, len(seg), step):
-                v = seg[i:i+step].dBFS
-                vals.append(-60.0 if v==float("-inf") else v)
-            rng = (max(vals)-min(vals)) if vals else 0.0
-            if rng>20 and rms_dbfs>-20 and pause_ratio<0.15: tone="화내는 어조"
-            elif rng>15 and pause_ratio>=0.2 and rms_dbfs>-30: tone="즐거운 어조"
-            elif rms_dbfs<-35 and pause_ratio>0.25: tone="슬픈 어조"
-            elif rng<10 and pause_ratio<0.1: tone="담담한 어조"
-            else: tone="보통 어조"
-            return {"speed_label":speed,"volume_label":volume,"tone_label":tone,"spacing_label":spacing,
-                    "syllables_per_sec":syl_rate,"wps":wps,"rms_db":rms_dbfs,
-                    "f0_hz":None,"f0_var":None,"pause_ratio":pause_ratio}
-        except Exception:
-            pass
-    return _analyze_wav_pure(audio_bytes, stt_text)
+# ───────── 세션 피드백 프롬프트 ─────────────────────────────────────
+# 턴이 쌓일 때마다 집계만 갱신 → 프롬프트 크기는 세션 길이와 무관(토큰 예산 안)
+FEEDBACK_TOKEN_BUDGET = 700
+_WORST_KEEP = 8
+_SCORE_BINS = (0.2, 0.4, 0.6, 0.8)
+_PROS_KEYS = (("speed_label","말속도"), ("volume_label","크기"), ("tone_label","어조"), ("spacing_label","띄어읽기"))
+
+def new_turn_stats() -> Dict:
+    return {"n": 0, "score_sum": 0.0, "bins": [0]*(len(_SCORE_BINS)+1), "worst": [],
+            "labels": {k: {} for k, _ in _PROS_KEYS}, "by_role": {}}
+
+def add_turn_stats(stats: Dict, turn: Dict, pros: Optional[dict] = None) -> Dict:
+    """턴 1개를 집계에 반영(O(log K)). worst는 점수 낮은 K줄만 힙으로 유지."""
+    sc = float(turn.get("score") or 0.0)
+    stats["n"] += 1; stats["score_sum"] += sc
+    stats["bins"][sum(1 for b in _SCORE_BINS if sc >= b)] += 1
+    r = stats["by_role"].setdefault(turn.get("who",""), [0, 0.0]); r[0] += 1; r[1] += sc
+    item = (-sc, stats["n"], turn.get("line_idx"), turn.get("who",""),
+            (turn.get("expected") or "")[:40], (turn.get("spoken") or "")[:40])
+    if len(stats["worst"]) < _WORST_KEEP: heapq.heappush(stats["worst"], item)
+    elif item > stats["worst"][0]: heapq.heapreplace(stats["worst"], item)
+    for k, _ in _PROS_KEYS:
+        lab = (pros or {}).get(k)
+        if lab and lab != "데이터 부족":
+            stats["labels"][k][lab] = stats["labels"][k].get(lab, 0) + 1
+    return stats
+
+def _approx_tokens(s: str) -> int:
+    # 한글 1자 ≈ 1토큰, 영문 4자 ≈ 1토큰 → UTF-8 바이트/3으로 근사
+    return (len(s.encode("utf-8")) + 2) // 3
+
+def prompt_session_feedback(turns: List[Dict], stats: Optional[Dict] = None,
+                            token_budget: int = FEEDBACK_TOKEN_BUDGET) -> str:
+    if stats is None:
+        stats = new_turn_stats()
+        for t in turns or []: add_turn_stats(stats, t, t.get("prosody"))
+    n = stats["n"]
+    head = ("연극 대사 연습 기록 요약입니다. 말속도, 어조, 목소리 크기를 중심으로 "
+            "칭찬/개선점/다음 연습 팁을 간결히 써주세요.\n")
+    if n == 0:
+        return head + "(기록된 턴 없음)"
+    edges = ("0",) + tuple(str(int(b*100)) for b in _SCORE_BINS) + ("100",)
+    dist = " ".join(f"{edges[i]}-{edges[i+1]}%:{c}" for i, c in enumerate(stats["bins"]))
+    lines = [f"턴 {n} · 평균 일치율 {stats['score_sum']/n*100:.0f}% · 분포 {dist}"]
+    roles = " ".join(f"{w}({c}턴 {s/c*100:.0f}%)" for w, (c, s) in stats["by_role"].items() if c)
+    if roles: lines.append("역할별: " + roles)
+    for k, name in _PROS_KEYS:
+        cnt = sorted(stats["labels"][k].items(), key=lambda kv: -kv[1])
+        if cnt: lines.append(f"{name}: " + ", ".join(f"{lab} {c}" for lab, c in cnt))
+    out = head + "\n".join(lines)
+    used = _approx_tokens(out)
+    worst = sorted(stats["worst"], key=lambda it: (-it[0], it[1]))
+    if worst:
+        hdr = "\n일치율 낮은 줄(줄# 역할 점수 | 대본 | 인식):"
+        if used + _approx_tokens(hdr) < token_budget:
+            out += hdr; used += _approx_tokens(hdr)
+            for neg, _, idx, who, exp, spk in worst:
+                row = f"\n#{idx} {who} {-neg*100:.0f}% | {exp} | {spk or '-'}"
+                cost = _approx_tokens(row)
+                if used + cost > token_budget: break
+                out += row; used += cost
+    return out
 
 def _badge(label: str) -> str:
     if label in ("적당함","잘 띄어 읽음") or "활기찬" in label:
@@ -624,70 +896,361 @@ def render_prosody_card(pros: dict):
         st.markdown("<div class='card'><h4>🔊 목소리 크기</h4>"+_badge(vo)+
                     f"<div class='kv'><div class='k'>RMS(dBFS)</div><div class='v'>{(voldb if voldb is not None else 0):.1f}</div></div>"+
                     _gauge_html(_score_volume(voldb))+"</div>", unsafe_allow_html=True)
+    if pros.get("tier") in ("fast", "fallback"):
+        st.caption("⚡ 지금 분석 요청이 많아 간단 분석(음높이 제외)으로 처리했어요.")
     st.markdown("<div class='card'><h4>🎭 어조(피치)</h4>"+_badge(to)+
                 "<div style='font-size: 0.8rem; color: #666; margin-top: 8px;'>💡 <strong>참고:</strong> 어조는 목소리의 높낮이와 변화로 판단해요. 실제 감정과 다를 수 있으니 참고만 해주세요! 😊</div>"+
                 "</div>", unsafe_allow_html=True)
+    if pros.get("contours") is not None and len(pros["contours"]["loudness_db"]) > 1:
+        st.markdown("<div class='card'><h4>📈 크기·높낮이 변화</h4>"+_contour_svg(pros["contours"])+
+                    "<div style='font-size: 0.8rem; color: #666;'>파란 선: 목소리 크기 · 주황 점: 목소리 높낮이 · 옅은 칸: 말한 구간</div>"+
+                    "</div>", unsafe_allow_html=True)
+
+def _contour_svg(c: dict, width: int = 600, height: int = 90, max_points: int = 200) -> str:
+    """분석기 윤곽선(loudness_db/f0_hz/voiced, hop_s 간격) → 인라인 SVG. 긴 녹음은 max_points로 솎아 냄."""
+    loud, f0, voiced = c["loudness_db"], c["f0_hz"], c["voiced"]
+    step = max(1, -(-len(loud) // max_points))
+    idx = range(0, len(loud), step)
+    n = max(1, len(idx) - 1)
+    x = lambda i: i * width / n
+    y_db = lambda v: height - (max(-60.0, min(0.0, float(v))) + 60.0) / 60.0 * height
+    y_f0 = lambda v: height - (float(v) - 75.0) / (500.0 - 75.0) * height
+    bar_w = width / n
+    parts = [f"<rect x='{x(j):.1f}' y='0' width='{bar_w:.1f}' height='{height}' fill='#cfe8ff' opacity='0.5'/>"
+             for j, i in enumerate(idx) if voiced[i] >= 0.5]
+    pts = " ".join(f"{x(j):.1f},{y_db(loud[i]):.1f}" for j, i in enumerate(idx))
+    parts.append(f"<polyline points='{pts}' fill='none' stroke='#3b82f6' stroke-width='2'/>")
+    parts += [f"<circle cx='{x(j):.1f}' cy='{y_f0(f0[i]):.1f}' r='2' fill='#f59e0b'/>"
+              for j, i in enumerate(idx) if f0[i] > 0]
+    return (f"<svg viewBox='0 0 {width} {height}' preserveAspectRatio='none' "
+            f"style='width:100%;height:{height}px'>" + "".join(parts) + "</svg>")
+
+# ───────── 긴 대본: 장면 색인 + 창(window) 보기 ─────────────────────
+# 화면에는 이 줄 수만큼만 보냄 → rerun 페이로드가 대본 길이와 무관
+SCRIPT_WINDOW_LINES = 60
+NAV_CONTEXT_BEFORE, NAV_CONTEXT_AFTER = 2, 3
+
+def _jump_window(key: str, scenes: List[Dict]):
+    i = st.session_state.get(f"{key}_scene")
+    if i is not None: st.session_state[f"{key}_start"] = scenes[i]["line"] + 1
+
+def script_window(script: str, key: str) -> Tuple[int, int, List[str]]:
+    """긴 대본이면 장면 선택 + 시작 줄로 SCRIPT_WINDOW_LINES줄 창만 고른다. (start, end, 전체 줄)"""
+    lines = clean_script_text(script).splitlines()
+    n = len(lines)
+    if n <= SCRIPT_WINDOW_LINES:
+        return 0, n, lines
+    scenes = build_scene_index(script)
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        if scenes:
+            st.selectbox("장면으로 이동", list(range(len(scenes))), index=None, placeholder="장면 선택",
+                         format_func=lambda i: f"{scenes[i]['title']} ({scenes[i]['line']+1}줄~)",
+                         key=f"{key}_scene", on_change=_jump_window, args=(key, scenes))
+    with c2:
+        st.session_state[f"{key}_start"] = max(1, min(n, int(st.session_state.get(f"{key}_start") or 1)))
+        start = st.number_input("시작 줄", min_value=1, max_value=n, step=SCRIPT_WINDOW_LINES//2,
+                                key=f"{key}_start") - 1
+    end = min(n, start + SCRIPT_WINDOW_LINES)
+    st.caption(f"전체 {n}줄 중 {start+1}–{end}줄 표시")
+    return start, end, lines
+
+def _splice_draft(key: str, a: Optional[int], b: Optional[int]):
+    """편집기 on_change: 고친 창(a~b줄, None이면 전체)을 세션 초안에 끼워 넣는다."""
+    d = st.session_state["final_draft"]
+    if a is None:
+        d["text"] = st.session_state[key]; return
+    lines = clean_script_text(d["text"]).splitlines()
+    d["text"] = "\n".join(lines[:a] + st.session_state[key].splitlines() + lines[b:])
+
+# ───────── 긴 대본: 장면별 병렬 피드백/완성본 ─────────────────────
+# 장면마다 따로 요청 → 걸리는 시간 ≈ 가장 느린 장면 1개, 출력 한도도 장면 길이에 맞춤
+_CONTINUE_MSG = "끊긴 부분 바로 다음부터 이어서 쓰세요. 앞 내용은 반복하지 마세요."
+
+def split_scenes(script: str) -> List[Dict]:
+    """'장면 N' 머리글에서 자른 블록 [{title, text}]. 첫 머리글 앞 내용은 '머리말' 블록."""
+    lines = clean_script_text(script).splitlines()
+    scenes = build_scene_index(script)
+    if not scenes:
+        return [{"title": "전체", "text": "\n".join(lines)}]
+    blocks = []
+    head = "\n".join(lines[:scenes[0]["line"]]).strip()
+    if head: blocks.append({"title": "머리말", "text": head})
+    ends = [sc["line"] for sc in scenes[1:]] + [len(lines)]
+    for sc, end in zip(scenes, ends):
+        blocks.append({"title": sc["title"], "text": "\n".join(lines[sc["line"]:end]).strip()})
+    return blocks
+
+def script_outline(script: str, blocks: List[Dict]) -> str:
+    """모든 장면 요청에 함께 보내는 공통 맥락: 등장인물 + 장면 목록(줄 수, 첫 대사)."""
+    rows = []
+    for b in blocks:
+        seq = build_sequence(b["text"])
+        first = f" — {seq[0]['who']}: {seq[0]['text'][:30]}" if seq else ""
+        rows.append(f"- {b['title']} ({len(seq)}줄){first}")
+    return f"등장인물: {', '.join(extract_roles(script)) or '-'}\n장면 구성:\n" + "\n".join(rows)
+
+def chat_complete(prompt: str, temperature: float, max_tokens: int, max_continue: int = 2) -> str:
+    """chat 요청 1건. finish_reason='length'로 잘리면 이어 쓰기를 요청해 붙인다."""
+    msgs = [{"role":"user","content":prompt}]; out = ""
+    for _ in range(max_continue + 1):
+        ch = client.chat.completions.create(model="gpt-4o-mini", messages=msgs,
+                                            temperature=temperature, max_tokens=max_tokens).choices[0]
+        part = ch.message.content or ""
+        out += part
+        if ch.finish_reason != "length": break
+        msgs += [{"role":"assistant","content":part}, {"role":"user","content":_CONTINUE_MSG}]
+    return out
+
+def _scene_max_tokens(text: str, ratio: float, floor: int, cap: int = 4096) -> int:
+    return max(floor, min(cap, int(_approx_tokens(text) * ratio) + 200))
+
+def run_scene_chunks(blocks: List[Dict], make_prompt: Callable[[int, Dict], str], temperature: float,
+                     ratio: float, floor: int) -> List[Optional[str]]:
+    """장면별 요청을 동시에 보내고 원래 순서대로 돌려준다. 실패한 장면은 None."""
+    def one(i: int) -> Optional[str]:
+        b = blocks[i]
+        try:
+            return chat_complete(make_prompt(i, b), temperature, _scene_max_tokens(b["text"], ratio, floor))
+        except Exception:
+            return None
+    with ThreadPoolExecutor(max_workers=max(1, min(SCENE_PARALLEL, len(blocks)))) as ex:
+        return list(ex.map(one, range(len(blocks))))
+
+# ───────── 대본 버전 저장소(청크 공유) ─────────────────────────────
+# 대본을 줄 묶음(청크)으로 잘라 내용 해시로 한 번만 보관하고, 버전은 청크 해시 목록으로 둔다.
+# 원본·완성본·재분배본과 되돌리기 기록이 바뀌지 않은 청크를 함께 쓰므로 세션 메모리는 변형 수가
+# 아니라 서로 다른 줄 수를 따른다. 경계는 장면 머리글과 줄 내용 해시로 정해 한 줄을 고쳐도
+# 그 청크만 새로 생긴다.
+SCRIPT_CHUNK_MASK  = 7   # 줄 해시 하위 3비트가 0이면 청크 끝 → 평균 8줄
+SCRIPT_CHUNK_MAX   = 32
+SCRIPT_HISTORY_MAX = 20  # 이름(ref)마다 되돌리기 기록 수
+
+class ScriptStore:
+    """이름(raw/final/balanced) → 버전 → 청크. 같은 내용은 같은 해시라 다시 저장하지 않는다."""
+    def __init__(self):
+        self.chunks: Dict[str, Tuple[str, ...]] = {}    # 청크 해시 → 줄들
+        self.versions: Dict[str, Tuple[str, ...]] = {}  # 버전 해시 → 청크 해시 목록
+        self.refs: Dict[str, str] = {}
+        self.history: Dict[str, List[str]] = {}
+        self._texts: "OrderedDict[str, str]" = OrderedDict()  # 최근에 펼친 본문(페이지마다 1~2개)
+        self._diffs: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+
+    @staticmethod
+    def _split(lines: List[str]):
+        cur: List[str] = []
+        for ln in lines:
+            if cur and (len(cur) >= SCRIPT_CHUNK_MAX or _SCENE_RE.match(ln)):
+                yield tuple(cur); cur = []
+            cur.append(ln)
+            if hashlib.blake2b(ln.encode("utf-8"), digest_size=1).digest()[0] & SCRIPT_CHUNK_MASK == 0:
+                yield tuple(cur); cur = []
+        if cur: yield tuple(cur)
+
+    def put(self, text: str) -> str:
+        hashes = []
+        for ch in self._split(text.split("\n")):
+            h = hashlib.blake2b("\n".join(ch).encode("utf-8"), digest_size=12).hexdigest()
+            self.chunks.setdefault(h, ch); hashes.append(h)
+        vid = hashlib.blake2b(",".join(hashes).encode("ascii"), digest_size=12).hexdigest()
+        self.versions.setdefault(vid, tuple(hashes))
+        return vid
+
+    def commit(self, ref: str, text: str) -> bool:
+        """ref를 text로. 내용이 같으면 그대로(False), 바뀌면 이전 버전을 되돌리기 기록에 넣는다."""
+        vid = self.put(text); old = self.refs.get(ref)
+        if old == vid: return False
+        if old is not None:
+            h = self.history.setdefault(ref, []); h.append(old); del h[:-SCRIPT_HISTORY_MAX]
+        self.refs[ref] = vid; self._gc()
+        return True
+
+    def undo(self, ref: str) -> bool:
+        h = self.history.get(ref)
+        if not h: return False
+        self.refs[ref] = h.pop(); self._gc()
+        return True
+
+    def previous(self, ref: str) -> Optional[str]:
+        h = self.history.get(ref)
+        return h[-1] if h else None
+
+    def text(self, vid: str) -> str:
+        t = self._texts.get(vid)
+        if t is not None:
+            self._texts.move_to_end(vid); return t
+        t = "\n".join(ln for h in self.versions[vid] for ln in self.chunks[h])
+        self._texts[vid] = t
+        while len(self._texts) > 2: self._texts.popitem(last=False)
+        return t
+
+    def get(self, ref: str) -> str:
+        vid = self.refs.get(ref)
+        return self.text(vid) if vid else ""
+
+    def first(self, *refs: str) -> str:
+        """refs 중 처음으로 내용이 있는 대본."""
+        for r in refs:
+            t = self.get(r)
+            if t: return t
+        return ""
+
+    def diff(self, a: str, b: str) -> List[Tuple[str, int, int, int, int]]:
+        """버전 a → b의 줄 단위 opcode(같은 줄 제외). 청크 해시로 같은 부분을 건너뛰고
+        바뀐 청크 안에서만 줄을 비교하므로 비용은 청크 수 + 바뀐 줄 수에 비례한다."""
+        if (a, b) in self._diffs: return self._diffs[(a, b)]
+        ca, cb = self.versions[a], self.versions[b]
+        oa, ob = [0], [0]
+        for h in ca: oa.append(oa[-1] + len(self.chunks[h]))
+        for h in cb: ob.append(ob[-1] + len(self.chunks[h]))
+        out = []
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, ca, cb, autojunk=False).get_opcodes():
+            if tag == "equal": continue
+            la = [ln for h in ca[i1:i2] for ln in self.chunks[h]]
+            lb = [ln for h in cb[j1:j2] for ln in self.chunks[h]]
+            for t, x1, x2, y1, y2 in SequenceMatcher(None, la, lb, autojunk=False).get_opcodes():
+                if t != "equal": out.append((t, oa[i1]+x1, oa[i1]+x2, ob[j1]+y1, ob[j1]+y2))
+        self._diffs[(a, b)] = out
+        while len(self._diffs) > 8: self._diffs.popitem(last=False)
+        return out
+
+    def _gc(self):
+        live = set(self.refs.values()).union(*self.history.values())
+        for vid in [v for v in self.versions if v not in live]: del self.versions[vid]
+        used = {h for v in self.versions.values() for h in v}
+        for h in [h for h in self.chunks if h not in used]: del self.chunks[h]
+        for vid in [v for v in self._texts if v not in live]: del self._texts[vid]
+
+    def stats(self) -> Dict[str, int]:
+        return {"versions": len(self.versions), "chunks": len(self.chunks),
+                "lines_stored": sum(len(c) for c in self.chunks.values()),
+                "lines_referenced": sum(len(self.chunks[h]) for v in self.versions.values() for h in v)}
+
+def script_store() -> ScriptStore:
+    return st.session_state.setdefault("script_store", ScriptStore())
+
+def keep_known_roles(script: str, roles: List[str]) -> str:
+    """roles에 없는 인물의 대사 줄을 뺀다(지문·장면 머리글 등 대사가 아닌 줄은 유지)."""
+    out = []
+    for line in clean_script_text(script).splitlines():
+        m = re.match(r"\s*([^:：]+)\s*[:：]\s*(.+)$", line)
+        if not m or _normalize_role(m.group(1)) in roles:
+            out.append(line)
+    return "\n".join(out)
+
+def render_script_history(ref: str, key: str):
+    """직전 버전과 달라진 줄 수 + 되돌리기."""
+    store = script_store()
+    prev = store.previous(ref)
+    if not prev: return
+    ops = store.diff(prev, store.refs[ref])
+    removed = sum(a2 - a1 for _, a1, a2, _, _ in ops); added = sum(b2 - b1 for *_, b1, b2 in ops)
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        st.caption(f"🕘 저장된 버전 {len(store.history[ref])+1}개 · 직전 버전보다 +{added}줄 / -{removed}줄")
+    with c2:
+        st.button("↩️ 되돌리기", key=key, on_click=store.undo, args=(ref,))
 
 # ───────── 페이지 1: 대본 등록/입력 ──────────────────────────────
 def page_script_input():
-    st.image("assets/dragon_intro.png", width='stretch')
+    st.image(shared_file("assets/dragon_intro.png"), width='stretch')
     st.header("📥 1) 대본 등록")
     c1,c2 = st.columns(2)
     with c1:
         up = st.file_uploader("손글씨/이미지 업로드(OCR)", type=["png","jpg","jpeg"], key="u_ocr")
         if up and st.button("🖼️ OCR로 불러오기", key="btn_ocr"):
             txt = nv_ocr(up.read())
-            st.session_state["script_raw"] = (st.session_state.get("script_raw","") + "\n" + (txt or "")).strip()
+            script_store().commit("raw", (script_store().get("raw") + "\n" + (txt or "")).strip())
             st.success("OCR 완료!")
     with c2:
         st.caption("형식 예: 민수: (창밖을 보며) 오늘은 비가 올까?\n\n해설은 반드시 \"해설:\"로 표기해 주세요.")
-        val = st.text_area("대본 직접 입력", height=260, value=st.session_state.get("script_raw",""), key="ta_script")
+        val = st.text_area("대본 직접 입력", height=260, value=script_store().get("raw"), key="ta_script")
         if st.button("💾 저장 (저장 버튼을 반드시 눌러주세요!)", key="btn_save_script"):
-            st.session_state["script_raw"] = val.strip(); st.success("저장되었습니다. 왼쪽 메뉴에서 다음 페이지로 이동해주세요!")
+            script_store().commit("raw", val.strip()); st.success("저장되었습니다. 왼쪽 메뉴에서 다음 페이지로 이동해주세요!")
 
 # ───────── 페이지 2: 대본 피드백 & 완성본 생성 ─────────────────────
+FEEDBACK_CRITERIA = ("아래 7가지 기준으로, 예시는 간단히, 수정 제안은 구체적으로:\n"
+                     "1) 주제 명확성  2) 이야기 전개 완결성  3) 등장인물 말투·성격 적합성\n"
+                     "4) 해설·대사·지문 적합성  5) 구성 완전성  6) 독창성·재미 요소  7) 맞춤법·띄어쓰기 정확성")
+FINAL_SCRIPT_RULES = (
+    "초등학생 눈높이에 맞춰 대본을 다듬고, 필요하면 내용을 자연스럽게 보강하여 "
+    "기-승-전-결이 또렷한 **연극 완성본**을 작성하세요.\n\n"
+    "형식 규칙:\n"
+    "1) **장면 1, 장면 2, 장면 3 ...** 최소 4장면 이상.\n"
+    "2) 장면 간 자연스러운 전환과 사건 배치.\n"
+    "3) 대사는 `이름: 내용`, 지문은 ( ) 만 사용. 머릿말을 역할명으로 쓰지 않기.\n"
+    "4) 주제와 일관성 유지, 마지막 장면에서 갈등 해결."
+)
+# 장면별 병렬 모드: 한 장면씩 다듬으므로 장면 수/순서는 원본을 따름
+SCENE_REWRITE_RULES = (
+    "연극 대본의 한 부분을 초등학생 눈높이에 맞춰 다듬고, 필요하면 내용을 자연스럽게 보강하세요. "
+    "다른 장면은 다른 사람이 동시에 다듬고 있으니 **이 부분만** 쓰세요.\n\n"
+    "형식 규칙:\n"
+    "1) 첫 줄의 장면 머리글(예: 장면 3)은 그대로 유지.\n"
+    "2) 앞뒤 장면과 자연스럽게 이어지도록 전체 맥락을 참고.\n"
+    "3) 대사는 `이름: 내용`, 지문은 ( ) 만 사용. 등장인물 목록에 없는 인물은 만들지 않기.\n"
+    "4) 주제와 일관성 유지, 마지막 장면이면 갈등 해결. 설명 없이 대본만 출력."
+)
+
 def page_feedback_script():
     st.header("🛠️ 2) 대본 피드백 & 완성본 생성")
-    script = st.session_state.get("script_raw","")
+    store = script_store()
+    script = store.get("raw")
     if not script: st.warning("먼저 대본을 입력/업로드하세요."); return
-    st.subheader("원본 대본"); st.code(script, language="text")
+    st.subheader("원본 대본")
+    a, b, lines = script_window(script, "win_fb_src")
+    st.code("\n".join(lines[a:b]), language="text")
+
+    blocks = split_scenes(script)
+    chunked = len(blocks) > 1 and st.toggle(
+        f"🧩 장면별로 나눠 동시에 처리 ({len(blocks)}개 블록, 긴 대본 권장)",
+        value=len(lines) > SCRIPT_WINDOW_LINES, key="fb_chunked")
 
     c1,c2 = st.columns(2)
     with c1:
         if st.button("🔎 상세 피드백 받기", key="btn_fb"):
             with st.spinner("🔍 피드백을 생성하고 있습니다..."):
-                criteria = ("아래 7가지 기준으로, 예시는 간단히, 수정 제안은 구체적으로:\n"
-                            "1) 주제 명확성  2) 이야기 전개 완결성  3) 등장인물 말투·성격 적합성\n"
-                            "4) 해설·대사·지문 적합성  5) 구성 완전성  6) 독창성·재미 요소  7) 맞춤법·띄어쓰기 정확성")
-                fb = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role":"user","content":criteria+"\n\n대본:\n"+script}],
-                    temperature=0.4, max_tokens=1400
-                ).choices[0].message.content
+                if chunked:
+                    outline = script_outline(script, blocks)
+                    parts = run_scene_chunks(
+                        blocks, lambda i, b: (FEEDBACK_CRITERIA + "\n\n[대본 전체 맥락]\n" + outline +
+                                              f"\n\n[이번에 검토할 부분: {b['title']}]\n" + b["text"] +
+                                              "\n\n이 부분에 해당하는 내용만 간결히 쓰세요."),
+                        temperature=0.4, ratio=0.8, floor=500)
+                    fb = "\n\n".join(f"### {b['title']}\n" + (p or "_(이 장면 피드백 생성 실패 — 다시 시도해 주세요)_")
+                                     for b, p in zip(blocks, parts))
+                else:
+                    fb = client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[{"role":"user","content":FEEDBACK_CRITERIA+"\n\n대본:\n"+script}],
+                        temperature=0.4, max_tokens=1400
+                    ).choices[0].message.content
                 st.session_state["script_feedback"]=fb
                 st.success("✅ 피드백 생성 완료!")
-                if not st.session_state.get("script_final"):
+                if not store.get("final"):
                     st.info("💡 오른쪽의 '✨ 피드백 반영하여 대본 생성하기' 버튼을 눌러보세요!")
                 st.session_state["next_step_hint"] = "피드백에 맞추어 대본이 완성되면 다음 단계로 이동하세요."
     with c2:
         if st.button("✨ 피드백 반영하여 대본 생성하기", key="btn_make_final"):
             with st.spinner("✨ 대본을 생성하고 있습니다..."):
-                prm = (
-                    "초등학생 눈높이에 맞춰 대본을 다듬고, 필요하면 내용을 자연스럽게 보강하여 "
-                    "기-승-전-결이 또렷한 **연극 완성본**을 작성하세요.\n\n"
-                    "형식 규칙:\n"
-                    "1) **장면 1, 장면 2, 장면 3 ...** 최소 4장면 이상.\n"
-                    "2) 장면 간 자연스러운 전환과 사건 배치.\n"
-                    "3) 대사는 `이름: 내용`, 지문은 ( ) 만 사용. 머릿말을 역할명으로 쓰지 않기.\n"
-                    "4) 주제와 일관성 유지, 마지막 장면에서 갈등 해결.\n\n"
-                    f"{script}"
-                )
-                res = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role":"user","content":prm}],
-                    temperature=0.6, max_tokens=2600
-                ).choices[0].message.content
-                st.session_state["script_final"] = res
+                if chunked:
+                    outline = script_outline(script, blocks)
+                    parts = run_scene_chunks(
+                        blocks, lambda i, b: (SCENE_REWRITE_RULES + "\n\n[대본 전체 맥락]\n" + outline +
+                                              f"\n\n[다듬을 부분: {b['title']}"
+                                              + (" — 마지막 장면" if i == len(blocks)-1 else "") + "]\n" + b["text"]),
+                        temperature=0.6, ratio=1.6, floor=600)
+                    res = "\n\n".join((p or b["text"]).strip() for b, p in zip(blocks, parts))
+                    failed = sum(1 for p in parts if p is None)
+                    if failed: st.warning(f"{failed}개 장면은 생성에 실패해 원문을 그대로 두었습니다.")
+                else:
+                    res = client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[{"role":"user","content":FINAL_SCRIPT_RULES+"\n\n"+script}],
+                        temperature=0.6, max_tokens=2600
+                    ).choices[0].message.content
+                # 원본에 없는 인물의 대사는 저장할 때 한 번만 걸러 낸다
+                store.commit("final", keep_known_roles(res or "", extract_roles(script)))
                 st.success("🎉 대본 생성 완료!")
                 st.session_state["next_step_hint"] = "대본 생성 완료! 피드백을 반영하여 수정을 완료한 후 다음 단계로 이동하세요."
 
@@ -695,26 +1258,31 @@ def page_feedback_script():
     if st.session_state.get("script_feedback"):
         with st.expander("📄 상세 피드백", expanded=False):
             st.markdown(st.session_state["script_feedback"])
-    if st.session_state.get("script_final"):
+    final = store.get("final")
+    if final:
         st.subheader("🤖 AI 추천 대본 (수정 가능)")
         st.markdown("AI가 추천한 대본입니다. 상세 피드백을 참고하여 수정해보아요!")
-        st.code(st.session_state["script_final"], language="text")
-        edited_script = st.text_area("대본 수정하기", value=st.session_state["script_final"], height=300, key="script_editor")
-        original_roles = extract_roles(st.session_state.get("script_raw", ""))
-        filtered_lines = []
-        for line in clean_script_text(st.session_state["script_final"]).splitlines():
-            m = re.match(r"\s*([^:：]+)\s*[:：]\s*(.+)$", line)
-            if m:
-                character = _normalize_role(m.group(1))
-                if character in original_roles:
-                    filtered_lines.append(line)
-            else:
-                filtered_lines.append(line)
-        filtered_script = "\n".join(filtered_lines)
-        st.session_state["script_final"] = filtered_script
+        # 편집 중인 초안은 세션에 하나: 창을 옮기거나 전체 보기로 바꿔도 앞서 고친 줄이 남는다
+        draft = st.session_state.get("final_draft")
+        if not draft or draft["base"] != store.refs["final"]:
+            draft = st.session_state["final_draft"] = {"base": store.refs["final"], "text": final}
+        a, b, lines = script_window(draft["text"], "win_fb_final")
+        st.code("\n".join(lines[a:b]), language="text")
+        tag = _digest(draft["text"].encode("utf-8"))[:8]  # 초안이 바뀌면 편집기도 새 내용으로
+        if (a, b) == (0, len(lines)):
+            st.text_area("대본 수정하기", value=draft["text"], height=300, key=f"script_editor_{tag}",
+                         on_change=_splice_draft, args=(f"script_editor_{tag}", None, None))
+        else:
+            # 보이는 창만 편집하고 나머지 줄은 그대로 이어 붙임
+            key = f"script_editor_{a}_{b}_{tag}"
+            st.text_area(f"대본 수정하기 ({a+1}–{b}줄)", value="\n".join(lines[a:b]), height=300,
+                         key=key, on_change=_splice_draft, args=(key, a, b))
         if st.button("✅ 수정 완료", key="btn_save_script"):
-            st.session_state["script"] = edited_script
-            st.success("✅ 대본이 저장되었습니다!")
+            if store.commit("final", draft["text"]):
+                st.session_state["final_draft"] = {"base": store.refs["final"], "text": draft["text"]}
+                st.success("✅ 대본이 저장되었습니다!")
+            else: st.info("바뀐 내용이 없어요.")
+        render_script_history("final", "undo_final")
 
 # ───────── 하이브리드 재분배(추가 전용/삭제 전용) ─────────────────────
 def _augment_with_additions_only(client, original_script: str, roles: List[str], targets: Dict[str, int], max_tries: int = 3) -> str:
@@ -839,10 +1407,7 @@ def _prune_with_deletions_only(client, original_script: str, roles: List[str], t
 # ───────── 페이지 3: 대사 수 조절하기 ───────────────────────────────────
 def page_role_balancer():
     st.header("⚖️ 3) 대사 수 조절하기")
-    script = (st.session_state.get("current_script") 
-              or st.session_state.get("script_balanced") 
-              or st.session_state.get("script_final") 
-              or st.session_state.get("script_raw",""))
+    script = script_store().first("balanced", "final", "raw")
     if not script: 
         st.warning("먼저 대본을 입력/생성하세요."); return
     roles = extract_roles(script)
@@ -851,7 +1416,9 @@ def page_role_balancer():
 
     counts = _count_lines_by_role(script, roles)
     st.subheader("📜 현재 대본")
-    st.code(script, language="text", height=480)
+    a, b, lines = script_window(script, "win_rb")
+    st.code("\n".join(lines[a:b]), language="text", height=480)
+    render_script_history("balanced", "undo_balanced")
 
     col1, col2 = st.columns(2)
     with col1:
@@ -877,49 +1444,443 @@ def page_role_balancer():
                 if any(targets[r] > after_counts.get(r,0) for r in roles):
                     new_script = _augment_with_additions_only(client, new_script, roles, targets, max_tries=3)
 
-                st.session_state["script_balanced"] = new_script
-                st.session_state["current_script"] = new_script
+                script_store().commit("balanced", new_script)
                 final_counts = _count_lines_by_role(new_script, roles)
 
                 st.success("✅ 재분배 완료! 아래 결과를 확인하세요.")
-                st.code(new_script, language="text", height=480)
+                new_lines = clean_script_text(new_script).splitlines()
+                st.code("\n".join(new_lines[:SCRIPT_WINDOW_LINES]), language="text", height=480)
+                if len(new_lines) > SCRIPT_WINDOW_LINES:
+                    st.caption(f"전체 {len(new_lines)}줄 중 앞 {SCRIPT_WINDOW_LINES}줄 — 나머지는 위 '현재 대본'에서 장면별로 확인하세요.")
                 st.info("최종 줄 수: " + ", ".join([f"{r} {final_counts.get(r,0)}줄" for r in roles]))
             except Exception as e:
                 st.error(f"재분배 중 오류: {e}")
 
 # ───────── 페이지 4: 소품·무대·의상 ─────────────────────────────────
+# 장면별 JSON 결과를 장면 내용 해시로 캐시 → 수정된 장면만 다시 요청하고 표는 로컬에서 합침
+KIT_SECTIONS = ("필수", "선택", "대체", "안전 주의")
+STAGE_KIT_CACHE_MAX = 256
+STAGE_KIT_PROMPT = (
+    "초등 연극의 한 장면에 필요한 소품·무대·의상을 JSON으로만 답하세요.\n"
+    '형식: {"items":[{"section":"필수|선택|대체|안전 주의","kind":"소품|무대|의상","name":"이름","note":"짧은 메모"}],'
+    '"tips":["간단 팁"]}\n'
+    "대체 항목의 note에는 무엇을 대신하는지 쓰세요. 이 장면에 실제로 필요한 것만 쓰세요."
+)
+
+def scene_hash(block: Dict) -> str:
+    """장면 내용 해시(줄 앞뒤 공백·빈 줄 무시)."""
+    norm = "\n".join(ln.strip() for ln in block["text"].splitlines() if ln.strip())
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()[:16]
+
+def _parse_kit(text: str) -> Optional[Dict]:
+    m = re.search(r"\{.*\}", text or "", re.S)
+    try:
+        obj = json.loads(m.group(0)) if m else None
+    except ValueError:
+        return None
+    if not isinstance(obj, dict): return None
+    items = [it for it in obj.get("items") or [] if isinstance(it, dict) and it.get("name")]
+    for it in items:
+        if it.get("section") not in KIT_SECTIONS: it["section"] = "선택"
+    return {"items": items, "tips": [str(t) for t in obj.get("tips") or []]}
+
+def _stage_kit_for_scene(outline: str, block: Dict) -> Optional[Dict]:
+    try:
+        res = client.chat.completions.create(
+            model="gpt-4o-mini", response_format={"type": "json_object"}, temperature=0.4,
+            max_tokens=_scene_max_tokens(block["text"], 0.5, 500),
+            messages=[{"role":"user","content":STAGE_KIT_PROMPT + "\n\n[대본 전체 맥락]\n" + outline +
+                       f"\n\n[장면: {block['title']}]\n" + block["text"]}],
+        ).choices[0].message.content
+    except Exception:
+        return None
+    return _parse_kit(res)
+
+def update_stage_kits(script: str, cache: Dict[str, Dict], force: bool = False) -> Tuple[List[Dict], List[Optional[Dict]], int]:
+    """캐시에 없는 장면만 동시에 요청해 채운다. (블록, 장면별 결과, 새로 요청한 수)"""
+    blocks = split_scenes(script)
+    hashes = [scene_hash(b) for b in blocks]
+    todo = {h: b for h, b in zip(hashes, blocks) if force or h not in cache}
+    if todo:
+        outline = script_outline(script, blocks)
+        with ThreadPoolExecutor(max_workers=max(1, min(SCENE_PARALLEL, len(todo)))) as ex:
+            for h, kit in zip(todo, ex.map(lambda b: _stage_kit_for_scene(outline, b), todo.values())):
+                if kit is not None:
+                    cache.pop(h, None); cache[h] = kit
+    for h in hashes:  # 지금 쓰는 장면을 최근 항목으로
+        if h in cache: cache[h] = cache.pop(h)
+    while len(cache) > STAGE_KIT_CACHE_MAX:
+        cache.pop(next(iter(cache)))
+    return blocks, [cache.get(h) for h in hashes], len(todo)
+
+def aggregate_stage_kits(blocks: List[Dict], kits: List[Optional[Dict]]) -> str:
+    """장면별 결과 → [필수/선택/대체/안전 주의] 마크다운 표 + 팁. 같은 항목은 장면을 묶어 한 줄로."""
+    rows: Dict[Tuple[str, str, str], Dict] = {}
+    tips: List[str] = []
+    for b, kit in zip(blocks, kits):
+        if not kit: continue
+        label = b["title"] if len(blocks) > 1 else "-"
+        for it in kit["items"]:
+            key = (it["section"], str(it.get("kind") or "소품"), re.sub(r"\s+", "", str(it["name"])))
+            r = rows.setdefault(key, {"name": str(it["name"]), "scenes": [], "notes": []})
+            if label not in r["scenes"]: r["scenes"].append(label)
+            note = str(it.get("note") or "").strip()
+            if note and note not in r["notes"]: r["notes"].append(note)
+        tips += [t for t in kit["tips"] if t not in tips]
+    out = []
+    for sec in KIT_SECTIONS:
+        sec_rows = [(k, v) for k, v in rows.items() if k[0] == sec]
+        out.append(f"### {sec}")
+        if not sec_rows:
+            out.append("(없음)\n"); continue
+        out.append("| 구분 | 이름 | 장면 | 메모 |\n| --- | --- | --- | --- |")
+        for (_, kind, _), r in sec_rows:
+            cells = (kind, r["name"], ", ".join(r["scenes"]), "; ".join(r["notes"]))
+            out.append("| " + " | ".join(c.replace("|", "/") for c in cells) + " |")
+        out.append("")
+    if tips:
+        out.append("### 팁\n" + "\n".join(f"- {t}" for t in tips[:6]))
+    return "\n".join(out)
+
 def page_stage_kits():
     st.header("🎭 4) 소품·무대·의상 추천")
     st.markdown("연극에 필요한 소품을 AI가 추천해 줘요.")
-    script = st.session_state.get("script_final") or st.session_state.get("script_balanced") or st.session_state.get("script_raw","")
+    script = script_store().first("final", "balanced", "raw")
     if not script: st.warning("먼저 대본을 입력/생성하세요."); return
+    force = st.checkbox("모든 장면 다시 만들기", key="kits_force")
     if st.button("🧰 목록 만들기", key="btn_kits"):
         with st.spinner("🧰 소품·무대·의상 목록을 생성하고 있습니다..."):
-            prm = ("다음 대본을 바탕으로 초등 연극용 소품·무대·의상 체크리스트를 만들어주세요.\n"
-                   "구성: [필수/선택/대체/안전 주의] 4섹션 표(마크다운) + 간단 팁.\n\n대본:\n"+script)
-            res = client.chat.completions.create(
-                model="gpt-4o-mini", messages=[{"role":"user","content":prm}],
-                temperature=0.4, max_tokens=1200
-            ).choices[0].message.content
-            st.session_state["stage_kits"] = res
-            st.success("✅ 목록 생성 완료!")
-            st.markdown(res or "(생성 실패)")
+            cache = st.session_state.setdefault("stage_kit_cache", {})
+            blocks, kits, asked = update_stage_kits(script, cache, force=force)
+            st.session_state["stage_kits"] = aggregate_stage_kits(blocks, kits)
+            failed = sum(1 for k in kits if k is None)
+            st.success(f"✅ 목록 생성 완료! (장면 {len(blocks)}개 중 {asked}개 새로 요청, 나머지는 저장된 결과 사용)")
+            if failed: st.warning(f"{failed}개 장면은 생성에 실패했습니다. 다시 눌러 보세요.")
             st.session_state["next_step_hint"] = "체크리스트 완성! 다음 단계로 이동하세요."
+    if st.session_state.get("stage_kits"):
+        st.markdown(st.session_state["stage_kits"])
 
 # ───────── 페이지 5: AI 대본 연습 ────────────────────────────────
+def score_turn(expected_text: str, stt: str, audio_bytes: Optional[bytes], want_metrics: bool = True,
+               feat: Optional[Dict] = None) -> Dict:
+    """한 줄 연습 결과 계산(UI 없음): 일치 하이라이트·일치율·프로소디. feat는 미리 만든 line_features."""
+    feat = feat or line_features(expected_text)
+    sp = spoken_features(stt)
+    pros = audio_job("prosody", audio_bytes, stt or "") if (want_metrics and audio_bytes) else None
+    return {"expected": feat["core"], "spoken": stt, "score": similarity_feat(feat, sp),
+            "html": highlight_html_feat(feat, sp), "prosody": pros}
+
+def _set_cursor(idx: int, n_lines: int):
+    idx = max(0, min(n_lines, idx))
+    st.session_state["duet_cursor"] = idx
+    st.session_state["auto_done_token"] = None
+    st.session_state["jump_line"] = max(1, min(n_lines, idx+1))
+
+def _move_cursor(delta: int, n_lines: int):
+    _set_cursor(st.session_state.get("duet_cursor", 0) + delta, n_lines)
+
+def _jump_to_scene(scenes: List[Dict], n_lines: int):
+    i = st.session_state.get("jump_scene")
+    if i is not None: _set_cursor(scenes[i]["seq"], n_lines)
+
+def _jump_to_line(n_lines: int):
+    _set_cursor(int(st.session_state.get("jump_line") or 1) - 1, n_lines)
+
+def _render_nav(seq: List[Dict], scenes: List[Dict], cur_idx: int):
+    """장면/줄 바로가기 + 현재 줄 주변 몇 줄만 보여 주기(대본 길이와 무관한 크기)."""
+    n_lines = len(seq)
+    with st.expander("🧭 장면·줄 바로가기", expanded=False):
+        c1, c2 = st.columns([2, 1])
+        with c1:
+            if scenes:
+                st.selectbox("장면으로 이동", list(range(len(scenes))), index=None, placeholder="장면 선택",
+                             format_func=lambda i: f"{scenes[i]['title']} (#{scenes[i]['seq']+1}~)",
+                             key="jump_scene", on_change=_jump_to_scene, args=(scenes, n_lines))
+        with c2:
+            # 값은 세션 상태(jump_line)로만 관리 — 이전/다음 이동 시 _set_cursor가 맞춰 줌
+            st.session_state["jump_line"] = max(1, min(n_lines, int(st.session_state.get("jump_line") or cur_idx+1)))
+            st.number_input("줄 번호로 이동", min_value=1, max_value=n_lines, step=1,
+                            key="jump_line", on_change=_jump_to_line, args=(n_lines,))
+    lo, hi = max(0, cur_idx-NAV_CONTEXT_BEFORE), min(n_lines, cur_idx+NAV_CONTEXT_AFTER+1)
+    rows = []
+    for i in range(lo, hi):
+        ln = seq[i]; mark = "▶" if i == cur_idx else "&nbsp;&nbsp;"
+        rows.append(f"{mark} #{i+1} {_esc(ln['who'])}: {_esc(ln['text'])}")
+    st.markdown("<div class='small'>" + "<br/>".join(rows) + "</div>", unsafe_allow_html=True)
+
+def _render_turn_result(res: Dict, cur_idx: int):
+    st.markdown("**STT 인식 결과(원문)**")
+    st.text_area("인식된 문장", value=res["spoken"] or "(빈 문자열)", height=90, key=f"saw_{cur_idx}")
+    st.caption("비교 기준(지문 제거)")
+    st.code(res["expected"], language="text")
+    st.markdown("**일치 하이라이트(초록=일치, 빨강=누락)**", unsafe_allow_html=True)
+    st.markdown(res["html"], unsafe_allow_html=True)
+    st.caption(f"일치율(내부 지표) 약 {res['score']*100:.0f}%")
+    lat = res.get("latency")
+    if lat and lat.get("endpoint_s") is not None:
+        st.caption(f"⏱️ 말 끝 → 결과 약 {lat['endpoint_s']+lat['server_s']:.1f}초 "
+                   f"(말 끝 확인 {lat['endpoint_s']:.1f}초 + 인식·분석 {lat['server_s']:.1f}초)")
+    if res.get("prosody"):
+        render_prosody_card(res["prosody"])
+    else:
+        st.info("텍스트만 확인 모드입니다.")
+
+def _render_tts_stream(job: TTSStream, who: str):
+    st.success(f"파트너({who}): {job.speak_text}")
+    # 받는 중이면 TTS_POLL_MS마다 플레이어 조각만 다시 실행(청크마다 rerun하지 않음)
+    polling = not job.done
+    st.fragment(_tts_stream_poll, run_every=TTS_POLL_MS / 1000 if polling else None)(job, polling)
+
+def _tts_stream_poll(job: TTSStream, polling: bool):
+    """스트리밍 플레이어: 매 실행마다 지난번 이후 도착한 바이트를 한 번에 보낸다. 기다리지 않는다.
+
+    보낸 위치는 서버가 기억한다. 브라우저는 중간 render를 놓쳤을 때만(offset이 받은 양보다 크면)
+    자기가 받은 양을 돌려보내고, 서버는 그 위치부터 다시 보낸다.
+    """
+    key = f"ttsp_{job.id}"; sent_key = f"{key}_sent"
+    req = st.session_state.get(key) or {}
+    sent, seq = st.session_state.get(sent_key, (0, None))
+    if req.get("seq") is not None and req.get("seq") != seq:  # 다시 보내 달라는 요청
+        sent, seq = int(req.get("offset") or 0), req["seq"]
+    data, done = job.read_from(sent)
+    st.session_state[sent_key] = (sent + len(data), seq)
+    _tts_stream_player(offset=sent, data=base64.b64encode(data).decode(), done=done,
+                       rate=job.rate, key=key, default=None)
+    if done and polling:  # 다 받았으면 한 번만 전체 rerun → 조각이 run_every 없이 다시 등록되어 폴링이 멈춘다
+        st.rerun()
+    if job.unavailable:
+        st.warning(f"🔇 {job.error} — 저장된 음성이 없어 대사를 글로만 보여 드려요.")
+    elif job.error:
+        st.error(f"TTS 오류: {job.error}")
+    elif job.cached:
+        st.caption("⏱️ 저장된 음성 재생(합성 요청 없음)")
+    elif job.ttfa is not None:
+        total = f"전체 수신 {job.t_done-job.t0:.2f}초" if job.t_done else "전체 수신 중…"
+        st.caption(f"⏱️ 첫 소리까지 {job.ttfa:.2f}초 (스트리밍) · {total} — 기존 방식은 전체 수신 + 피치 변환 후 재생")
+
+# ───────── 연습 녹음 보관 + 전체 연습 녹음(믹스다운) ─────────────────────
+# 턴 녹음은 세션 상태가 아니라 세션별 임시 폴더에 줄마다 마지막 녹음 한 개만 둔다.
+# 내보내기는 대본 순서대로 내 녹음과 상대역 TTS(캐시)를 한 조각씩 읽어 WAV에 이어 쓴다.
+TAKES_ROOT = os.path.join(tempfile.gettempdir(), "play_adventure_takes")
+TAKES_MAX_AGE_S = 24 * 3600
+
+def _take_dir() -> str:
+    """이 세션의 녹음 폴더. 쓸 때마다(저장·믹스다운) 폴더 시각을 갱신해, 정리 기준이 '마지막 사용'이 되게 한다."""
+    d = st.session_state.get("take_dir")
+    if d and os.path.isdir(d):
+        try: os.utime(d)  # 같은 줄 덮어쓰기는 폴더 mtime을 바꾸지 않으므로 직접 갱신
+        except OSError: pass
+        return d
+    os.makedirs(TAKES_ROOT, exist_ok=True)
+    now = time.time()
+    for name in os.listdir(TAKES_ROOT):  # 하루 넘게 쓰지 않은(끝난) 세션 폴더 정리
+        p = os.path.join(TAKES_ROOT, name)
+        try:
+            if now - os.path.getmtime(p) > TAKES_MAX_AGE_S: shutil.rmtree(p, ignore_errors=True)
+        except OSError:
+            pass
+    d = tempfile.mkdtemp(prefix="s_", dir=TAKES_ROOT)
+    st.session_state["take_dir"] = d
+    return d
+
+def save_take(line_no: int, audio_bytes: bytes) -> Optional[str]:
+    try:
+        path = os.path.join(_take_dir(), f"{line_no:05d}.audio")
+        with open(path, "wb") as f: f.write(audio_bytes)
+        return path
+    except OSError:
+        return None
+
+def rehearsal_mix_parts(seq: List[Dict], turns: List[Dict], my_role: str, voice_label: str,
+                        synthesize: bool = False):
+    """mixdown()에 넘길 (제목, 오디오, 재생 속도, 대체 무음 초)를 녹음한 첫 줄~마지막 줄까지 대본 순서로.
+    내 줄은 마지막 녹음, 상대역 줄은 저장된 TTS(synthesize면 없는 것만 새로 합성)."""
+    takes = {t["line_idx"]: t["take"] for t in turns
+             if t.get("take") and t["line_idx"] <= len(seq) and os.path.exists(t["take"])}
+    if not takes: return
+    voice_id = VOICE_MAP_SAFE.get(voice_label, "alloy")
+    rate = 2.0 ** (_voice_pitch_semitones(voice_label) / 12.0)
+    cache = get_tts_cache()
+    for no in range(min(takes), max(takes)+1):
+        line = seq[no-1]
+        title = f"#{no} {line['who']}: {line['text']}"
+        est_s = max(1.0, (line.get("feat") or {}).get("n_syl", len(line["text"])) / 5.0)
+        if no in takes:
+            yield title, takes[no], 1.0, est_s
+        elif line["who"] != my_role:
+            speak_text = re.sub(r"\(.*?\)", "", line["text"]).strip()
+            audio = cache.get(voice_id, speak_text)
+            if audio is None and synthesize:
+                try:
+                    audio = tts_fetch_raw(voice_id, speak_text)
+                except Exception:
+                    synthesize = False  # 차단·오류가 나면 나머지는 무음으로
+            yield (title if audio else title + " (음성 없음)"), audio, rate, est_s
+        else:
+            yield title + " (녹음 없음)", None, 1.0, est_s
+
+def _render_mixdown(seq: List[Dict], my_role: str, voice_label: str):
+    turns = st.session_state.get("duet_turns", [])
+    n_takes = len({t["line_idx"] for t in turns if t.get("take")})
+    with st.expander(f"🎧 전체 연습 녹음 만들기 (녹음한 줄 {n_takes}개)"):
+        if not n_takes:
+            st.caption("아직 녹음한 줄이 없어요."); return
+        st.caption("내 녹음과 그 사이 상대역 대사를 대본 순서대로 이어 한 파일(WAV, 줄마다 마커)로 만들어요.")
+        synth = st.checkbox("저장된 음성이 없는 상대역 대사는 새로 합성", value=False, key="mix_synth",
+                            disabled=not OPENAI_API_KEY)
+        if st.button("🎬 녹음 파일 만들기", key="mix_go"):
+            out = os.path.join(_take_dir(), "rehearsal.wav")
+            with st.spinner("🎧 녹음을 이어 붙이는 중…"):
+                t0 = time.perf_counter()
+                chapters = mixdown(rehearsal_mix_parts(seq, turns, my_role, voice_label, synth), out)
+                st.session_state["mixdown"] = {"path": out, "chapters": chapters, "secs": time.perf_counter()-t0}
+        mix = st.session_state.get("mixdown")
+        if not (mix and os.path.exists(mix["path"])): return
+        chapters = mix["chapters"]
+        total = chapters[-1]["end_s"] if chapters else 0.0
+        st.caption(f"⏱️ {len(chapters)}줄 · {total/60:.1f}분 · {os.path.getsize(mix['path'])/1e6:.1f} MB · "
+                   f"만드는 데 {mix['secs']:.1f}초")
+        path = mix["path"]
+        c1, c2 = st.columns(2)
+        # 파일은 누를 때 읽는다(다시 실행마다 메모리에 올리지 않음). Streamlit 다운로드는 결과를 메모리 저장소에
+        # 통째로 올리므로 스트리밍은 안 된다: 16kHz·모노·16bit라 1분에 약 1.9MB(30분 연습 ≈ 58MB)
+        with c1:
+            st.download_button("⬇️ 녹음(WAV)", data=lambda: Path(path).read_bytes(), file_name="rehearsal.wav",
+                               mime="audio/wav", key="mix_dl", on_click="ignore")
+        with c2:
+            st.download_button("⬇️ 줄 목록(WebVTT 챕터)", data=chapters_vtt(chapters), file_name="rehearsal_chapters.vtt",
+                               mime="text/vtt", key="mix_vtt", on_click="ignore")
+
+def _record_turn(cur_idx: int, cur_line: Dict, spoken: str, audio_bytes: Optional[bytes], want_metrics: bool,
+                 source: str = "stt"):
+    res = score_turn(cur_line["text"], spoken, audio_bytes, want_metrics, feat=cur_line.get("feat"))
+    turn = {"line_idx": cur_idx+1, "who": cur_line["who"],
+            "expected": res["expected"], "spoken": spoken, "score": res["score"]}
+    if source != "stt": turn["source"] = source
+    if audio_bytes:
+        take = save_take(cur_idx+1, audio_bytes)
+        if take: turn["take"] = take
+    st.session_state.setdefault("duet_turns", []).append(turn)
+    add_turn_stats(st.session_state.setdefault("duet_stats", new_turn_stats()), turn, res["prosody"])
+    st.session_state["duet_last_result"] = dict(res, line_idx=cur_idx+1)
+
+@st.fragment
+def _rehearsal_turn_fragment(seq: List[Dict], my_role: str, voice_label: str, want_metrics: bool,
+                             scenes: Optional[List[Dict]] = None):
+    """현재 줄·녹음기·분석 결과·이전/다음 이동 + 녹음 모음. 한 턴은 이 조각만 다시 실행된다
+    (녹음한 줄 수가 턴마다 바뀌므로 믹스다운도 조각 안에 둔다)."""
+    _render_turn(seq, my_role, voice_label, want_metrics, scenes)
+    _render_mixdown(seq, my_role, voice_label)
+
+def _render_turn(seq: List[Dict], my_role: str, voice_label: str, want_metrics: bool,
+                 scenes: Optional[List[Dict]] = None):
+    n_lines = len(seq)
+    cur_idx = st.session_state.get("duet_cursor", 0)
+    _render_nav(seq, scenes or [], min(cur_idx, n_lines-1))
+    if cur_idx >= n_lines:
+        st.success("🎉 끝까지 진행했습니다. 이제 연습 종료 & 종합 피드백을 받아보세요!")
+        st.info("💡 아래의 '🏁 연습 종료 & 종합 피드백' 버튼을 눌러 연습 결과를 확인해보세요!")
+        st.button("⬅️ 이전 줄로 이동", key="prev_live_end", on_click=_move_cursor, args=(-1, n_lines))
+        return
+
+    cur_line = seq[cur_idx]
+    sc = scene_of(scenes or [], cur_idx)
+    where = f" ({sc['title']})" if sc else ""
+    st.markdown(f"#### 현재 줄 #{cur_idx+1}{where}: **{cur_line['who']}** — {cur_line['text']}")
+    if cur_line["who"] == my_role:
+        st.info("내 차례예요. 아래 **마이크 버튼을 한 번만** 눌러 말하고, 버튼이 다시 바뀌면 자동 분석이 시작됩니다.")
+        if get_breakers()["stt"].state == "open":
+            st.caption("⚠️ 음성 인식 서버가 잠시 쉬는 중이에요. 녹음하면 말한 대사를 직접 입력해 채점할 수 있어요.")
+        audio_bytes, trimmed, endpoint_s = None, False, None
+        if ENDPOINT_RECORDER and _endpoint_recorder is not None:
+            # 브라우저가 말 끝을 찾아 바로 멈추고, 앞뒤 무음을 잘라 16 kHz 모노 WAV로 보낸다
+            st.markdown("💡 **버튼을 누르고 말하면, 말이 끝나는 순간 자동으로 멈추고 분석해요**")
+            rec = _endpoint_recorder(hangover_ms=ENDPOINT_HANGOVER_MS, key=f"eprec_{cur_idx}", default=None)
+            if rec and rec.get("wav"):
+                audio_bytes, trimmed = base64.b64decode(rec["wav"]), True
+                endpoint_s = (rec.get("endpoint_ms") or ENDPOINT_HANGOVER_MS) / 1000.0
+        elif audio_recorder is not None:
+            st.markdown("💡 **마이크 아이콘을 클릭하여 녹음 시작/중지**")
+            pause_s = 2.0
+            audio_bytes = audio_recorder(text="🎤 말하고 인식(자동 분석)", sample_rate=16000,
+                                         pause_threshold=pause_s, key=f"audrec_one_{cur_idx}")
+            endpoint_s = pause_s
+        else:
+            st.warning("audio-recorder-streamlit 패키지가 필요합니다. `pip install audio-recorder-streamlit`")
+
+        if audio_bytes:
+            token = hashlib.sha256(audio_bytes).hexdigest()[:16]
+            if st.session_state.get("auto_done_token") != (cur_idx, token):
+                st.session_state["auto_done_token"] = (cur_idx, token)
+                t0 = time.perf_counter(); req_err = None
+                with st.status("🎧 인식 중...", expanded=False) as s:
+                    try:
+                        stt = clova_short_stt(audio_bytes, lang="Kor", trimmed=trimmed)
+                    except BackendUnavailable as e:
+                        st.session_state["stt_degraded"] = (cur_idx, str(e))
+                        s.update(label="⚠️ 음성 인식 불가 — 직접 입력으로 채점", state="error")
+                    except BackendRequestError as e:
+                        req_err = e
+                        s.update(label="❌ 음성 인식 요청이 거절됐어요", state="error")
+                    else:
+                        st.session_state.pop("stt_degraded", None)
+                        s.update(label="🧪 분석 중...", state="running")
+                        _record_turn(cur_idx, cur_line, stt, audio_bytes, want_metrics)
+                        st.session_state["duet_last_result"]["latency"] = {
+                            "endpoint_s": endpoint_s, "server_s": time.perf_counter() - t0}
+                        s.update(label="✅ 인식 완료", state="complete")
+                if req_err is not None:
+                    st.error(f"{req_err} — CLOVA Speech 키와 설정(CLOVA_SPEECH_SECRET·CLOVA_SPEECH_URL)을 확인해 주세요.")
+
+        last = st.session_state.get("duet_last_result")
+        deg = st.session_state.get("stt_degraded")
+        if deg and deg[0] == cur_idx and not (last and last.get("line_idx") == cur_idx+1):
+            # 간소화 모드: 말한 내용을 직접 입력 → 글자 채점, 녹음이 있으면 말속도·크기는 그대로 분석
+            st.warning(f"🎧 {deg[1]}. 방금 말한 대사를 입력하면 글자로 채점해 줄게요.")
+            typed = st.text_input("내가 말한 대사", key=f"typed_{cur_idx}")
+            if st.button("✍️ 글자로 채점", key=f"typed_go_{cur_idx}") and typed.strip():
+                _record_turn(cur_idx, cur_line, typed.strip(), audio_bytes, want_metrics, source="typed")
+                st.session_state.pop("stt_degraded", None)
+                last = st.session_state.get("duet_last_result")
+        if last and last.get("line_idx") == cur_idx+1:
+            _render_turn_result(last, cur_idx)
+    else:
+        st.info("지금은 상대역 차례예요. ‘🔊 파트너 음성 듣기’로 듣거나, 이전/다음 줄로 이동할 수 있어요.")
+        if st.button("🔊 파트너 음성 듣기", key=f"partner_say_live_cur_{cur_idx}"):
+            if TTS_STREAMING and _tts_stream_player is not None and OPENAI_API_KEY:
+                st.session_state["tts_stream"] = (cur_idx, TTSStream(cur_line["text"], voice_label))
+            else:
+                with st.spinner("🔊 음성 합성 중…"):
+                    t0 = time.perf_counter()
+                    speak_text, audio = tts_speak_line(cur_line["text"], voice_label)
+                    st.success(f"파트너({cur_line['who']}): {speak_text}")
+                    if audio:
+                        st.audio(audio, format="audio/mpeg")
+                        st.caption(f"⏱️ 첫 소리까지 {time.perf_counter()-t0:.2f}초 (전체 수신 + 피치 변환 후 재생)")
+        job = st.session_state.get("tts_stream")
+        if job and job[0] == cur_idx:
+            _render_tts_stream(job[1], cur_line["who"])
+
+    cA, cB = st.columns(2)
+    with cA:
+        st.button("⬅️ 이전 줄로 이동", key=f"prev_live_{cur_idx}", on_click=_move_cursor, args=(-1, n_lines))
+    with cB:
+        st.button("➡️ 다음 줄 이동", key=f"next_live_{cur_idx}", on_click=_move_cursor, args=(+1, n_lines))
+
 def page_rehearsal_partner():
     st.header("🎙️ 5) AI 대본 연습 — 줄 단위(한 번 클릭→자동 분석)")
 
-    script = st.session_state.get("script_final") or st.session_state.get("script_balanced") or st.session_state.get("script_raw","")
+    script = script_store().first("final", "balanced", "raw")
     if not script:
         st.warning("먼저 대본을 등록/생성하세요."); return
 
-    seq = build_sequence(script); roles = extract_roles(script)
+    seq, roles, scenes = parse_script_shared(script)
     if not seq or not roles:
         st.info("‘이름: 내용’ 형식이어야 리허설 가능해요."); return
 
     st.session_state.setdefault("duet_cursor", 0)
     st.session_state.setdefault("duet_turns", [])
+    st.session_state.setdefault("duet_stats", new_turn_stats())
     st.session_state.setdefault("auto_done_token", None)
 
     want_metrics = st.checkbox("텍스트 분석 포함(말속도·크기·어조·띄어읽기)", value=True, key="ck_metrics")
@@ -939,115 +1900,28 @@ def page_rehearsal_partner():
         st.session_state["previous_role"] = my_role
         st.success(f"✅ 역할이 '{my_role}'로 변경되었습니다!")
         st.rerun()
+    # 큐카드는 누를 때만 만든다(대본·역할당 한 번, 반 전체가 한 파일을 같이 씀). 실패하면 다운로드 오류로 보인다
+    st.download_button("🗂️ 내 큐카드(PDF)", data=lambda: cuecard_download(script, my_role),
+                       file_name=f"cuecards_{my_role}.pdf", mime="application/pdf", key="cuecard_dl", on_click="ignore")
 
-    cur_idx = st.session_state.get("duet_cursor", 0)
-    if cur_idx >= len(seq):
-        st.success("🎉 끝까지 진행했습니다. 이제 연습 종료 & 종합 피드백을 받아보세요!")
-        st.info("💡 아래의 '🏁 연습 종료 & 종합 피드백' 버튼을 눌러 연습 결과를 확인해보세요!")
-    else:
-        cur_line = seq[cur_idx]
-        st.markdown(f"#### 현재 줄 #{cur_idx+1}: **{cur_line['who']}** — {cur_line['text']}")
-        if cur_line["who"] == my_role:
-            st.info("내 차례예요. 아래 **마이크 버튼을 한 번만** 눌러 말하고, 버튼이 다시 바뀌면 자동 분석이 시작됩니다.")
-            audio_bytes = None
-            if audio_recorder is not None:
-                st.markdown("💡 **마이크 아이콘을 클릭하여 녹음 시작/중지**")
-                audio_bytes = audio_recorder(text="🎤 말하고 인식(자동 분석)", sample_rate=16000,
-                                             pause_threshold=2.0, key=f"audrec_one_{cur_idx}")
-            else:
-                st.warning("audio-recorder-streamlit 패키지가 필요합니다. `pip install audio-recorder-streamlit`")
-
-            if audio_bytes:
-                with st.status("🎧 인식 중...", expanded=True) as s:
-                    token = hashlib.sha256(audio_bytes).hexdigest()[:16]
-                    if st.session_state.get("auto_done_token") != (cur_idx, token):
-                        st.session_state["auto_done_token"] = (cur_idx, token)
-                        stt = clova_short_stt(audio_bytes, lang="Kor")
-                        s.update(label="🧪 분석 중...", state="running")
-                        st.markdown("**STT 인식 결과(원문)**")
-                        st.text_area("인식된 문장", value=stt or "(빈 문자열)", height=90, key=f"saw_{cur_idx}")
-                        expected_core = re.sub(r"\(.*?\)", "", cur_line["text"]).strip()
-                        st.caption("비교 기준(지문 제거)")
-                        st.code(expected_core, language="text")
-                        html, _ = match_highlight_html(expected_core, stt or "")
-                        score = similarity_score(expected_core, stt or "")
-                        st.markdown("**일치 하이라이트(초록=일치, 빨강=누락)**", unsafe_allow_html=True)
-                        st.markdown(html, unsafe_allow_html=True)
-                        st.caption(f"일치율(내부 지표) 약 {score*100:.0f}%")
-                        if want_metrics:
-                            pros = analyze_prosody(audio_bytes, stt or "")
-                            render_prosody_card(pros)
-                        else:
-                            st.info("텍스트만 확인 모드입니다.")
-                        turns = st.session_state.get("duet_turns", [])
-                        turns.append({"line_idx": cur_idx+1, "who": cur_line["who"],
-                                      "expected": expected_core, "spoken": stt, "score": score})
-                        st.session_state["duet_turns"] = turns
-                        s.update(label="✅ 인식 완료", state="complete")
-
-            cA, cB = st.columns(2)
-            with cA:
-                if st.button("⬅️ 이전 줄로 이동", key=f"prev_live_{cur_idx}"):
-                    st.session_state["duet_cursor"] = max(0, cur_idx-1)
-                    st.session_state["auto_done_token"]=None
-                    st.rerun()
-            with cB:
-                if st.button("➡️ 다음 줄 이동", key=f"next_live_{cur_idx}"):
-                    st.session_state["duet_cursor"] = min(len(seq), cur_idx+1)
-                    st.session_state["auto_done_token"]=None
-                    st.rerun()
-        else:
-            st.info("지금은 상대역 차례예요. ‘🔊 파트너 음성 듣기’로 듣거나, 이전/다음 줄로 이동할 수 있어요.")
-            if st.button("🔊 파트너 음성 듣기", key=f"partner_say_live_cur_{cur_idx}"):
-                with st.spinner("🔊 음성 합성 중…"):
-                    speak_text, audio = tts_speak_line(cur_line["text"], voice_label)
-                    st.success(f"파트너({cur_line['who']}): {speak_text}")
-                    if audio: st.audio(audio, format="audio/mpeg")
-            cA, cB = st.columns(2)
-            with cA:
-                if st.button("⬅️ 이전 줄로 이동", key=f"prev_live2_{cur_idx}"):
-                    st.session_state["duet_cursor"] = max(0, cur_idx-1)
-                    st.session_state["auto_done_token"]=None
-                    st.rerun()
-            with cB:
-                if st.button("➡️ 다음 줄 이동", key=f"next_live2_{cur_idx}"):
-                    st.session_state["duet_cursor"] = min(len(seq), cur_idx+1)
-                    st.session_state["auto_done_token"]=None
-                    st.rerun()
+    # 녹음·이동 같은 턴 이벤트는 아래 조각(fragment)만 다시 실행 → 대본 파싱/위젯/CSS 재생성 없음
+    _rehearsal_turn_fragment(seq, my_role, voice_label, want_metrics, scenes)
 
     if st.button("🏁 연습 종료 & 종합 피드백", key="end_feedback"):
         with st.spinner("🏁 종합 피드백을 생성하고 있습니다..."):
             feed = client.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[{"role":"user","content":prompt_session_feedback(st.session_state.get('duet_turns',[]))}],
+                messages=[{"role":"user","content":prompt_session_feedback(st.session_state.get('duet_turns',[]), st.session_state.get('duet_stats'))}],
                 temperature=0.3, max_tokens=1200
             ).choices[0].message.content
             st.session_state["session_feedback"] = feed
             st.success("✅ 종합 피드백 생성 완료!")
             st.markdown(feed or "(피드백 실패)")
             st.balloons()
-            st.image("assets/dragon_end.png", width='stretch')
+            st.image(shared_file("assets/dragon_end.png"), width='stretch')
             st.markdown("🐉 **이제 연극 용이 모두 성장했어요!** 다시 돌아가서 연극 대모험을 완료해보세요! 🎭✨")
             st.session_state["next_step_hint"] = "🎉 연극 연습 완료! 새로운 모험을 시작해보세요!"
 
-# ───────── 사이드바 상태 ─────────────────────────────────────────
-def sidebar_status():
-    st.sidebar.markdown("### 상태")
-    def badge(ok: bool): return f"{'✅' if ok else '⚠️'}"
-    has_script = bool(st.session_state.get("script_raw") or st.session_state.get("script_final") or st.session_state.get("script_balanced"))
-    st.sidebar.markdown(f"- 대본 입력: {badge(has_script)}")
-    st.sidebar.markdown(f"- OpenAI TTS: {badge(bool(OPENAI_API_KEY))}")
-    st.sidebar.markdown(f"- CLOVA STT: {badge(bool(CLOVA_SPEECH_SECRET))}")
-    st.sidebar.markdown(f"- OCR(선택): {badge(bool(NAVER_CLOVA_OCR_URL and NAVER_OCR_SECRET))}")
-    if st.session_state.get("next_step_hint"):
-        st.sidebar.markdown("<hr/>", unsafe_allow_html=True)
-        st.sidebar.markdown("### 💡 다음 단계")
-        st.sidebar.info(st.session_state["next_step_hint"])
-        if st.sidebar.button("✅ 확인했어요", key="clear_hint"):
-            del st.session_state["next_step_hint"]; st.rerun()
-    st.sidebar.markdown("<hr/>", unsafe_allow_html=True)
-    st.sidebar.markdown("<div class='small'>지문(괄호)은 TTS에서 읽지 않도록 처리됩니다.</div>", unsafe_allow_html=True)
-
 # ───────── MAIN ────────────────────────────────────────────────────
 def main():
     st.set_page_config("연극용의 둥지", "🐉", layout="wide")
@@ -1066,7 +1940,14 @@ def main():
         "🎙️ 5) AI 대본 연습": page_rehearsal_partner
     }
 
-    #sidebar_status()
+    degraded = any(br.state != "closed" for br in get_breakers().values())
+    if degraded:
+        st.sidebar.warning("일부 외부 서비스가 불안정해 간소화 모드로 동작 중이에요.")
+    with st.sidebar.expander("📶 서버 상태", expanded=degraded) as box:
+        render_backend_status(box)
+        render_audio_status(box)
+        sh = get_shared_store().stats()
+        box.markdown(f"- 공유 캐시: {sh['entries']}개 · {sh['bytes']/1e6:.1f} MB · 사용 중 {sh['held']}개(참조 {sh['refs']})")
     all_pages = list(pages.keys())
     sel = st.sidebar.radio("메뉴", all_pages, 
                           index=all_pages.index(st.session_state["current_page"]), 
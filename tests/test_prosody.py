@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""프로소디 라벨 회귀: 스트리밍·빠른 단계가 기존 기본 경로(analyze_prosody의 pydub 분기)와 같은 라벨을 내는지."""
+import io, os, sys, math, wave, struct, random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+np = pytest.importorskip("numpy")
+pydub = pytest.importorskip("pydub")
+import audio_analysis as aa  # noqa: E402
+
+LABELS = ("speed_label", "volume_label", "tone_label", "spacing_label")
+
+def speech_like_wav(amp: float, syl_s: float = 0.18, gap_s: float = 0.07, n_syl: int = 12,
+                    pause_s: float = 0.5, sr: int = 16000, seed: int = 0) -> bytes:
+    """음절처럼 켜졌다 꺼지는 배음 묶음 + 중간 쉼. amp = 최대 진폭(0~1)."""
+    rnd = random.Random(seed); out = []
+    def tone(secs):
+        f0 = rnd.uniform(140, 240); n = int(sr * secs)
+        for i in range(n):
+            env = math.sin(math.pi * i / n)
+            v = sum(math.sin(2 * math.pi * f0 * k * i / sr) / k for k in (1, 2, 3)) / 1.8
+            out.append(amp * env * v + rnd.gauss(0, 0.002))
+    def quiet(secs):
+        out.extend(rnd.gauss(0, 0.002) for _ in range(int(sr * secs)))
+    quiet(0.3)
+    for j in range(n_syl):
+        tone(syl_s); quiet(gap_s)
+        if j == n_syl // 2: quiet(pause_s)
+    quiet(0.3)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1); wf.setsampwidth(2); wf.setframerate(sr)
+        wf.writeframes(struct.pack(f"<{len(out)}h", *(int(max(-1, min(1, x)) * 32767) for x in out)))
+    return buf.getvalue()
+
+@pytest.fixture
+def old_path(monkeypatch):
+    """배포 경로 그대로: librosa 없음, pydub이 WAV를 직접 읽음(ffmpeg 유무와 무관하게)."""
+    monkeypatch.setattr(aa, "_lb", None)
+    orig = aa.AudioSegment.from_file.__func__
+    monkeypatch.setattr(aa.AudioSegment, "from_file",
+                        classmethod(lambda cls, f, format=None, **kw: orig(cls, f, format="wav")))
+    return aa.analyze_prosody
+
+@pytest.mark.parametrize("amp", [0.9, 0.5, 0.2, 0.05, 0.01])
+@pytest.mark.parametrize("text", ["안녕", "안녕하세요 반가워", "안녕하세요 오늘은 연습하는 날이에요 다 같이 해 봐요"])
+@pytest.mark.parametrize("gap_s", [0.02, 0.15])
+def test_labels_match_old_path(old_path, amp, text, gap_s):
+    wav = speech_like_wav(amp, gap_s=gap_s, seed=int(amp * 100))
+    want = old_path(wav, text)
+    for got in (aa.analyze_prosody_stream(wav, text), aa.analyze_prosody_lite(wav, text),
+                aa.analyze_prosody_fast(wav, text)):
+        assert {k: got[k] for k in LABELS} == {k: want[k] for k in LABELS}
+        assert got["syllables_per_sec"] == pytest.approx(want["syllables_per_sec"])
+        assert got["pause_ratio"] == pytest.approx(want["pause_ratio"], abs=1e-3)
+        assert got["rms_db"] == pytest.approx(want["rms_db"], abs=1e-6)
+
+def test_streaming_block_size_does_not_change_labels(old_path):
+    wav = speech_like_wav(0.3)
+    want = aa.analyze_prosody_stream(wav, "안녕하세요 반가워", block_s=0.5)
+    for block_s in (0.013, 0.1, 2.0):
+        got = aa.analyze_prosody_stream(wav, "안녕하세요 반가워", block_s=block_s)
+        assert {k: got[k] for k in LABELS} == {k: want[k] for k in LABELS}
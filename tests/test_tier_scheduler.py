@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""프로소디 단계 스케줄러: 몰림 뒤 회복, 풀 거절 반영."""
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_analysis import TierScheduler  # noqa: E402
+
+class Clock:
+    def __init__(self): self.t = 1000.0
+    def __call__(self): return self.t
+
+def _burst(sched: TierScheduler, clock: Clock):
+    """건강한 full 190건 뒤 느린 full 12건(오디오 3초, 처리 0.1초 → 2초)."""
+    for _ in range(190):
+        sched.record("full", 0.12, 100.0, 3.0); clock.t += 0.05
+    for _ in range(12):
+        sched.record("full", 2.2, 2000.0, 3.0); clock.t += 0.05
+
+def test_burst_forces_fast_while_busy():
+    clock = Clock(); sched = TierScheduler(1.0, clock=clock)
+    _burst(sched, clock)
+    assert sched.choose(in_flight=2, workers=2, audio_s=3.0) == "fast"
+
+def test_recovers_after_burst():
+    clock = Clock(); sched = TierScheduler(1.0, clock=clock)
+    _burst(sched, clock)
+    tiers = []
+    for _ in range(1000):  # 한가한 요청이 0.1초마다
+        tier = sched.choose(in_flight=0, workers=2, audio_s=3.0)
+        tiers.append(tier)
+        sched.record(tier, 0.12, 100.0 if tier == "full" else 20.0, 3.0)
+        clock.t += 0.1
+    assert tiers[-1] == "full"
+    assert tiers.count("full") > 0 and all(t == "full" for t in tiers[-100:])
+    # 빈 워커로 보내는 시험(full)은 probe_s마다 한 번 이상
+    assert "full" in tiers[: int(sched.probe_s / 0.1) + 1]
+
+def test_no_probe_when_workers_busy():
+    clock = Clock(); sched = TierScheduler(1.0, clock=clock)
+    _burst(sched, clock)
+    clock.t += sched.probe_s + 1
+    assert sched.choose(in_flight=2, workers=2, audio_s=3.0) == "fast"
+
+def test_pool_rejection_switches_to_fast_then_back():
+    clock = Clock(); sched = TierScheduler(1.0, clock=clock)
+    for _ in range(20):
+        sched.record("full", 0.1, 50.0, 3.0)
+    assert sched.choose(in_flight=2, workers=2, audio_s=3.0) == "full"
+    sched.record("fallback", 0.06, None, 3.0)  # 풀 자리를 못 얻음
+    assert sched.choose(in_flight=2, workers=2, audio_s=3.0) == "fast"
+    clock.t += sched.overload_s + 0.1
+    assert sched.choose(in_flight=2, workers=2, audio_s=3.0) == "full"
+
+def test_full_queue_goes_fast():
+    clock = Clock(); sched = TierScheduler(1.0, clock=clock)
+    for _ in range(20):
+        sched.record("full", 0.1, 50.0, 3.0)
+    assert sched.choose(in_flight=6, workers=2, audio_s=3.0, capacity=6) == "fast"
+    assert sched.choose(in_flight=5, workers=2, audio_s=3.0, capacity=6) == "full"
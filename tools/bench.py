@@ -0,0 +1,537 @@
+# -*- coding: utf-8 -*-
+"""로컬 벤치마크 하네스.
+
+    python tools/bench.py            # 전체 케이스
+    python tools/bench.py rerun      # 지정 케이스만
+
+각 케이스는 @case("이름")으로 등록하고, measure()로 잰 결과를 report()로 출력한다.
+"""
+import os, sys, io, gc, math, wave, random, struct, time, statistics
+from typing import Callable, Dict, List, Tuple
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS)
+for _p in (ROOT, TOOLS):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+CASES: Dict[str, Callable[[], None]] = {}
+
+def case(name: str):
+    def deco(fn):
+        CASES[name] = fn
+        return fn
+    return deco
+
+def _pct(vals: List[float], q: float) -> float:
+    if not vals: return 0.0
+    s = sorted(vals)
+    return s[min(len(s)-1, int(round(q*(len(s)-1))))]
+
+def measure(fn: Callable[[], object], repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """fn을 repeat회 실행해 wall p50/p95(ms)와 평균 CPU(ms, 프로세스 전체)를 잰다."""
+    for _ in range(warmup): fn()
+    walls, cpus = [], []
+    for _ in range(repeat):
+        w0 = time.perf_counter(); c0 = time.process_time()
+        fn()
+        cpus.append(time.process_time()-c0); walls.append(time.perf_counter()-w0)
+    return {"p50_ms": _pct(walls, 0.5)*1000, "p95_ms": _pct(walls, 0.95)*1000,
+            "cpu_ms": statistics.fmean(cpus)*1000}
+
+def report(title: str, rows: List[Tuple[str, Dict[str, float]]]):
+    print(f"\n## {title}")
+    if not rows: return
+    cols = list(rows[0][1].keys())
+    w = max(len(r[0]) for r in rows) + 2
+    print("".ljust(w) + "".join(c.rjust(12) for c in cols))
+    for name, vals in rows:
+        print(name.ljust(w) + "".join(
+            (f"{vals[c]:.2f}" if isinstance(vals[c], float) else str(vals[c])).rjust(12) for c in cols))
+
+def sample_script(n_lines: int, roles=("민수", "지영", "해설"), scene_every: int = 12) -> str:
+    """'장면 N' 머리글이 섞인 합성 대본."""
+    out = []
+    for i in range(n_lines):
+        if i % scene_every == 0:
+            out.append(f"장면 {i//scene_every + 1}")
+        who = roles[i % len(roles)]
+        out.append(f"{who}: (천천히) 오늘은 {i}번째 대사를 연습하는 날이에요, 모두 힘내요!")
+    return "\n".join(out)
+
+def sample_wav(seconds: float = 3.0, sr: int = 16000, seed: int = 0) -> bytes:
+    """말소리 비슷한 합성 WAV(16bit mono): 음절 단위로 켜졌다 꺼지는 배음 + 약한 잡음."""
+    rnd = random.Random(seed)
+    n = int(seconds * sr); frames = bytearray()
+    for i in range(n):
+        t = i / sr
+        f0 = 180 + 30 * math.sin(2 * math.pi * 0.7 * t)
+        env = max(0.0, math.sin(2 * math.pi * 4.0 * t)) ** 0.5  # 초당 ~4음절
+        v = env * (0.5*math.sin(2*math.pi*f0*t) + 0.25*math.sin(4*math.pi*f0*t) + 0.1*math.sin(6*math.pi*f0*t))
+        v += 0.01 * rnd.uniform(-1, 1)
+        frames += struct.pack("<h", int(max(-1.0, min(1.0, v)) * 20000))
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1); wf.setsampwidth(2); wf.setframerate(sr); wf.writeframes(bytes(frames))
+    return buf.getvalue()
+
+def load_app():
+    """streamlit_app을 도구에서 import (secrets.toml이 없으면 환경변수 사용)."""
+    import streamlit_app as app
+    return app
+
+def use_stub(app, base: str):
+    """이미 로드된 앱 모듈을 스텁 서버로 향하게 한다(모듈 전역 주소·키 교체)."""
+    from openai import OpenAI
+    app.OPENAI_BASE_URL = f"{base}/v1"; app.CLOVA_SPEECH_URL = base
+    app.NAVER_CLOVA_OCR_URL = f"{base}/ocr"
+    app.OPENAI_API_KEY = app.OPENAI_API_KEY or "stub"
+    app.CLOVA_SPEECH_SECRET = app.CLOVA_SPEECH_SECRET or "stub"
+    app.NAVER_OCR_SECRET = app.NAVER_OCR_SECRET or "stub"
+    app.client = OpenAI(api_key=app.OPENAI_API_KEY, base_url=app.OPENAI_BASE_URL)
+
+# ───────── 케이스: 리허설 한 턴당 서버 CPU (전체 rerun vs fragment rerun) ─────────
+def _app_full_turn():
+    import streamlit as st
+    import streamlit_app as app
+    st.markdown(app.PASTEL_CSS, unsafe_allow_html=True)
+    app.page_rehearsal_partner()
+
+def _app_fragment_turn():
+    import streamlit as st
+    import streamlit_app as app
+    s = st.session_state
+    app._rehearsal_turn_fragment(s["bench_seq"], s["bench_role"], app.VOICE_KR_LABELS_SAFE[0], True)
+
+@case("rerun")
+def bench_rerun():
+    from streamlit.testing.v1 import AppTest
+    rows = []
+    for n in (40, 400, 1000):
+        script = sample_script(n)
+        full = AppTest.from_function(_app_full_turn, default_timeout=60)
+        full.secrets["OPENAI_API_KEY"] = "sk-bench"
+        store = load_app().ScriptStore(); store.commit("raw", script)
+        full.session_state["script_store"] = store
+        full.session_state["duet_cursor"] = 1
+        full.run()
+        import streamlit_app as app  # 위 AppTest 실행에서 이미 로드됨
+        seq, roles = app.with_line_features(app.build_sequence(script)), app.extract_roles(script)
+        frag = AppTest.from_function(_app_fragment_turn, default_timeout=60)
+        frag.secrets["OPENAI_API_KEY"] = "sk-bench"
+        frag.session_state["bench_seq"] = seq
+        frag.session_state["bench_role"] = roles[0]
+        frag.session_state["duet_cursor"] = 1
+        # 앞 케이스가 남긴 쓰레기 수거가 한 샘플에 몰리지 않게 비우고, p95가 최댓값이 되지 않게 30회
+        gc.collect(); m_full = measure(full.run, repeat=30)
+        gc.collect(); m_frag = measure(frag.run, repeat=30)
+        rows.append((f"full rerun    n={n}", m_full))
+        rows.append((f"fragment only n={n}", m_frag))
+    report("리허설 턴 rerun 비용 (AppTest, 파트너 차례 줄)", rows)
+
+# ───────── 케이스: STT 업로드 코덱별 전송 바이트·왕복 시간 ─────────
+@case("stt_codec")
+def bench_stt_codec(uplink_kbps: float = 1000.0):
+    from stub_server import start_stub, StubConfig
+    app = load_app()
+    srv, base = start_stub(0, StubConfig(uplink_kbps=uplink_kbps))
+    use_stub(app, base)
+    rows = []
+    try:
+        for secs in (2.0, 6.0):
+            audio = sample_wav(secs)
+            for fmt in app.STT_UPLOAD_FORMATS:
+                payload = app.preprocess_audio_for_stt(audio, fmt=fmt)
+                m = measure(lambda: app.clova_short_stt(audio, fmt=fmt), repeat=5, warmup=1)
+                m_enc = measure(lambda: app.preprocess_audio_for_stt(audio, fmt=fmt), repeat=5, warmup=1)
+                rows.append((f"{fmt:<4} {secs:.0f}s", {"bytes": len(payload), "encode_ms": m_enc["p50_ms"],
+                                                     "rtt_p50_ms": m["p50_ms"], "rtt_p95_ms": m["p95_ms"]}))
+    finally:
+        srv.shutdown()
+    report(f"STT 업로드 코덱 비교 (스텁 서버, 업링크 {uplink_kbps:.0f} kbps)", rows)
+
+# ───────── 케이스: 말 끝 → 결과, 2초 무음 대기 녹음기 vs 브라우저 끝점 검출 ─────────
+def _pad_wav(wav: bytes, lead_s: float, tail_s: float, sr: int = 16000) -> bytes:
+    """WAV 앞뒤에 약한 잡음 무음을 붙인다(녹음기가 보내는 앞뒤 여백 흉내)."""
+    rnd = random.Random(1)
+    def noise(secs): return b"".join(struct.pack("<h", rnd.randint(-30, 30)) for _ in range(int(secs * sr)))
+    with wave.open(io.BytesIO(wav), "rb") as wf: pcm = wf.readframes(wf.getnframes())
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1); wf.setsampwidth(2); wf.setframerate(sr); wf.writeframes(noise(lead_s) + pcm + noise(tail_s))
+    return buf.getvalue()
+
+@case("endpointing")
+def bench_endpointing(uplink_kbps: float = 1000.0, hangover_s: float = 0.6):
+    from stub_server import start_stub, StubConfig
+    app = load_app()
+    srv, base = start_stub(0, StubConfig(uplink_kbps=uplink_kbps))
+    use_stub(app, base)
+    rows = []
+    try:
+        for secs in (2.0, 5.0):
+            speech = sample_wav(secs)
+            for name, audio, trimmed, wait_s in (("audio_recorder", _pad_wav(speech, 0.4, 2.0), False, 2.0),
+                                                 ("endpointing", _pad_wav(speech, 0.2, 0.15), True, hangover_s)):
+                def turn():
+                    stt = app.clova_short_stt(audio, fmt="flac", trimmed=trimmed)
+                    app.score_turn("안녕하세요 오늘은 연습하는 날이에요", stt, audio, True)
+                m = measure(turn, repeat=5, warmup=1)
+                prep = measure(lambda: app.preprocess_audio_for_stt(audio, "flac", trimmed), repeat=5, warmup=1)
+                rows.append((f"{name:<15} {secs:.0f}s", {"upload_kb": len(app.preprocess_audio_for_stt(audio, "flac", trimmed)) / 1024,
+                                                         "prep_ms": prep["p50_ms"],
+                                                         "wait_ms": wait_s * 1000, "server_ms": m["p50_ms"],
+                                                         "total_ms": wait_s * 1000 + m["p50_ms"]}))
+    finally:
+        srv.shutdown()
+    report(f"말 끝 → 결과 (스텁 STT, 업링크 {uplink_kbps:.0f} kbps, 끝점 대기 {hangover_s:.1f}초)", rows)
+
+# ───────── 케이스: 종합 피드백 프롬프트 크기·지연 (기존 JSON 덤프 vs 집계 요약) ─────────
+@case("feedback_prompt")
+def bench_feedback_prompt(chat_ms_per_1k: float = 400.0):
+    import json
+    from stub_server import start_stub, StubConfig
+    app = load_app()
+    srv, base = start_stub(0, StubConfig(chat_ms_per_1k=chat_ms_per_1k))
+    use_stub(app, base)
+    labels = ("적당함", "빠름", "느림")
+    rows = []
+    try:
+        for n in (10, 100, 300):
+            turns, stats = [], app.new_turn_stats()
+            for i in range(n):
+                t = {"line_idx": i+1, "who": ("민수", "지영")[i % 2],
+                     "expected": f"오늘은 {i}번째 대사를 연습하는 날이에요, 모두 힘내요!",
+                     "spoken": f"오늘은 {i}번째 대사를 연습하는 날", "score": (i * 37 % 100) / 100}
+                turns.append(t)
+                app.add_turn_stats(stats, t, {"speed_label": labels[i % 3], "volume_label": "적당함"})
+            legacy = ("연극 대사 연습 기록입니다. 말속도, 어조, 목소리 크기를 중심으로 "
+                      "칭찬/개선점/다음 연습 팁을 간결히 써주세요.\n\n" + json.dumps(turns, ensure_ascii=False, indent=2))
+            compact = app.prompt_session_feedback(turns, stats)
+            for name, prompt in (("legacy", legacy), ("compact", compact)):
+                call = lambda: app.client.chat.completions.create(
+                    model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], max_tokens=1200)
+                m = measure(call, repeat=5, warmup=1)
+                rows.append((f"{name:<7} turns={n}", {"tokens~": app._approx_tokens(prompt),
+                                                      "rtt_p50_ms": m["p50_ms"], "rtt_p95_ms": m["p95_ms"]}))
+    finally:
+        srv.shutdown()
+    report(f"종합 피드백 프롬프트 (스텁 chat, prefill {chat_ms_per_1k:.0f} ms/1k tokens)", rows)
+
+# ───────── 케이스: 파트너 TTS 첫 소리까지 시간 (전체 수신+피치 변환 vs 스트리밍) ─────────
+@case("tts_ttfa")
+def bench_tts_ttfa(speech_rtf: float = 4.0, first_byte_ms: float = 300.0):
+    from stub_server import start_stub, StubConfig, RouteProfile
+    app = load_app()
+    srv, base = start_stub(0, StubConfig(speech_rtf=speech_rtf, profiles={"speech": RouteProfile(first_byte_ms)}))
+    use_stub(app, base)
+    voice = next(v for v in app.VOICE_KR_LABELS_SAFE if "소연" in v)  # 피치 +4
+    rows = []
+    try:
+        for n_chars in (20, 80, 200):
+            text = ("가나다라마바사아자차" * 20)[:n_chars]
+            m_full = measure(lambda: app.tts_speak_line(text, voice), repeat=3, warmup=1)
+            def first_chunk():
+                job = app.TTSStream(text, voice)
+                job.read_from(0, wait=30.0)
+                return job
+            m_stream = measure(first_chunk, repeat=3, warmup=1)
+            rows.append((f"full+pitch {n_chars}자", {"ttfa_p50_ms": m_full["p50_ms"], "ttfa_p95_ms": m_full["p95_ms"]}))
+            rows.append((f"streaming  {n_chars}자", {"ttfa_p50_ms": m_stream["p50_ms"], "ttfa_p95_ms": m_stream["p95_ms"]}))
+    finally:
+        srv.shutdown()
+    report(f"TTS 첫 소리까지 (스텁 speech: 첫 바이트 {first_byte_ms:.0f} ms, 실시간 {speech_rtf:.0f}배 합성)", rows)
+
+# ───────── 케이스: 오디오 프로세스 풀 워커 수별 처리량 ─────────
+@case("audio_pool")
+def bench_audio_pool(clients: int = 8, jobs_per_client: int = 4, secs: float = 4.0):
+    import threading
+    from audio_analysis import AudioPool, run_audio_job
+    audio = sample_wav(secs)
+    rows = []
+    for workers in (0, 1, 2, 4):
+        pool = AudioPool(workers, max_pending=clients, timeout_s=60.0, queue_wait_s=60.0,
+                         target_s=math.inf) if workers else None  # 늘 full 단계(처리량 비교)
+        if pool: run_audio_job(pool, "prosody", audio, "워밍업")  # 작업 프로세스 기동 비용 제외
+        lat: List[float] = []
+        def client():
+            for _ in range(jobs_per_client):
+                t0 = time.perf_counter()
+                run_audio_job(pool, "prosody", audio, "안녕하세요 오늘은 연습하는 날이에요")
+                lat.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        ths = [threading.Thread(target=client) for _ in range(clients)]
+        for th in ths: th.start()
+        for th in ths: th.join()
+        wall = time.perf_counter() - t0
+        if pool: pool.shutdown()
+        rows.append((f"workers={workers or 'inline'}", {"jobs_per_s": len(lat)/wall,
+                                                       "p50_ms": _pct(lat, 0.5)*1000, "p95_ms": _pct(lat, 0.95)*1000}))
+    report(f"프로소디 처리량 (동시 {clients}명, {secs:.0f}초 클립, CPU {os.cpu_count()}개)", rows)
+
+# ───────── 케이스: 프로소디 단계 스케줄러, 늘 full vs 목표 p95에 맞춰 full/fast ─────────
+@case("prosody_tiers")
+def bench_prosody_tiers(workers: int = 2, clients: int = 24, jobs_per_client: int = 5, secs: float = 8.0,
+                        target_ms: float = 600.0):
+    import threading
+    from audio_analysis import AudioPool, run_audio_job
+    audio = sample_wav(secs)
+    rows = []
+    for label, target in (("always full", math.inf), (f"target {target_ms:.0f} ms", target_ms / 1000)):
+        pool = AudioPool(workers, max_pending=clients, timeout_s=60.0, queue_wait_s=60.0, target_s=target)
+        for _ in range(3): run_audio_job(pool, "prosody", audio, "워밍업")  # 기동 + 처리 시간 기록
+        lat: List[float] = []
+        def client():
+            for _ in range(jobs_per_client):
+                t0 = time.perf_counter()
+                run_audio_job(pool, "prosody", audio, "안녕하세요 오늘은 연습하는 날이에요")
+                lat.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        ths = [threading.Thread(target=client) for _ in range(clients)]
+        for th in ths: th.start()
+        for th in ths: th.join()
+        wall = time.perf_counter() - t0
+        c = pool.sched.snapshot()["counts"]; pool.shutdown()
+        rows.append((label, {"jobs_per_s": len(lat)/wall, "p50_ms": _pct(lat, 0.5)*1000, "p95_ms": _pct(lat, 0.95)*1000,
+                             "full": c["full"] - 3, "fast": c["fast"],
+                             "fallback": c["fallback"]}))
+    report(f"프로소디 단계 비율 (워커 {workers}개, 동시 {clients}명, {secs:.0f}초 클립)", rows)
+
+# ───────── 케이스: STT 업스트림 장애 시 턴 지연 (고정 60초 제한 vs 회로 차단기) ─────────
+@case("breaker")
+def bench_breaker(healthy_ms: float = 300.0, stalled_ms: float = 8000.0, calls: int = 12):
+    import requests
+    from stub_server import start_stub, StubConfig, RouteProfile
+    app = load_app()
+    cfg = StubConfig(profiles={"stt": RouteProfile(healthy_ms, 0.2)}, seed=1)
+    srv, base = start_stub(0, cfg)
+    use_stub(app, base)
+    app.STT_UPLOAD_FORMAT = "wav"
+    audio = sample_wav(1.0)
+    br = app.get_breakers()["stt"]
+    rows = []
+    def phase(label, fn, n):
+        lat, fails = [], 0
+        for _ in range(n):
+            t0 = time.perf_counter()
+            try: fn()
+            except Exception: fails += 1
+            lat.append(time.perf_counter() - t0)
+        rows.append((label, {"calls": n, "failed": fails, "p50_ms": _pct(lat, 0.5)*1000, "max_ms": max(lat)*1000,
+                             "total_s": sum(lat), "state": br.state, "timeout_s": br.timeout()}))
+    stt = lambda: app.clova_short_stt(audio, fmt="wav")
+    legacy = lambda: requests.post(f"{base}/recog/v1/stt?lang=Kor", data=audio, timeout=60).raise_for_status()
+    try:
+        phase("healthy", stt, 30)
+        cfg.profiles["stt"] = RouteProfile(stalled_ms)
+        phase("stalled  legacy(60s)", legacy, 2)
+        phase("stalled  breaker", stt, calls)
+        cfg.profiles["stt"] = RouteProfile(healthy_ms, 0.2)
+        time.sleep(br.retry_in() + 0.1)
+        phase("recovered (half-open probe)", stt, 5)
+    finally:
+        srv.shutdown()
+    report(f"STT 장애 구간 (정상 {healthy_ms:.0f} ms → 멈춤 {stalled_ms/1000:.0f}초, 연속 실패 {br.fail_threshold}회면 차단)", rows)
+
+# ───────── 케이스: 줄 채점(대본 쪽 특징 미리 계산 vs 매 턴 계산) ─────────
+@case("scoring")
+def bench_scoring(n_turns: int = 300):
+    app = load_app()
+    script = sample_script(n_turns)
+    seq = app.with_line_features(app.build_sequence(script))
+    turns = [{"line_idx": i+1, "spoken": l["text"][3:-6] + " 음"} for i, l in enumerate(seq)]
+    def per_turn_plain():
+        for t in turns: app.score_turn(seq[t["line_idx"]-1]["text"], t["spoken"], None, False)
+    def per_turn_feat():
+        for t in turns:
+            l = seq[t["line_idx"]-1]; app.score_turn(l["text"], t["spoken"], None, False, feat=l["feat"])
+    rows = [("parse + features", measure(lambda: app.with_line_features(app.build_sequence(script)), repeat=5)),
+            ("score_turn (매 턴 계산)", measure(per_turn_plain, repeat=5)),
+            ("score_turn (미리 계산)", measure(per_turn_feat, repeat=5)),
+            ("rescore_turns", measure(lambda: app.rescore_turns(turns, seq), repeat=5))]
+    report(f"줄 채점 {n_turns}턴 합계", rows)
+
+# ───────── 케이스: 프로소디 분석 단계별 시간·최대 메모리 ─────────
+@case("prosody_stream")
+def bench_prosody_stream():
+    import tracemalloc
+    import audio_analysis as aa
+    rows = []
+    for secs in (5.0, 30.0, 120.0):
+        audio = sample_wav(secs)
+        for name, fn in (("full", aa.analyze_prosody), ("fast", aa.analyze_prosody_fast),
+                         ("stream", aa.analyze_prosody_stream)):
+            m = measure(lambda: fn(audio, "안녕하세요 오늘은 연습하는 날이에요"), repeat=3, warmup=1)
+            tracemalloc.start()
+            res = fn(audio, "안녕하세요 오늘은 연습하는 날이에요")
+            peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+            rows.append((f"{name:<6} {secs:.0f}s", {"p50_ms": m["p50_ms"], "peak_kb": peak / 1024,
+                                                  "f0": "yes" if res.get("f0_hz") else "-",
+                                                  "contour_pts": len(res["contours"]["loudness_db"]) if res.get("contours") else 0}))
+    report("프로소디 분석 (입력 WAV 제외 파이썬 최대 할당)", rows)
+
+# ───────── 케이스: 완성본 생성, 한 번에 vs 장면별 병렬 ─────────
+@case("script_chunked")
+def bench_script_chunked(ms_per_token: float = 2.0):
+    from stub_server import start_stub, StubConfig
+    app = load_app()
+    srv, base = start_stub(0, StubConfig(chat_ms_per_token=ms_per_token))
+    use_stub(app, base)
+    rows = []
+    try:
+        for n in (48, 120, 240):
+            script = sample_script(n)
+            last = script.splitlines()[-1]
+            def single():
+                return app.client.chat.completions.create(
+                    model="gpt-4o-mini", messages=[{"role": "user", "content": app.FINAL_SCRIPT_RULES + "\n\n" + script}],
+                    temperature=0.6, max_tokens=2600).choices[0].message.content
+            def chunked():
+                blocks = app.split_scenes(script)
+                outline = app.script_outline(script, blocks)
+                parts = app.run_scene_chunks(blocks, lambda i, b: app.SCENE_REWRITE_RULES + "\n\n" + outline + "\n\n" + b["text"],
+                                             temperature=0.6, ratio=1.6, floor=600)
+                return "\n\n".join(p or "" for p in parts)
+            for name, fn, par in (("single", single, 1), ("chunked", chunked, 6), ("chunked", chunked, 32)):
+                app.SCENE_PARALLEL = par
+                out = fn()
+                m = measure(fn, repeat=3, warmup=0)
+                rows.append((f"{name:<7} x{par:<2} {n}줄", {"wall_p50_ms": m["p50_ms"], "out_chars": len(out),
+                                                  "complete": "yes" if last in out else "TRUNC"}))
+    finally:
+        srv.shutdown()
+    report(f"완성본 생성 (스텁 chat 에코, 출력 {ms_per_token:.0f} ms/token, xN = 동시 요청 수)", rows)
+
+# ───────── 케이스: 소품 목록 재생성, 전체 vs 바뀐 장면만 ─────────
+@case("stage_kits")
+def bench_stage_kits(chat_ms_per_1k: float = 400.0, base_ms: float = 300.0):
+    from stub_server import start_stub, StubConfig, RouteProfile
+    app = load_app()
+    cfg = StubConfig(chat_ms_per_1k=chat_ms_per_1k, profiles={"chat": RouteProfile(base_ms)})
+    srv, base = start_stub(0, cfg)
+    use_stub(app, base)
+    rows = []
+    def run(label, fn):
+        calls0, bytes0 = cfg.calls.get("chat", 0), cfg.bytes_in
+        t0 = time.perf_counter(); fn(); wall = time.perf_counter() - t0
+        rows.append((label, {"requests": cfg.calls.get("chat", 0) - calls0,
+                             "prompt_kb": (cfg.bytes_in - bytes0) / 1024, "wall_ms": wall * 1000}))
+    try:
+        for n in (60, 240):
+            script = sample_script(n)
+            lines = script.splitlines()
+            lines[len(lines)//2] += " 우산을 챙겨요."  # 역할 조정 페이지에서 한 줄 고친 상황
+            edited = "\n".join(lines)
+            legacy = lambda s: app.client.chat.completions.create(
+                model="gpt-4o-mini", temperature=0.4, max_tokens=1200,
+                messages=[{"role": "user", "content": "소품·무대·의상 체크리스트를 만들어주세요.\n\n대본:\n" + s}])
+            run(f"legacy   {n}줄 최초", lambda: legacy(script))
+            run(f"legacy   {n}줄 한 줄 수정", lambda: legacy(edited))
+            cache = {}
+            run(f"by-scene {n}줄 최초", lambda: app.aggregate_stage_kits(*app.update_stage_kits(script, cache)[:2]))
+            run(f"by-scene {n}줄 한 줄 수정", lambda: app.aggregate_stage_kits(*app.update_stage_kits(edited, cache)[:2]))
+    finally:
+        srv.shutdown()
+    report(f"소품 목록 재생성 (스텁 chat {base_ms:.0f} ms + prefill {chat_ms_per_1k:.0f} ms/1k tokens)", rows)
+
+# ───────── 케이스: 전체 연습 녹음, AudioSegment 이어 붙이기 vs 스트리밍 믹스다운 ─────────
+@case("mixdown")
+def bench_mixdown():
+    import tempfile, tracemalloc
+    import audio_analysis as aa
+    rows = []
+    with tempfile.TemporaryDirectory() as d:
+        takes = []
+        for i in range(4):  # 줄 녹음(3~6초) 몇 개를 돌려 쓴다
+            p = os.path.join(d, f"take{i}.wav")
+            with open(p, "wb") as f: f.write(sample_wav(3.0 + i, seed=i))
+            takes.append(p)
+        for n in (20, 80, 200):
+            parts = lambda: ((f"#{i+1}", takes[i % len(takes)], 1.0 if i % 2 else 1.2, 1.0) for i in range(n))
+            def naive():
+                from pydub import AudioSegment
+                mix = AudioSegment.empty()
+                for _, p, _, _ in parts():
+                    mix += AudioSegment.from_file(p, format="wav").set_frame_rate(aa.MIX_SR) + AudioSegment.silent(300)
+                mix.export(os.path.join(d, "naive.wav"), format="wav")
+            def stream():
+                aa.mixdown(parts(), os.path.join(d, "stream.wav"))
+            for name, fn in (("AudioSegment +=", naive), ("mixdown", stream)):
+                tracemalloc.start(); t0 = time.perf_counter()
+                fn()
+                wall = time.perf_counter() - t0; peak = tracemalloc.get_traced_memory()[1]; tracemalloc.stop()
+                rows.append((f"{name:<16} {n}줄", {"wall_ms": wall * 1000, "peak_mb": peak / 1e6}))
+        audio_min = os.path.getsize(os.path.join(d, "stream.wav")) / (2 * aa.MIX_SR) / 60
+    report(f"전체 연습 녹음 (200줄 = {audio_min:.1f}분, 파이썬 최대 할당)", rows)
+
+# ───────── 케이스: 대본 변형·되돌리기 기록, 문자열 복사 vs 청크 공유 저장소 ─────────
+@case("script_store")
+def bench_script_store():
+    import difflib, tracemalloc
+    app = load_app()
+    rnd = random.Random(0)
+    rows = []
+    for n in (200, 1000):
+        base = sample_script(n)
+        def edits(k: int):
+            """한두 줄씩 고친 변형 k개(완성본 수정·재분배 반복)."""
+            lines = base.split("\n")
+            for _ in range(k):
+                i = rnd.randrange(len(lines))
+                if rnd.random() < 0.5: lines[i] += " 우산을 챙겨요."
+                else: lines.insert(i, "민수: 잠깐만!")
+                yield "\n".join(lines)
+        variants = list(edits(20))
+        legacy_kb = sum(sys.getsizeof(v) for v in [base] + variants) / 1024  # 변형마다 통째 문자열
+        tracemalloc.start()
+        store = app.ScriptStore(); store.commit("raw", base)
+        for v in variants: store.commit("final", v)
+        store_kb = tracemalloc.get_traced_memory()[0] / 1024; tracemalloc.stop()
+        a, b = store.refs["raw"], store.refs["final"]
+        la, lb = base.split("\n"), variants[-1].split("\n")
+        def chunk_diff():
+            store._diffs.clear(); store.diff(a, b)
+        rows.append((f"{n}줄 + 변형 20개", {
+            "strings_kb": legacy_kb, "store_kb": store_kb,
+            "difflib_ms": measure(lambda: difflib.SequenceMatcher(None, la, lb, autojunk=False).get_opcodes(), repeat=5)["p50_ms"],
+            "store_ms": measure(chunk_diff, repeat=5)["p50_ms"]}))
+    report("대본 버전 보관 메모리와 원본↔최신 줄 비교", rows)
+
+# ───────── 케이스: 한 반(같은 대본) 세션별 파싱 사본 vs 공유 저장소 ─────────
+@case("shared_cache")
+def bench_shared_cache(students: int = 30, n_lines: int = 400):
+    import gc, pickle, tracemalloc
+    app = load_app()
+    script = sample_script(n_lines)
+    parse = lambda: (app.with_line_features(app.build_sequence(script)), app.extract_roles(script),
+                     app.build_scene_index(script))
+    blob = pickle.dumps(parse())
+    rows = []
+    for label in ("session copies", "shared store"):
+        gc.collect(); tracemalloc.start()
+        if label == "session copies":  # cache_data: 부를 때마다 역직렬화한 사본을 세션이 들고 있음
+            t0 = time.perf_counter()
+            held = [pickle.loads(blob) for _ in range(students)]
+        else:
+            store = app.SharedStore(64 * 1024 * 1024)
+            key = "script:" + app._digest(script.encode("utf-8"))
+            t0 = time.perf_counter()
+            held = [store.session_refs() for _ in range(students)]
+            for refs in held: store.get(key, parse, refs, "script")
+        wall = time.perf_counter() - t0
+        cur = tracemalloc.get_traced_memory()[0]; tracemalloc.stop()
+        rows.append((label, {"total_mb": cur / 1e6, "per_st_kb": cur / students / 1024, "load_ms": wall * 1000 / students}))
+        if label == "shared store":
+            refs_live = store.stats()["refs"]; del held, refs; gc.collect()
+            print(f"  refs {refs_live} → 세션 정리 후 {store.stats()['refs']}")
+    report(f"학생 {students}명 × 같은 대본 {n_lines}줄: 파싱 결과 상주 메모리", rows)
+
+def main(argv: List[str]):
+    names = argv or list(CASES)
+    for n in names:
+        if n not in CASES:
+            print(f"알 수 없는 케이스: {n} (가능: {', '.join(CASES)})"); continue
+        CASES[n]()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
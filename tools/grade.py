@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""녹음 폴더 일괄 채점(스트림릿 없이).
+
+대본 파일과 줄별 녹음 폴더를 받아 앱과 같은 방식(build_sequence → CLOVA STT → score_turn)으로
+채점하고 CSV/JSONL 보고서를 쓴다. 파일 이름의 첫 숫자가 줄 번호다(예: 007.wav, 민수_12.m4a).
+하위 폴더가 있으면 폴더 이름을 학생 이름으로 본다.
+
+    python tools/grade.py 대본.txt recordings/ -o grades.csv
+    python tools/grade.py 대본.txt recordings/ --role 민수 -o grades.jsonl --stt-concurrency 8
+    python tools/grade.py 대본.txt recordings/ --stub      # 내장 스텁 서버로 시험 실행
+
+STT는 스레드 --stt-concurrency개로 동시에 보내고, 프로소디 분석은 앱의 공유 프로세스 풀
+(AUDIO_POOL_WORKERS, --workers로 변경)에서 돌린다. 한 번에 메모리에 올리는 녹음 수는
+두 단계 동시 처리 수의 합으로 제한한다. 녹음 옆에 같은 이름의 .txt가 있고 --use-sidecar를
+주면 STT 대신 그 글을 말한 대사로 쓴다.
+"""
+import os, re, sys, csv, json, time, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+AUDIO_EXTS = (".wav", ".flac", ".ogg", ".mp3", ".m4a", ".webm")
+PROSODY_KEYS = ("speed_label", "volume_label", "tone_label", "spacing_label",
+                "syllables_per_sec", "rms_db", "f0_hz", "pause_ratio", "tier")
+FIELDS = ("student", "file", "line", "who", "expected", "spoken", "score") + PROSODY_KEYS + \
+         ("stt_ms", "analysis_ms", "error")
+_NUM = re.compile(r"(\d+)")
+
+def find_recordings(root: str) -> List[Tuple[str, str]]:
+    """(학생, 경로) 목록. 최상위 파일의 학생은 ''."""
+    out = []
+    for d, _, files in os.walk(root):
+        rel = os.path.relpath(d, root)
+        for f in sorted(files):
+            if f.lower().endswith(AUDIO_EXTS):
+                out.append(("" if rel == "." else rel, os.path.join(d, f)))
+    return sorted(out)
+
+def line_for(path: str, seq: List[Dict], role_idx: Optional[List[int]]) -> Optional[int]:
+    """파일 이름의 첫 숫자 → build_sequence 위치(0부터). --role이면 그 역할의 n번째 줄."""
+    m = _NUM.search(os.path.splitext(os.path.basename(path))[0])
+    if not m: return None
+    n = int(m.group(1))
+    if role_idx is not None:
+        return role_idx[n-1] if 1 <= n <= len(role_idx) else None
+    return n-1 if 1 <= n <= len(seq) else None
+
+class Grader:
+    def __init__(self, app, seq: List[Dict], stt_concurrency: int, want_metrics: bool, use_sidecar: bool):
+        self.app, self.seq = app, seq
+        self.want_metrics, self.use_sidecar = want_metrics, use_sidecar
+        self.stt_ex = ThreadPoolExecutor(max_workers=stt_concurrency, thread_name_prefix="stt")
+        # 분석 스레드는 풀 워커 수만큼만 → 풀 대기열이 넘쳐 빠른 단계로 밀려나지 않는다
+        self.ana_ex = ThreadPoolExecutor(max_workers=max(1, app.AUDIO_POOL_WORKERS), thread_name_prefix="ana")
+        self.inflight = threading.BoundedSemaphore(stt_concurrency + 2 * max(1, app.AUDIO_POOL_WORKERS))
+
+    def _stt(self, row: Dict, idx: int):
+        t0 = time.perf_counter()
+        try:
+            with open(row["file"], "rb") as f: audio = f.read()
+            side = os.path.splitext(row["file"])[0] + ".txt"
+            if self.use_sidecar and os.path.exists(side):
+                with open(side, encoding="utf-8") as f: row["spoken"] = f.read().strip()
+            else:
+                row["spoken"] = self.app.clova_short_stt(audio, lang="Kor")
+        except Exception as e:
+            row["stt_ms"] = (time.perf_counter() - t0) * 1000
+            row["error"] = f"STT: {e}"; self.inflight.release()
+            return row
+        row["stt_ms"] = (time.perf_counter() - t0) * 1000
+        return self.ana_ex.submit(self._analyze, row, idx, audio)
+
+    def _analyze(self, row: Dict, idx: int, audio: bytes) -> Dict:
+        t0 = time.perf_counter()
+        try:
+            line = self.seq[idx]
+            res = self.app.score_turn(line["text"], row["spoken"], audio, self.want_metrics, feat=line.get("feat"))
+            row["score"] = round(res["score"], 4)
+            for k in PROSODY_KEYS:
+                v = (res["prosody"] or {}).get(k)
+                row[k] = round(v, 3) if isinstance(v, float) else v
+        except Exception as e:
+            row["error"] = f"분석: {e}"
+        finally:
+            row["analysis_ms"] = (time.perf_counter() - t0) * 1000
+            self.inflight.release()
+        return row
+
+    def run(self, items: List[Tuple[str, str, Optional[int]]]) -> List[Dict]:
+        futs = []
+        for student, path, idx in items:
+            row = {"student": student, "file": path}
+            if idx is None:
+                row["error"] = "줄 번호를 찾지 못함"; futs.append(row); continue
+            line = self.seq[idx]
+            row.update(line=idx+1, who=line["who"], expected=line["feat"]["core"])
+            self.inflight.acquire()  # 메모리에 올라간 녹음 수 제한
+            futs.append(self.stt_ex.submit(self._stt, row, idx))
+        rows = []
+        for f in futs:
+            r = f if isinstance(f, dict) else f.result()
+            rows.append(r if isinstance(r, dict) else r.result())
+        self.stt_ex.shutdown(); self.ana_ex.shutdown()
+        return rows
+
+def write_report(rows: List[Dict], path: str):
+    if path.endswith(".jsonl"):
+        with open(path, "w", encoding="utf-8") as f:
+            for r in rows: f.write(json.dumps({k: r.get(k) for k in FIELDS}, ensure_ascii=False) + "\n")
+        return
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:  # 엑셀에서 한글이 깨지지 않도록 BOM
+        w = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+        w.writeheader()
+        for r in rows:
+            w.writerow({k: ("" if r.get(k) is None else (f"{r[k]:.0f}" if k.endswith("_ms") else r[k])) for k in FIELDS})
+
+def print_summary(rows: List[Dict], wall: float, out: str):
+    ok = [r for r in rows if not r.get("error")]
+    print(f"\n## 일괄 채점: 파일 {len(rows)}개 (성공 {len(ok)}, 실패 {len(rows)-len(ok)}) → {out}")
+    print(f"wall {wall:.1f}s   throughput {len(rows)/wall if wall > 0 else 0.0:.2f} files/s")
+    if ok:
+        stt = sorted(r["stt_ms"] for r in ok); ana = sorted(r["analysis_ms"] for r in ok)
+        print(f"STT p50 {stt[len(stt)//2]:.0f} ms   분석 p50 {ana[len(ana)//2]:.0f} ms")
+    by: Dict[str, List[float]] = {}
+    for r in ok: by.setdefault(r["student"] or "(폴더 없음)", []).append(r["score"])
+    for s, v in sorted(by.items()):
+        print(f"  {s:<12} {len(v):>4}줄   평균 일치율 {sum(v)/len(v)*100:.0f}%")
+    for r in rows:
+        if r.get("error"): print(f"  ! {r['file']}: {r['error']}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="녹음 폴더를 대본과 비교해 일괄 채점")
+    ap.add_argument("script", help="대본 텍스트 파일(이름: 대사)")
+    ap.add_argument("recordings", help="줄별 녹음 폴더(하위 폴더 = 학생)")
+    ap.add_argument("-o", "--out", default="grades.csv", help=".csv 또는 .jsonl")
+    ap.add_argument("--role", default="", help="파일 번호를 이 역할의 n번째 줄로 해석")
+    ap.add_argument("--stt-concurrency", type=int, default=4, help="동시에 보내는 STT 요청 수")
+    ap.add_argument("--workers", type=int, default=None, help="프로소디 분석 프로세스 수(기본 AUDIO_POOL_WORKERS)")
+    ap.add_argument("--no-metrics", action="store_true", help="프로소디 분석 끄기(글자 일치율만)")
+    ap.add_argument("--use-sidecar", action="store_true", help="같은 이름의 .txt가 있으면 STT 대신 사용")
+    ap.add_argument("--stub", action="store_true", help="내장 스텁 서버로 실행(네트워크 없이 시험)")
+    a = ap.parse_args(argv)
+
+    if a.workers is not None:  # 앱 설정은 import 시점에 읽으므로 먼저 넣는다
+        os.environ["AUDIO_POOL_WORKERS"] = str(a.workers)
+        os.environ.setdefault("AUDIO_POOL_PENDING", str(2 * max(1, a.workers)))
+    from bench import load_app, use_stub  # noqa: E402
+    app = load_app()
+    srv = None
+    if a.stub:
+        from stub_server import StubConfig, start_stub
+        srv, base = start_stub(0, StubConfig())
+        use_stub(app, base)
+    elif not app.CLOVA_SPEECH_SECRET and not a.use_sidecar:
+        print("CLOVA_SPEECH_SECRET이 없어 말한 대사가 비어 있게 됩니다(--use-sidecar 또는 --stub 참고).", file=sys.stderr)
+
+    with open(a.script, encoding="utf-8") as f: script = f.read()
+    seq = app.with_line_features(app.build_sequence(script))
+    if not seq: sys.exit("대본에서 '이름: 대사' 줄을 찾지 못했습니다.")
+    role_idx = [i for i, l in enumerate(seq) if l["who"] == a.role] if a.role else None
+    if role_idx is not None and not role_idx: sys.exit(f"역할 '{a.role}'의 대사가 없습니다.")
+    items = [(s, p, line_for(p, seq, role_idx)) for s, p in find_recordings(a.recordings)]
+    if not items: sys.exit("녹음 파일이 없습니다.")
+
+    t0 = time.perf_counter()
+    try:
+        rows = Grader(app, seq, max(1, a.stt_concurrency), not a.no_metrics, a.use_sidecar).run(items)
+    finally:
+        if srv is not None: srv.shutdown()
+    wall = time.perf_counter() - t0
+    write_report(rows, a.out)
+    print_summary(rows, wall, a.out)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""리허설 부하 테스트 드라이버.
+
+N명의 학생이 동시에 'AI 대본 연습' 페이지를 한 줄씩 진행하는 상황을 흉내 낸다.
+각 학생(스레드)은 자기 역할 줄에서는 녹음 → STT → 채점(score_turn), 상대역 줄에서는
+TTS를 요청하고, 마지막에 종합 피드백을 한 번 요청한다. 외부 API 대신 로컬 스텁 서버를 쓴다.
+
+    python tools/loadtest.py --students 30 --lines 60 \\
+        --profile stt=350:0.4:0.01 --profile speech=500:0.3 --profile chat=1200
+
+출력: 처리량(턴/초), 턴 지연 p50/p95(전체·종류별), 오류 수, 세션당 메모리(RSS 증가분).
+--tracemalloc을 주면 파이썬 할당량을 정확히 재지만 실행이 크게 느려지므로 지연 수치는 참고하지 않는다.
+"""
+import os, sys, time, random, resource, threading, argparse, tracemalloc
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench import load_app, sample_script, sample_wav, use_stub, _pct  # noqa: E402
+from stub_server import StubConfig, start_stub, parse_profiles  # noqa: E402
+
+def _rss_kb() -> int:
+    """현재 RSS(KB). /proc이 없으면 최대 RSS로 대신한다."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except Exception:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class StudentSession:
+    """학생 한 명의 세션 상태(st.session_state에 들어가는 것과 같은 값들)."""
+    def __init__(self, sid: int, role: str):
+        self.sid = sid; self.role = role
+        self.state: Dict = {"duet_cursor": 0, "duet_turns": [], "auto_done_token": None, "duet_last_result": None,
+                            "duet_stats": None}
+        self.latencies: List = []  # (kind, seconds)
+        self.errors = 0
+
+def _run_student(app, sess: StudentSession, seq: List[Dict], clips: Dict[int, bytes],
+                 think_s: float, want_metrics: bool, voice_label: str, rnd: random.Random):
+    st_ = sess.state
+    st_["duet_stats"] = app.new_turn_stats()
+    while st_["duet_cursor"] < len(seq):
+        idx = st_["duet_cursor"]; line = seq[idx]
+        t0 = time.perf_counter()
+        try:
+            if line["who"] == sess.role:
+                audio = clips[len(line["text"]) // 10]
+                stt = app.clova_short_stt(audio, lang="Kor")
+                res = app.score_turn(line["text"], stt, audio, want_metrics, feat=line.get("feat"))
+                turn = {"line_idx": idx+1, "who": line["who"],
+                        "expected": res["expected"], "spoken": stt, "score": res["score"]}
+                st_["duet_turns"].append(turn)
+                app.add_turn_stats(st_["duet_stats"], turn, res["prosody"])
+                st_["duet_last_result"] = dict(res, line_idx=idx+1)
+                kind = "my_line"
+            else:
+                _, audio = app.tts_speak_line(line["text"], voice_label)
+                if audio is None: raise RuntimeError("tts failed")
+                kind = "partner"
+        except Exception:
+            sess.errors += 1; kind = "error"
+        sess.latencies.append((kind, time.perf_counter() - t0))
+        st_["duet_cursor"] = idx + 1
+        if think_s > 0: time.sleep(rnd.uniform(0.5, 1.5) * think_s)
+    t0 = time.perf_counter()
+    try:
+        app.client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": app.prompt_session_feedback(st_["duet_turns"], st_["duet_stats"])}],
+            temperature=0.3, max_tokens=1200)
+        sess.latencies.append(("feedback", time.perf_counter() - t0))
+    except Exception:
+        sess.errors += 1
+
+def run(students: int, lines: int, think_ms: float, want_metrics: bool, cfg: StubConfig,
+        base_url: str = "", use_tracemalloc: bool = False, seed: int = 0) -> Dict:
+    app = load_app()
+    srv = None
+    if not base_url:
+        srv, base_url = start_stub(0, cfg)
+    use_stub(app, base_url)
+    script = sample_script(lines)
+    seq, roles = app.with_line_features(app.build_sequence(script)), app.extract_roles(script)
+    # 대사 길이에 비례하는 녹음 클립(10자당 약 1.5초)
+    clips = {k: sample_wav(1.0 + 1.5 * k, seed=k) for k in range(0, max(len(l["text"]) for l in seq)//10 + 1)}
+    sessions = [StudentSession(i, roles[i % len(roles)]) for i in range(students)]
+
+    if use_tracemalloc: tracemalloc.start()
+    mem0 = tracemalloc.get_traced_memory()[0] if use_tracemalloc else 0
+    rss0 = _rss_kb()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=_run_student,
+                                args=(app, s, seq, clips, think_ms/1000.0, want_metrics,
+                                      app.VOICE_KR_LABELS_SAFE[0], random.Random(seed + s.sid)), daemon=True)
+               for s in sessions]
+    for th in threads: th.start()
+    for th in threads: th.join()
+    wall = time.perf_counter() - t0
+    rss1 = _rss_kb()
+    mem_cur, mem_peak = tracemalloc.get_traced_memory() if use_tracemalloc else (0, 0)
+    if use_tracemalloc: tracemalloc.stop()
+    if srv is not None: srv.shutdown()
+
+    lat = [(k, v) for s in sessions for k, v in s.latencies]
+    turns = [v for k, v in lat if k in ("my_line", "partner")]
+    out = {"students": students, "lines": len(seq), "wall_s": wall,
+           "turns": len(turns), "turns_per_s": len(turns)/wall if wall > 0 else 0.0,
+           "errors": sum(s.errors for s in sessions),
+           "p50_ms": _pct(turns, 0.5)*1000, "p95_ms": _pct(turns, 0.95)*1000,
+           "rss_per_session_kb": (rss1 - rss0) / students, "by_kind": {},
+           "breakers": [br.snapshot() for br in app.get_breakers().values()],
+           "prosody": app.get_audio_pool().sched.snapshot() if app.get_audio_pool() else None}
+    for kind in ("my_line", "partner", "feedback"):
+        vals = [v for k, v in lat if k == kind]
+        if vals: out["by_kind"][kind] = {"n": len(vals), "p50_ms": _pct(vals, 0.5)*1000, "p95_ms": _pct(vals, 0.95)*1000}
+    if use_tracemalloc:
+        out["mem_retained_per_session_kb"] = (mem_cur - mem0) / students / 1024
+        out["mem_peak_per_session_kb"] = (mem_peak - mem0) / students / 1024
+    return out
+
+def print_report(r: Dict):
+    print(f"\n## 리허설 부하 테스트: 학생 {r['students']}명 × {r['lines']}줄")
+    print(f"wall {r['wall_s']:.1f}s   turns {r['turns']}   throughput {r['turns_per_s']:.2f} turns/s   errors {r['errors']}")
+    print(f"turn latency p50 {r['p50_ms']:.0f} ms   p95 {r['p95_ms']:.0f} ms")
+    for kind, v in r["by_kind"].items():
+        print(f"  {kind:<9} n={v['n']:<5} p50 {v['p50_ms']:.0f} ms   p95 {v['p95_ms']:.0f} ms")
+    for b in r["breakers"]:
+        if b["ok"] or b["fail"]:
+            print(f"  breaker {b['name']:<10} {b['state']:<9} ok {b['ok']} fail {b['fail']} fast-fail {b['fast_fail']} "
+                  f"opened {b['opened']} timeout {b['timeout_s']:.1f}s")
+    if r["prosody"] and sum(r["prosody"]["counts"].values()):
+        p = r["prosody"]
+        print(f"  prosody tiers " + "  ".join(f"{k} {p['counts'][k]} ({p['share'][k]*100:.0f}%)" for k in ("full", "fast", "fallback"))
+              + f"   p95 {p['p95_ms']:.0f} ms (target {p['target_ms']:.0f} ms)")
+    print(f"memory per session: RSS +{r['rss_per_session_kb']:.0f} KB")
+    if "mem_retained_per_session_kb" in r:
+        print(f"  python heap: retained {r['mem_retained_per_session_kb']:.0f} KB, "
+              f"peak {r['mem_peak_per_session_kb']:.0f} KB (tracemalloc)")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="리허설 페이지 동시 사용자 부하 테스트")
+    ap.add_argument("--students", type=int, default=10)
+    ap.add_argument("--lines", type=int, default=30)
+    ap.add_argument("--think-ms", type=float, default=0.0, help="턴 사이 학생이 머뭇거리는 평균 시간")
+    ap.add_argument("--no-metrics", action="store_true", help="프로소디 분석 끄기(텍스트만)")
+    ap.add_argument("--tracemalloc", action="store_true", help="파이썬 할당량 측정(느려짐)")
+    ap.add_argument("--base-url", default="", help="이미 떠 있는 스텁/프록시 주소(없으면 내장 스텁 기동)")
+    ap.add_argument("--uplink-kbps", type=float, default=None)
+    ap.add_argument("--profile", action="append", default=[], help="경로=중앙값ms[:sigma[:오류율]]")
+    ap.add_argument("--seed", type=int, default=0)
+    a = ap.parse_args(argv)
+    cfg = StubConfig(uplink_kbps=a.uplink_kbps, profiles=parse_profiles(a.profile), seed=a.seed)
+    print_report(run(a.students, a.lines, a.think_ms, not a.no_metrics, cfg, a.base_url,
+                     use_tracemalloc=a.tracemalloc, seed=a.seed))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
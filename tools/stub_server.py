@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""로컬 스텁 서버 — 외부 API 없이 용량 계획/벤치마크를 하기 위한 가짜 엔드포인트.
+
+    python tools/stub_server.py --port 8765 --uplink-kbps 2000 \\
+        --profile stt=350:0.4:0.02 --profile speech=600
+
+앱은 아래처럼 스텁을 가리키게 한다(환경변수 또는 secrets.toml).
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+    CLOVA_SPEECH_URL=http://127.0.0.1:8765
+    NAVER_CLOVA_OCR_URL=http://127.0.0.1:8765/ocr
+
+지원 경로(경로 이름 = --profile 키)
+- POST /v1/audio/speech        speech  무음 MP3 프레임(대사 길이에 비례)
+- POST /v1/chat/completions    chat    OpenAI 형식의 고정 응답(response_format=json_object면 고정 JSON)
+- POST /recog/v1/stt           stt     CLOVA Short Sentence STT 형식 {"text": ...}
+- POST /ocr                    ocr     CLOVA OCR V2 형식 {"images":[{"fields":[...]}]}
+
+--profile 경로=중앙값ms[:sigma[:오류율]] 로 지연(로그정규)과 오류(429/500/503) 분포를 정한다.
+--uplink-kbps를 주면 요청 본문을 그 속도로 읽어 공유 회선의 업로드 지연을 흉내 낸다.
+--chat-ms-per-1k를 주면 chat 응답이 프롬프트 길이(1k 토큰당 ms)만큼 더 늦어진다(prefill 비용).
+--chat-ms-per-token을 주면 chat이 마지막 사용자 메시지의 마지막 문단(빈 줄 뒤, 보통 대본 부분)을
+  max_tokens까지 되돌려 준다(출력 토큰당 ms,
+  넘치면 finish_reason="length"). 출력 길이에 비례하는 생성 시간과 잘림을 흉내 낸다.
+--speech-rtf를 주면 speech 응답을 실시간의 N배 속도로 조금씩 흘려보낸다(합성하면서 스트리밍).
+"""
+import sys, json, math, time, random, threading, argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional, Tuple
+
+ROUTES = {
+    "/v1/audio/speech": "speech",
+    "/v1/chat/completions": "chat",
+    "/recog/v1/stt": "stt",
+    "/ocr": "ocr",
+}
+
+class RouteProfile:
+    """한 경로의 지연/오류 분포. 지연은 중앙값 median_ms, 로그정규 sigma."""
+    def __init__(self, median_ms: float = 0.0, sigma: float = 0.0, error_rate: float = 0.0,
+                 error_codes: Tuple[int, ...] = (429, 500, 503)):
+        self.median_ms = median_ms; self.sigma = sigma
+        self.error_rate = error_rate; self.error_codes = error_codes
+
+    @classmethod
+    def parse(cls, spec: str) -> "RouteProfile":
+        parts = [float(x) for x in spec.split(":")]
+        return cls(*parts[:3])
+
+    def delay_s(self, rnd: random.Random) -> float:
+        if self.median_ms <= 0: return 0.0
+        return self.median_ms / 1000.0 * (math.exp(rnd.gauss(0.0, self.sigma)) if self.sigma > 0 else 1.0)
+
+    def error(self, rnd: random.Random) -> Optional[int]:
+        if self.error_rate > 0 and rnd.random() < self.error_rate:
+            return rnd.choice(self.error_codes)
+        return None
+
+class StubConfig:
+    def __init__(self, uplink_kbps: Optional[float] = None, profiles: Optional[Dict[str, RouteProfile]] = None,
+                 stt_text: str = "안녕하세요 오늘은 연습하는 날이에요", seed: Optional[int] = None,
+                 chat_ms_per_1k: float = 0.0, speech_rtf: float = 0.0, chat_ms_per_token: float = 0.0):
+        self.uplink_kbps = uplink_kbps
+        self.chat_ms_per_token = chat_ms_per_token
+        self.speech_rtf = speech_rtf
+        self.chat_ms_per_1k = chat_ms_per_1k
+        self.profiles = profiles or {}
+        self.stt_text = stt_text
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.bytes_in = 0
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def profile(self, route: str) -> RouteProfile:
+        return self.profiles.get(route) or RouteProfile()
+
+# MPEG-1 Layer III 128kbps/44.1kHz 무음 프레임(417바이트, 약 26ms)
+_MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+def silent_mp3(seconds: float) -> bytes:
+    return _MP3_FRAME * max(1, int(seconds / 0.026))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cfg: StubConfig = None  # start_stub()에서 주입
+
+    def log_message(self, *a):  # 조용히
+        pass
+
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        kbps = self.cfg.uplink_kbps
+        if not kbps:
+            body = self.rfile.read(n)
+        else:
+            # 16KB씩 읽으며 회선 속도만큼 지연
+            chunks, left, bps = [], n, kbps * 1000 / 8
+            while left > 0:
+                c = self.rfile.read(min(16384, left))
+                if not c: break
+                chunks.append(c); left -= len(c)
+                time.sleep(len(c) / bps)
+            body = b"".join(chunks)
+        with self.cfg.lock:
+            self.cfg.bytes_in += len(body)
+        return body
+
+    def _send(self, data: bytes, ctype: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, obj, status: int = 200):
+        self._send(json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", status)
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        body = self._read_body()
+        route = ROUTES.get(path)
+        if route is None:
+            return self._send_json({"message": f"unknown path {path}"}, 404)
+        prof = self.cfg.profile(route)
+        with self.cfg.lock:
+            delay = prof.delay_s(self.cfg.rnd); err = prof.error(self.cfg.rnd)
+            self.cfg.calls[route] = self.cfg.calls.get(route, 0) + 1
+            if err: self.cfg.errors[route] = self.cfg.errors.get(route, 0) + 1
+        time.sleep(delay)
+        if err:
+            return self._send_json({"error": {"message": f"stub injected {err}"}}, err)
+        getattr(self, f"_route_{route}")(body)
+
+    def _route_speech(self, body: bytes):
+        try: text = json.loads(body or b"{}").get("input", "")
+        except Exception: text = ""
+        data = silent_mp3(0.2 * max(1, len(text)))
+        if self.cfg.speech_rtf <= 0:
+            return self._send(data, "audio/mpeg")
+        # 0.25초 분량씩, 실시간의 speech_rtf배 속도로 청크 전송
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        step = len(_MP3_FRAME) * 10
+        for i in range(0, len(data), step):
+            piece = data[i:i+step]
+            time.sleep(0.26 / self.cfg.speech_rtf)
+            self.wfile.write(f"{len(piece):X}\r\n".encode() + piece + b"\r\n"); self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _route_chat(self, body: bytes):
+        try: req = json.loads(body or b"{}")
+        except Exception: req = {}
+        prompt = " ".join(str(m.get("content", "")) for m in req.get("messages", []))
+        if self.cfg.chat_ms_per_1k > 0:
+            time.sleep(len(prompt.encode("utf-8")) / 3 / 1000 * self.cfg.chat_ms_per_1k / 1000)
+        content = "(스텁 응답) 잘했어요! 말속도를 조금 더 천천히 해 보세요."
+        finish = "stop"
+        if (req.get("response_format") or {}).get("type") == "json_object":
+            content = json.dumps({"items": [{"section": "필수", "kind": "소품", "name": "우산", "note": "비 오는 장면"},
+                                            {"section": "안전 주의", "kind": "무대", "name": "계단", "note": "뛰지 않기"}],
+                                  "tips": ["소품은 장면 순서대로 상자에 담아 두세요."]}, ensure_ascii=False)
+        elif self.cfg.chat_ms_per_token > 0:
+            # 에코 모드: 1자 ≈ 1토큰으로 max_tokens까지 출력, 출력량에 비례해 지연
+            users = [str(m.get("content", "")) for m in req.get("messages", []) if m.get("role") == "user"]
+            content = (users[-1] if users else "").rsplit("\n\n", 1)[-1]
+            limit = int(req.get("max_tokens") or 0)
+            if limit and len(content) > limit:
+                content, finish = content[:limit], "length"
+            time.sleep(len(content) * self.cfg.chat_ms_per_token / 1000)
+        self._send_json({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+            "model": req.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish}],
+            "usage": {"prompt_tokens": len(prompt)//2, "completion_tokens": len(content)//2,
+                      "total_tokens": (len(prompt)+len(content))//2},
+        })
+
+    def _route_stt(self, body: bytes):
+        if not body:
+            return self._send_json({"message": "empty body"}, 400)
+        self._send_json({"text": self.cfg.stt_text})
+
+    def _route_ocr(self, body: bytes):
+        words = self.cfg.stt_text.split()
+        self._send_json({"images": [{"inferResult": "SUCCESS", "fields": [{"inferText": w} for w in words]}]})
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # 클라이언트가 제한 시간으로 먼저 끊은 경우(BrokenPipe 등)는 조용히
+        if isinstance(sys.exc_info()[1], ConnectionError): return
+        super().handle_error(request, client_address)
+
+def start_stub(port: int = 0, cfg: Optional[StubConfig] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """백그라운드 스레드로 스텁 서버를 띄우고 (server, base_url)을 돌려준다."""
+    cfg = cfg or StubConfig()
+    handler = type("StubHandler", (_Handler,), {"cfg": cfg})
+    srv = _QuietServer(("127.0.0.1", port), handler)
+    srv.daemon_threads = True
+    srv.cfg = cfg
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}"
+
+def parse_profiles(specs: List[str]) -> Dict[str, RouteProfile]:
+    out = {}
+    for spec in specs or []:
+        name, _, val = spec.partition("=")
+        if name not in ROUTES.values():
+            raise SystemExit(f"알 수 없는 경로: {name} (가능: {', '.join(ROUTES.values())})")
+        out[name] = RouteProfile.parse(val)
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="로컬 API 스텁 서버")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--uplink-kbps", type=float, default=None)
+    ap.add_argument("--profile", action="append", default=[], help="경로=중앙값ms[:sigma[:오류율]]")
+    ap.add_argument("--chat-ms-per-1k", type=float, default=0.0)
+    ap.add_argument("--chat-ms-per-token", type=float, default=0.0)
+    ap.add_argument("--speech-rtf", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args(argv)
+    cfg = StubConfig(uplink_kbps=a.uplink_kbps, profiles=parse_profiles(a.profile), seed=a.seed,
+                     chat_ms_per_1k=a.chat_ms_per_1k, speech_rtf=a.speech_rtf,
+                     chat_ms_per_token=a.chat_ms_per_token)
+    srv, base = start_stub(a.port, cfg)
+    print(f"stub server: {base}  (Ctrl+C로 종료)")
+    print(f"  OPENAI_BASE_URL={base}/v1  CLOVA_SPEECH_URL={base}  NAVER_CLOVA_OCR_URL={base}/ocr")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])